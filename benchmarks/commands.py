@@ -0,0 +1,177 @@
+"""Cost of the bot's commands and helpers against synthetic guilds of different sizes.
+
+Every benchmark runs against a guild built in memory (see ``benchmarks.synthetic``),
+nothing is sent to Discord. Results can be written as JSON and compared with an
+earlier run to spot regressions between commits.
+
+Run from the repository root, e.g.
+``python -m benchmarks.commands --members 1000 100000 --json after.json --compare before.json``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import discord
+
+from exts.general import General
+from exts.utils.guilds import GuildGraphics
+from exts.utils.time import how_old, ts
+from exts.utils.wording import plural
+
+from .synthetic import Sink, make_bot, make_context, make_guild, make_messages
+
+Benchmark = Callable[[], Awaitable[None] | None]
+
+
+async def measure(func: Benchmark, *, rounds: int, min_time: float) -> dict[str, float]:
+    """Times ``func`` in rounds of enough calls to take ``min_time``, returning per-call nanoseconds."""
+    is_async = asyncio.iscoroutinefunction(func)
+
+    async def run(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            if is_async:
+                await func()  # type: ignore
+            else:
+                func()
+        return time.perf_counter() - start
+
+    number = 1
+    while (elapsed := await run(number)) < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    timings = [await run(number) / number * 1e9 for _ in range(rounds)]
+    return {
+        "calls": number,
+        "min_ns": min(timings),
+        "median_ns": statistics.median(timings),
+        "max_ns": max(timings),
+    }
+
+
+def suite(members: int, *, messages: int) -> dict[str, Benchmark]:
+    bot = make_bot()
+    guild = make_guild(bot, members)
+    general = General(bot)
+    bot.user_guilds.add_guild(guild)
+    target = guild.members[-1]
+    ctx = make_context(guild, target)
+    history = make_messages(bot, guild, messages)
+    mention = SimpleNamespace(guild=guild, reply=Sink())
+    check = general._cleanup_check((bot.prefixes.get(guild.id),), bulk=True)
+    now = discord.utils.utcnow()
+    age = now - guild.created_at
+
+    async def serverinfo_cold() -> None:
+        # Stats are rebuilt from the member cache, as on the first call after startup.
+        bot.guild_stats.discard(guild.id)
+        await General.serverinfo.callback(general, ctx)  # type: ignore
+
+    async def serverinfo() -> None:
+        await General.serverinfo.callback(general, ctx)  # type: ignore
+
+    async def whois() -> None:
+        await General.whois.callback(general, ctx, user=target)  # type: ignore
+
+    async def mention_responder() -> None:
+        await general.mention_responder(mention)  # type: ignore
+
+    def cleanup_check() -> None:
+        for message in history:
+            check(message)
+
+    def graphics() -> None:
+        str(GuildGraphics.from_guild(guild))
+
+    def formatting() -> None:
+        f"{ts(now):R} {plural(members):member} {how_old(age)}"
+
+    return {
+        "serverinfo (cold stats)": serverinfo_cold,
+        "serverinfo": serverinfo,
+        "whois": whois,
+        "mention_responder": mention_responder,
+        f"cleanup check x{messages}": cleanup_check,
+        "GuildGraphics.from_guild": graphics,
+        "ts/plural/how_old": formatting,
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict[str, Any]], baseline: list[dict[str, Any]]) -> None:
+    before = {(result["name"], result["members"]): result["median_ns"] for result in baseline}
+    print("\nCompared with the baseline (median):")
+    for result in results:
+        old = before.get((result["name"], result["members"]))
+        if old is None:
+            continue
+        change = (result["median_ns"] - old) / old * 100
+        print(f"  {result['name']:<26} {result['members']:>8,} members  {change:>+7.1f}%")
+
+
+async def run(args: argparse.Namespace) -> None:
+    results = []
+    for members in args.members:
+        start = time.perf_counter()
+        benchmarks = suite(members, messages=args.messages)
+        print(f"{members:,} members (built in {time.perf_counter() - start:.1f}s)")
+
+        for name, func in benchmarks.items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+            timing = await measure(func, rounds=args.rounds, min_time=args.min_time)
+            results.append({"name": name, "members": members, **timing})
+            print(f"  {name:<26} {timing['median_ns'] / 1000:>12,.1f}µs  (min {timing['min_ns'] / 1000:,.1f}µs)")
+
+    if args.compare:
+        with Path(args.compare).open() as file:
+            compare(results, json.load(file)["results"])
+
+    if args.json:
+        report = {
+            "revision": git_revision(),
+            "created_at": datetime.datetime.now(datetime.UTC).isoformat(),
+            "python": sys.version.split()[0],
+            "discord.py": discord.__version__,
+            "platform": platform.platform(),
+            "results": results,
+        }
+        with Path(args.json).open("w") as file:
+            json.dump(report, file, indent=2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--messages", type=int, default=1_000, help="history size for the cleanup check")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds each round should take at least")
+    parser.add_argument("--only", nargs="+", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="a results file from an earlier run to compare against")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
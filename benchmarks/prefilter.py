@@ -0,0 +1,119 @@
+"""Per-message cost of deciding what to do with an incoming message.
+
+``before`` is the old path: every message compiled a mention regex in
+``General.mention_responder`` and then went through ``process_commands``.
+``after`` is ``Spork.on_message`` with its :class:`MessageFilter` in front.
+
+Run from the repository root with ``python -m benchmarks.prefilter``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import random
+import re
+import time
+from types import SimpleNamespace
+from typing import Any
+
+import discord
+
+from bot import Spork
+from exts.utils.prefilter import MessageFilter
+
+BOT_ID = 1227088846655586384
+GUILD_ID = 336642139381301249
+
+CHAT = [
+    "lol",
+    "has anyone tried the new update yet?",
+    "<@80088516616269824> can you look at this",
+    "https://example.com/some/long/link?with=params",
+    "gg",
+    "I think the problem is in the config, try restarting it",
+]
+
+
+def make_messages(bot: Spork, count: int, *, command_ratio: float, mention_ratio: float) -> list[Any]:
+    prefix = bot.prefixes.get(GUILD_ID)
+    guild = SimpleNamespace(id=GUILD_ID, me=SimpleNamespace(id=BOT_ID))
+    author = SimpleNamespace(id=80088516616269824, bot=False)
+    created_at = datetime.datetime.now(datetime.UTC)
+    first_id = discord.utils.time_snowflake(created_at)
+    rng = random.Random(0)
+
+    messages = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < mention_ratio:
+            content = f"<@{BOT_ID}>"
+        elif roll < mention_ratio + command_ratio:
+            content = f"{prefix}ping"
+        else:
+            content = rng.choice(CHAT)
+        messages.append(
+            SimpleNamespace(
+                id=first_id + i,
+                created_at=created_at,
+                content=content,
+                guild=guild,
+                author=author,
+                attachments=[],
+                _state=bot._connection,
+            )
+        )
+    return messages
+
+
+async def before(bot: Spork, messages: list[Any]) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        re.fullmatch(rf"<@!?{message.guild.me.id}>", message.content)
+        await bot.process_commands(message)
+    return time.perf_counter() - start
+
+
+async def after(bot: Spork, messages: list[Any]) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        await bot.on_message(message)
+    return time.perf_counter() - start
+
+
+async def run(count: int, rounds: int, command_ratio: float, mention_ratio: float) -> None:
+    bot = Spork(pool=None, session=None)  # type: ignore # neither is touched while classifying
+    bot._connection.user = SimpleNamespace(id=BOT_ID)  # type: ignore
+    bot.message_filter = MessageFilter(BOT_ID)
+
+    @bot.command()
+    async def ping(ctx: Any) -> None:
+        pass
+
+    messages = make_messages(bot, count, command_ratio=command_ratio, mention_ratio=mention_ratio)
+    chat_only = [message for message in messages if not message.content.startswith(("<@", bot.prefixes.default))]
+
+    for name, sample in (("mixed traffic", messages), ("ordinary chat only", chat_only)):
+        best_before = min([await before(bot, sample) for _ in range(rounds)])
+        best_after = min([await after(bot, sample) for _ in range(rounds)])
+        per_before = best_before / len(sample) * 1e9
+        per_after = best_after / len(sample) * 1e9
+        print(
+            f"{name:<20} before: {per_before:>8,.0f} ns/msg  after: {per_after:>8,.0f} ns/msg"
+            f"  ({per_before / per_after:.1f}x faster)"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--command-ratio", type=float, default=0.015)
+    parser.add_argument("--mention-ratio", type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.rounds, args.command_ratio, args.mention_ratio))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Replays a recorded gateway session into the bot, as a load test that never talks to Discord.
+
+Record a session by setting ``GATEWAY_RECORD_PATH`` in ``config.py`` and running the bot
+for a while. The replay feeds every recorded dispatch to a fresh ``Spork`` through
+discord.py's own parsers, so caches, listeners and commands all run as they would in
+production. Requests the bot makes go to a local stand-in for the HTTP API that answers
+with plausible payloads. The database isn't used, writes are buffered and never flushed
+and reads get fixed rows.
+
+Events are replayed at their recorded pace divided by ``--speed``, ``--speed 0`` replays
+them as fast as the bot keeps up. Run from the repository root, e.g.
+``python -m benchmarks.replay recordings/gateway-20250101-120000.jsonl.gz --speed 10``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+import discord
+from aiohttp import web
+
+import config
+from bot import Spork
+from exts import EXTENSIONS
+from exts.utils.gateway import read_recording
+from exts.utils.prefilter import MessageFilter
+
+from .commands import git_revision
+from .synthetic import without_database
+
+
+def json_response(data: Any, *, status: int = 200) -> web.Response:
+    # discord.py only decodes a body as JSON when the content type is exactly application/json,
+    # web.json_response adds a charset to it.
+    return web.Response(body=json.dumps(data).encode(), status=status, content_type="application/json")
+
+
+class FakeDiscord:
+    """A local stand-in for Discord's HTTP API.
+
+    Sent and edited messages are echoed back as if Discord created them, interaction
+    responses and anything without a body succeed, everything else is a 404 which the
+    bot handles like any other missing resource. Requests are counted per route.
+    """
+
+    def __init__(self, user: dict[str, Any]) -> None:
+        self.user = user
+        self.requests: Counter[str] = Counter()
+        self._ids = itertools.count(discord.utils.time_snowflake(discord.utils.utcnow()))
+        self._runner: web.AppRunner | None = None
+
+    async def start(self) -> str:
+        """Starts serving on a free local port, returning the API base URL."""
+        app = web.Application(middlewares=[self._count])
+        app.router.add_get("/api/v10/users/@me", self._me)
+        app.router.add_post("/api/v10/channels/{channel_id}/messages", self._message)
+        app.router.add_patch("/api/v10/channels/{channel_id}/messages/{message_id}", self._message)
+        app.router.add_post("/api/v10/interactions/{interaction_id}/{token}/callback", self._interaction_callback)
+        app.router.add_route("*", "/{path:.*}", self._fallback)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        # Private, checked against aiohttp 3.14, there's no public way to get the bound port.
+        host, port = site._server.sockets[0].getsockname()[:2]  # type: ignore
+        return f"http://{host}:{port}/api/v10"
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    @web.middleware
+    async def _count(self, request: web.Request, handler: Any) -> web.StreamResponse:
+        route = request.match_info.route.resource
+        self.requests[f"{request.method} {route.canonical if route is not None else request.path}"] += 1
+        return await handler(request)
+
+    async def _payload(self, request: web.Request) -> dict[str, Any]:
+        if request.content_type == "multipart/form-data":
+            async for part in await request.multipart():
+                if isinstance(part, aiohttp.BodyPartReader) and part.name == "payload_json":
+                    return await part.json() or {}
+            return {}
+        if request.can_read_body:
+            return await request.json()
+        return {}
+
+    async def _me(self, request: web.Request) -> web.Response:
+        return json_response(self.user)
+
+    async def _message(self, request: web.Request) -> web.Response:
+        payload = await self._payload(request)
+        now = discord.utils.utcnow().isoformat()
+        message_id = request.match_info.get("message_id") or str(next(self._ids))
+        return json_response(
+            {
+                "id": message_id,
+                "channel_id": request.match_info["channel_id"],
+                "author": self.user,
+                "content": payload.get("content") or "",
+                "timestamp": now,
+                "edited_timestamp": now if request.method == "PATCH" else None,
+                "tts": False,
+                "mention_everyone": False,
+                "mentions": [],
+                "mention_roles": [],
+                "attachments": [],
+                "embeds": payload.get("embeds") or [],
+                "pinned": False,
+                "type": 0,
+            }
+        )
+
+    async def _interaction_callback(self, request: web.Request) -> web.Response:
+        payload = await self._payload(request)
+        interaction = {"id": request.match_info["interaction_id"], "type": payload.get("type", 4)}
+        return json_response({"interaction": interaction})
+
+    async def _fallback(self, request: web.Request) -> web.Response:
+        if request.method in ("DELETE", "PUT") or request.path.endswith("/typing"):
+            return web.Response(status=204)
+        return json_response({"message": "Unknown (replay)", "code": 0}, status=404)
+
+
+class ListenerTimer:
+    """Times every listener the bot runs, by wrapping the bot's event runner.
+
+    Times are wall clock, so a listener that waits on a request or a lock is charged for
+    the wait as well as for the work.
+    """
+
+    def __init__(self, bot: Spork) -> None:
+        self.calls: Counter[str] = Counter()
+        self.seconds: defaultdict[str, float] = defaultdict(float)
+        # Client._run_event is private, checked against discord.py 2.7. Every listener goes through it.
+        run_event = bot._run_event
+
+        async def timed(coro: Any, event_name: str, *args: Any, **kwargs: Any) -> None:
+            start = time.perf_counter()
+            try:
+                await run_event(coro, event_name, *args, **kwargs)
+            finally:
+                name = getattr(coro, "__qualname__", event_name)
+                self.calls[name] += 1
+                self.seconds[name] += time.perf_counter() - start
+
+        bot._run_event = timed  # type: ignore
+
+
+def recorded_shards(path: Path) -> tuple[dict[str, Any], list[int], int]:
+    """The bot user, shard IDs and shard count from a recording's READY payloads."""
+    user: dict[str, Any] | None = None
+    shard_ids: set[int] = set()
+    shard_count = 1
+    for _, raw in read_recording(path):
+        if '"READY"' not in raw:
+            continue
+        msg = json.loads(raw)
+        if msg.get("t") != "READY":
+            continue
+        user = msg["d"]["user"]
+        shard_id, shard_count = msg["d"].get("shard", (0, 1))
+        shard_ids.add(shard_id)
+
+    if user is None:
+        raise SystemExit(f"{path} has no READY payload, record from a fresh start rather than a resume.")
+    return user, sorted(shard_ids), shard_count
+
+
+async def drain(timeout: float) -> None:
+    """Waits for the event handlers that are still running."""
+    deadline = time.perf_counter() + timeout
+    while (remaining := deadline - time.perf_counter()) > 0:
+        tasks = [task for task in asyncio.all_tasks() if task.get_name().startswith("discord.py")]
+        if not tasks:
+            return
+        await asyncio.wait(tasks, timeout=remaining)
+
+
+async def replay(bot: Spork, path: Path, *, speed: float) -> tuple[Counter[str], float]:
+    """Feeds every recorded dispatch to the bot the way its gateway connection would."""
+    state = bot._connection
+    parsers = state.parsers
+    events: Counter[str] = Counter()
+
+    start = time.perf_counter()
+    for offset, raw in read_recording(path):
+        if speed:
+            delay = offset / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        msg = json.loads(raw)
+        event = msg.get("t")
+        # Anything that isn't a dispatch is about the connection itself, which isn't replayed.
+        if msg.get("op") != 0 or event is None:
+            continue
+
+        bot.dispatch("socket_event_type", event)
+        data = msg["d"]
+        if event == "RESUMED":
+            data["__shard_id__"] = state.shard_ids[0]
+        parser = parsers.get(event)
+        if parser is not None:
+            parser(data)
+        events[event] += 1
+        # The connection yields between messages, so should the replay.
+        await asyncio.sleep(0)
+
+    return events, time.perf_counter() - start
+
+
+async def start_fake_discord(user: dict[str, Any]) -> FakeDiscord:
+    fake = FakeDiscord(user)
+    # Route.BASE is a class attribute every request URL is built from, checked against discord.py 2.7.
+    discord.http.Route.BASE = await fake.start()
+    return fake
+
+
+async def start_bot(session: aiohttp.ClientSession, user: dict[str, Any], shard_ids: list[int], shard_count: int) -> Spork:
+    """A bot with every extension loaded, ready to be fed a recording."""
+    bot = Spork(pool=None, session=session, shard_ids=shard_ids, shard_count=shard_count)  # type: ignore
+    # What logging in does, short of setup_hook, which needs the database. _async_setup_hook is
+    # private, checked against discord.py 2.7, it gives the bot its loop.
+    await bot._async_setup_hook()
+    await bot.http.static_login("replay")
+    state = bot._connection
+    state.shard_ids = shard_ids
+    state.shard_count = shard_count
+    # Chunk requests would need a gateway connection, the recording has the chunks anyway.
+    bot.chunker.enabled = False
+    bot.message_filter = MessageFilter(int(user["id"]))
+    without_database(bot)
+    await bot.extension_loader.load(EXTENSIONS, defer=config.DEFERRED_EXTENSIONS)
+    return bot
+
+
+async def stop_bot(bot: Spork) -> None:
+    for name in list(bot.extensions):
+        await bot.unload_extension(name)
+    await bot.http.close()
+
+
+async def run(args: argparse.Namespace) -> None:
+    path = Path(args.recording)
+    user, shard_ids, shard_count = recorded_shards(path)
+
+    fake = await start_fake_discord(user)
+    async with aiohttp.ClientSession() as session:
+        bot = await start_bot(session, user, shard_ids, shard_count)
+
+        timer = ListenerTimer(bot)
+        if args.tracemalloc:
+            tracemalloc.start()
+        events, elapsed = await replay(bot, path, speed=args.speed)
+        await drain(args.drain)
+        traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        tracemalloc.stop()
+
+        await stop_bot(bot)
+    await fake.close()
+
+    total = sum(events.values())
+    # Kilobytes on Linux, bytes on macOS.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    print(f"Replayed {total:,} events in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} events/s)")
+    print(f"Peak RSS {peak_rss / 2**20:,.1f} MiB", end="")
+    print(f", peak traced {traced_peak / 2**20:,.1f} MiB" if traced_peak is not None else "")
+    print(f"Guilds {len(bot.guilds):,}, users {len(bot.users):,}")
+
+    print("\nEvents:")
+    for event, count in events.most_common(args.top):
+        print(f"  {event:<32} {count:>10,}")
+
+    print("\nListeners (wall time):")
+    listeners = sorted(timer.seconds.items(), key=lambda item: item[1], reverse=True)
+    for name, seconds in listeners[: args.top]:
+        calls = timer.calls[name]
+        print(f"  {name:<40} {calls:>9,} calls  {seconds:>8.3f}s  {seconds / calls * 1e6:>10,.1f}µs/call")
+
+    print("\nHTTP requests:")
+    for route, count in fake.requests.most_common(args.top):
+        print(f"  {route:<60} {count:>8,}")
+
+    if args.json:
+        report = {
+            "revision": git_revision(),
+            "created_at": datetime.datetime.now(datetime.UTC).isoformat(),
+            "python": sys.version.split()[0],
+            "discord.py": discord.__version__,
+            "platform": platform.platform(),
+            "recording": str(path),
+            "speed": args.speed,
+            "elapsed": elapsed,
+            "events": dict(events),
+            "events_per_second": total / max(elapsed, 1e-9),
+            "peak_rss_bytes": peak_rss,
+            "peak_traced_bytes": traced_peak,
+            "listeners": {name: {"calls": timer.calls[name], "seconds": seconds} for name, seconds in listeners},
+            "requests": dict(fake.requests),
+        }
+        with Path(args.json).open("w") as file:
+            json.dump(report, file, indent=2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="a recording written by the gateway recorder")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay this many times faster, 0 for no pacing")
+    parser.add_argument("--drain", type=float, default=30.0, help="seconds to wait for handlers still running at the end")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report peak Python allocations (slower)")
+    parser.add_argument("--top", type=int, default=20, help="rows to show per table")
+    parser.add_argument("--json", help="write the results to this file")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Replays a tiny generated session with a few commands and checks that every one of them replied.
+
+A full replay only reports how long things took, a command failing on every message looks
+the same as one working. Run this first to make sure the harness still carries real
+command handling: ``python -m benchmarks.smoke``. Exits non-zero if any command failed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+import discord
+
+import config
+
+from .replay import drain, recorded_shards, replay, start_bot, start_fake_discord, stop_bot
+from .synthetic import BOT_ID, CHANNEL_ID, FIRST_USER_ID, GUILD_ID, guild_payload
+
+if TYPE_CHECKING:
+    from discord.ext import commands
+
+COMMANDS = ("about", "whois", "serverinfo", "invitedby")
+
+BOT_USER = {"id": str(BOT_ID), "username": "spork", "discriminator": "0", "avatar": None, "bot": True}
+
+
+def _dispatch(event: str, data: dict[str, Any], seq: int) -> dict[str, Any]:
+    return {"op": 0, "t": event, "s": seq, "d": data}
+
+
+def write_recording(path: Path, prefix: str, *, members: int = 100) -> None:
+    """A session like the gateway recorder writes: READY, one guild and a message per command."""
+    author = {"id": str(FIRST_USER_ID), "username": "owner", "discriminator": "0", "avatar": None}
+    now = discord.utils.utcnow().isoformat()
+    payloads = [
+        _dispatch(
+            "READY",
+            {
+                "v": 10,
+                "user": BOT_USER,
+                "guilds": [{"id": str(GUILD_ID), "unavailable": True}],
+                "session_id": "smoke",
+                "resume_gateway_url": "wss://gateway.invalid",
+                "shard": [0, 1],
+                "application": {"id": str(BOT_ID), "flags": 0},
+            },
+            1,
+        ),
+        _dispatch("GUILD_CREATE", guild_payload(members), 2),
+    ]
+    for i, name in enumerate(COMMANDS):
+        message = {
+            "id": str(discord.utils.time_snowflake(discord.utils.utcnow()) + i),
+            "channel_id": str(CHANNEL_ID),
+            "guild_id": str(GUILD_ID),
+            "author": author,
+            "member": {"roles": [], "joined_at": now, "deaf": False, "mute": False},
+            "content": f"{prefix}{name}",
+            "timestamp": now,
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+        }
+        payloads.append(_dispatch("MESSAGE_CREATE", message, 3 + i))
+
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        for offset, payload in enumerate(payloads):
+            file.write(f"{offset / 100:.6f}\t{json.dumps(payload)}\n")
+
+
+async def check(*, drain_timeout: float = 30.0) -> list[str]:
+    """Replays the smoke session, returning what went wrong."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "smoke.jsonl.gz"
+        write_recording(path, config.PREFIX)
+        user, shard_ids, shard_count = recorded_shards(path)
+
+        fake = await start_fake_discord(user)
+        completed: list[str] = []
+        errors: dict[str, str] = {}
+
+        async def on_command_completion(ctx: commands.Context[Any]) -> None:
+            assert ctx.command
+            completed.append(ctx.command.qualified_name)
+
+        async def on_command_error(ctx: commands.Context[Any], error: commands.CommandError) -> None:
+            name = ctx.command.qualified_name if ctx.command else str(ctx.invoked_with)
+            errors[name] = f"{type(error).__name__}: {error}"
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                bot = await start_bot(session, user, shard_ids, shard_count)
+                bot.add_listener(on_command_completion)
+                bot.add_listener(on_command_error)
+                await replay(bot, path, speed=0)
+                await drain(drain_timeout)
+                await stop_bot(bot)
+        finally:
+            await fake.close()
+
+    problems = [f"{name}: {error}" for name, error in errors.items()]
+    problems.extend(f"{name}: never completed" for name in COMMANDS if name not in completed and name not in errors)
+    replies = fake.requests["POST /api/v10/channels/{channel_id}/messages"]
+    if replies < len(COMMANDS):
+        problems.append(f"only {replies} of {len(COMMANDS)} commands sent a message")
+    return problems
+
+
+def main() -> None:
+    problems = asyncio.run(check())
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+    print(f"All {len(COMMANDS)} commands replied: {', '.join(COMMANDS)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Synthetic guilds, members and messages built from gateway-shaped payloads.
+
+Everything goes through discord.py's own constructors with the bot's connection state,
+so the objects behave like cached ones without a connection to Discord.
+"""
+
+from __future__ import annotations
+
+import datetime
+import random
+from types import SimpleNamespace
+from typing import Any
+
+import discord
+
+from bot import Spork
+from exts.utils.prefilter import MessageFilter
+
+BOT_ID = 1227088846655586384
+GUILD_ID = 336642139381301249
+CHANNEL_ID = 336642139381301250
+# Snowflakes from here on are roughly 2024 onwards.
+FIRST_USER_ID = 1_200_000_000_000_000_000
+
+STATUSES = ("online", "idle", "dnd", "offline", "offline", "offline")
+CHAT = ("lol", "has anyone tried the new update yet?", "gg", "I think the problem is in the config")
+
+
+def make_bot() -> Spork:
+    bot = Spork(pool=None, session=None)  # type: ignore # benchmarks never touch the database or HTTP
+    user = discord.ClientUser(
+        state=bot._connection,
+        data={"id": BOT_ID, "username": "spork", "discriminator": "0", "avatar": None, "bot": True},  # type: ignore
+    )
+    bot._connection.user = user
+    bot.message_filter = MessageFilter(BOT_ID)
+    without_database(bot)
+    return bot
+
+
+def without_database(bot: Spork) -> None:
+    """Answers the database reads commands make with fixed rows, benchmarks never touch Postgres."""
+
+    async def member_growth(guild_id: int) -> dict[str, int | None]:
+        return {"day": 99_000, "week": 95_000, "month": 80_000}
+
+    bot.db.member_growth = member_growth  # type: ignore
+
+
+def _member(user_id: int, rng: random.Random, joined: datetime.datetime) -> dict[str, Any]:
+    premium_since = None
+    if rng.random() < 0.01:
+        premium_since = (joined + datetime.timedelta(days=rng.randrange(1, 300))).isoformat()
+    return {
+        "user": {
+            "id": str(user_id),
+            "username": f"user{user_id % 100_000}",
+            "discriminator": "0",
+            "avatar": None,
+            "bot": rng.random() < 0.02,
+        },
+        "roles": [],
+        "joined_at": (joined + datetime.timedelta(seconds=rng.randrange(0, 10**8))).isoformat(),
+        "premium_since": premium_since,
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def guild_payload(members: int, *, seed: int = 0) -> dict[str, Any]:
+    """A GUILD_CREATE payload with ``members`` members (the bot included) and presences for all of them."""
+    rng = random.Random(seed)
+    joined = datetime.datetime(2020, 1, 1, tzinfo=datetime.UTC)
+    user_ids = [BOT_ID, *(FIRST_USER_ID + i for i in range(members - 1))]
+
+    return {
+        "id": str(GUILD_ID),
+        "name": "Synthetic Guild",
+        "owner_id": str(user_ids[1] if members > 1 else BOT_ID),
+        "icon": "a" * 32,
+        "banner": "b" * 32,
+        "splash": None,
+        "member_count": members,
+        "max_members": 500_000,
+        "premium_tier": 2,
+        "premium_subscription_count": members // 100,
+        "roles": [{"id": str(GUILD_ID), "name": "@everyone", "permissions": "104320577", "position": 0}],
+        "channels": [{"id": str(CHANNEL_ID), "type": 0, "name": "general", "position": 0}],
+        "members": [_member(user_id, rng, joined) for user_id in user_ids],
+        "presences": [
+            {"user": {"id": str(user_id)}, "status": rng.choice(STATUSES), "activities": [], "client_status": {}}
+            for user_id in user_ids
+        ],
+    }
+
+
+def make_guild(bot: Spork, members: int, *, seed: int = 0) -> discord.Guild:
+    """A chunked guild with ``members`` members (the bot included) and presences for all of them."""
+    guild = discord.Guild(data=guild_payload(members, seed=seed), state=bot._connection)  # type: ignore
+    bot._connection._add_guild(guild)
+    return guild
+
+
+def make_messages(bot: Spork, guild: discord.Guild, count: int, *, seed: int = 0) -> list[discord.Message]:
+    """Channel history as cleanup sees it: mostly chat, some commands and some of the bot's own replies."""
+    rng = random.Random(seed)
+    channel = guild.get_channel(CHANNEL_ID)
+    prefix = bot.prefixes.get(guild.id)
+    members = guild.members
+
+    messages = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.1:
+            author, content = bot.user, "Removed 3 messages."
+        else:
+            author = rng.choice(members)
+            content = f"{prefix}serverinfo" if roll < 0.2 else rng.choice(CHAT)
+        assert author
+        data = {
+            "id": str(FIRST_USER_ID * 2 + i),
+            "channel_id": str(CHANNEL_ID),
+            "author": {"id": str(author.id), "username": author.name, "discriminator": "0", "avatar": None},
+            "content": content,
+            "timestamp": "2025-01-01T00:00:00+00:00",
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+        }
+        messages.append(discord.Message(state=bot._connection, channel=channel, data=data))  # type: ignore
+    return messages
+
+
+class Sink:
+    """Stands in for anything that can be sent to, keeping the last thing sent."""
+
+    def __init__(self) -> None:
+        self.sent: dict[str, Any] = {}
+
+    async def __call__(self, *args: Any, **kwargs: Any) -> None:
+        self.sent = kwargs
+
+
+def make_context(guild: discord.Guild, author: discord.Member) -> Any:
+    message = SimpleNamespace(created_at=discord.utils.utcnow(), id=FIRST_USER_ID * 3)
+    return SimpleNamespace(guild=guild, author=author, channel=guild.get_channel(CHANNEL_ID), message=message, send=Sink())
@@ -1,8 +1,14 @@
+from __future__ import annotations
+
+import argparse
 import asyncio
 import logging
-import logging.handlers
+import math
+import queue
 import sys
+import tracemalloc
 from pathlib import Path
+from typing import Any
 
 import asyncpg
 import discord
@@ -11,81 +17,294 @@ from discord import Activity, ActivityType, Status
 from discord.ext import commands
 
 import config
+from cluster import IPCClient, Launcher
 from exts import EXTENSIONS
+from exts.utils import db, migrations
+from exts.utils.chunking import ChunkScheduler
+from exts.utils.edits import EditFilter
+from exts.utils.extensions import ExtensionLoader, StartupTimer
+from exts.utils.gateway import GatewayRecorder
+from exts.utils.logs import (
+    BatchedRotatingFileHandler,
+    BatchedStreamHandler,
+    BatchingQueueListener,
+    CappedTracebackFormatter,
+    DroppingQueueHandler,
+    JSONFormatter,
+)
+from exts.utils.hoststats import HostSampler
+from exts.utils.invites import InviteTracker
+from exts.utils.loopmonitor import LoopMonitor
+from exts.utils.message_index import MessageIndex
+from exts.utils.metrics import CommandMetrics
+from exts.utils.prefilter import MessageFilter, MessageKind
+from exts.utils.prefixes import PrefixCache
+from exts.utils.stats import GuildStatsStore
+from exts.utils.user_guilds import UserGuildIndex
 
 
-def setup_logging() -> None:
+def setup_logging(cluster_id: int | None = None) -> BatchingQueueListener:
     # Logging credit: Fretgfr
 
-    log_fmt = logging.Formatter(
+    formatter_cls = JSONFormatter if config.LOG_JSON else CappedTracebackFormatter
+    log_fmt = formatter_cls(
         fmt="%(asctime)s - %(name)s:%(lineno)d - %(levelname)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
+        max_frames=config.LOG_MAX_TRACEBACK_FRAMES,
+        per_minute=config.LOG_MAX_TRACEBACKS_PER_MINUTE,
     )
 
-    sh = logging.StreamHandler(sys.stdout)
+    sh = BatchedStreamHandler(sys.stdout)
     sh.setLevel(logging.DEBUG)
     sh.setFormatter(log_fmt)
 
     max_bytes = 4 * 1024 * 1024  # 4 MB
-    rfh = logging.handlers.RotatingFileHandler("logs/superior-spork.log", maxBytes=max_bytes, backupCount=10)
+    filename = "superior-spork.log" if cluster_id is None else f"superior-spork-{cluster_id}.log"
+    rfh = BatchedRotatingFileHandler(f"logs/{filename}", maxBytes=max_bytes, backupCount=10)
     rfh.setLevel(logging.DEBUG)
     rfh.setFormatter(log_fmt)
 
     HANDLER = sh if config.TESTING else rfh
 
+    # Records are only queued on the event loop, a writer thread formats and writes them.
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    listener = BatchingQueueListener(log_queue, HANDLER, queue_handler=queue_handler)
+    listener.start()
+
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(HANDLER)
+    root_logger.addHandler(queue_handler)
+    return listener
 
 
 _logger = logging.getLogger(__name__)
 
 
-class Spork(commands.Bot):
-    def __init__(self, pool: asyncpg.Pool, session: ClientSession) -> None:
+def get_guild_prefix(bot: Spork, message: discord.Message) -> list[str]:
+    guild_id = message.guild.id if message.guild else None
+    return commands.when_mentioned_or(bot.prefixes.get(guild_id))(bot, message)
+
+
+class Spork(commands.AutoShardedBot):
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        session: ClientSession,
+        *,
+        cluster_id: int | None = None,
+        shard_ids: list[int] | None = None,
+        shard_count: int | None = None,
+        ipc: IPCClient | None = None,
+    ) -> None:
+        intents = discord.Intents(
+            emojis=True,
+            guilds=True,
+            invites=True,
+            members=True,
+            message_content=True,
+            messages=True,
+            presences=config.CACHE_PRESENCES,
+            reactions=True,
+            voice_states=True,
+        )
+        if config.LEAN_CACHE:
+            member_cache_flags = discord.MemberCacheFlags(voice=True, joined=False)
+        else:
+            member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+
         super().__init__(
-            command_prefix=commands.when_mentioned_or(config.PREFIX),
-            intents=discord.Intents(
-                emojis=True,
-                guilds=True,
-                invites=True,
-                members=True,
-                message_content=True,
-                messages=True,
-                presences=True,
-                reactions=True,
-                voice_states=True,
-            ),
+            command_prefix=get_guild_prefix,
+            intents=intents,
+            member_cache_flags=member_cache_flags,
+            max_messages=config.MESSAGE_CACHE_SIZE,
+            # Guilds are chunked in the background by self.chunker, the bot is ready before that.
+            chunk_guilds_at_startup=False,
             status=Status.dnd,
             activity=Activity(type=ActivityType.watching, name=f"my bad code | {config.PREFIX}help"),
             case_insensitive=True,
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            enable_debug_events=config.GATEWAY_RECORD_PATH is not None,
         )
         self.start_time = discord.utils.utcnow()
+        self.startup = StartupTimer()
+        self.extension_loader = ExtensionLoader(self, self.startup)
         self.pool = pool
         self.session = session
+        self.cluster_id = cluster_id
+        self.ipc = ipc
+        self.db = db.Database(pool, flush_interval=config.DB_FLUSH_INTERVAL)
+        self.prefixes = PrefixCache(self.db, default=config.PREFIX)
+        self.guild_stats = GuildStatsStore()
+        self.user_guilds = UserGuildIndex()
+        self.chunker = ChunkScheduler(self, concurrency=config.CHUNK_CONCURRENCY, enabled=not config.LEAN_CACHE)
+        self.message_index = MessageIndex()
+        self.invite_tracker = InviteTracker()
+        self.edit_filter = EditFilter(max_age=config.EDIT_COMMAND_MAX_AGE)
+        self.metrics = CommandMetrics()
+        self.loop_monitor = LoopMonitor(block_threshold=config.LOOP_BLOCK_THRESHOLD)
+        self.host_stats = HostSampler(interval=config.HOST_SAMPLE_INTERVAL, samples=config.HOST_SAMPLES)
+        self.gateway_recorder: GatewayRecorder | None = None
+        if config.GATEWAY_RECORD_PATH is not None:
+            self.gateway_recorder = GatewayRecorder(Path(config.GATEWAY_RECORD_PATH), cluster_id=cluster_id)
 
     async def setup_hook(self) -> None:
-        for ext in EXTENSIONS:
-            await self.load_extension(ext.name)
-            _logger.info("Loaded %sextension: %s", "module " if ext.ispkg else "", ext.name)
+        assert self.user
+        self.message_filter = MessageFilter(self.user.id)
+
+        await self.extension_loader.load(EXTENSIONS, defer=config.DEFERRED_EXTENSIONS)
+
+        with self.startup.step("database"):
+            if config.RUN_MIGRATIONS_ON_START:
+                await migrations.migrate(self.pool)
+            elif todo := await migrations.pending(self.pool):
+                _logger.warning(
+                    "The database is missing %s migrations, run `python bot.py --migrate` to apply them", len(todo)
+                )
+
+            await self.prefixes.start()
+            self.db.start()
+
+        with self.startup.step("jishaku"):
+            await self.load_extension("jishaku")
+            _logger.info("Extension: jishaku loaded successfully")
+
+        with self.startup.step("command tree"):
+            # Builds every payload a sync would send, so broken app commands fail at startup.
+            payloads = [command.to_dict(self.tree) for command in self.tree.get_commands()]
+            _logger.info("Prepared %s application commands", len(payloads))
+
+        if self.ipc is not None:
+            with self.startup.step("ipc"):
+                await self.ipc.connect(self.cluster_stats)
+
+        _logger.info("Setup finished:\n%s", self.startup.report())
 
-        with Path("./database/schema.sql").open() as file:
-            sql = file.read()
-            await self.pool.execute(sql)
+    async def on_ready(self) -> None:
+        # on_ready fires again after every reconnect that had to start a new session.
+        if self.startup.ready is not None:
+            return
+        _logger.info("Ready in %.2fs", self.startup.mark_ready())
 
-        await self.load_extension("jishaku")
-        _logger.info("Extension: jishaku loaded successfully")
+        if self.ipc is not None:
+            await self.ipc.send("ready", cluster=self.ipc.cluster_id)
+
+    def cluster_stats(self) -> dict[str, Any]:
+        """The stats this process reports to the rest of the cluster."""
+        return {
+            "cluster": self.cluster_id or 0,
+            "guilds": len(self.guilds),
+            "users": len(self.users),
+            # Latency is inf until the first heartbeat is acknowledged, which JSON can't represent.
+            "shards": {str(shard_id): latency if math.isfinite(latency) else None for shard_id, latency in self.latencies},
+        }
+
+    async def on_message(self, message: discord.Message) -> None:
+        if message.author.bot:
+            if message.guild is not None:
+                self.message_index.add(message.channel.id, message.id, own=message.author.id == self.message_filter.user_id)
+            return
+
+        guild_id = message.guild.id if message.guild else None
+        kind = self.message_filter.classify(message.content, self.prefixes.get(guild_id))
+        if guild_id is not None:
+            self.chunker.touch(guild_id)
+            # Every message counts towards what cleanup checks, anything starting with a prefix is cleaned up.
+            self.message_index.add(message.channel.id, message.id, trigger=kind is MessageKind.command)
+        if kind is MessageKind.mention:
+            self.dispatch("bot_mention", message)
+        elif kind is MessageKind.command:
+            self.edit_filter.mark(message)
+            await self.process_commands(message)
 
     async def on_message_edit(self, before: discord.Message, after: discord.Message) -> None:
-        await self.process_commands(after)
+        if after.author.bot or not self.edit_filter.should_process(before, after):
+            return
+
+        guild_id = after.guild.id if after.guild else None
+        if self.message_filter.classify(after.content, self.prefixes.get(guild_id)) is MessageKind.command:
+            if guild_id is not None:
+                self.message_index.add(after.channel.id, after.id, trigger=True)
+            await self.process_commands(after)
+
+    async def get_context(self, origin: discord.Message | discord.Interaction, /, *, cls: Any = commands.Context) -> Any:
+        ctx = await super().get_context(origin, cls=cls)
+        if ctx.command is None and ctx.invoked_with and (info := self.extension_loader.deferred_for(ctx.invoked_with)):
+            await self.extension_loader.load_deferred(info)
+            ctx = await super().get_context(origin, cls=cls)
+        return ctx
+
+    async def close(self) -> None:
+        # Extensions are unloaded first, anything they buffer on the way out is still flushed.
+        await super().close()
+        await self.prefixes.close()
+        await self.db.close()
+        if self.ipc is not None:
+            await self.ipc.close()
 
 
-async def main() -> None:
-    setup_logging()
-    async with ClientSession() as session, asyncpg.create_pool(config.DB_URL, command_timeout=30) as pool:
-        async with Spork(pool=pool, session=session) as bot:
-            await bot.start(config.TOKEN, reconnect=True)
+async def main(
+    *,
+    cluster_id: int | None = None,
+    shard_ids: list[int] | None = None,
+    shard_count: int | None = None,
+    ipc_port: int | None = None,
+) -> None:
+    listener = setup_logging(cluster_id)
+    if config.TRACEMALLOC_FRAMES:
+        tracemalloc.start(config.TRACEMALLOC_FRAMES)
+
+    ipc = IPCClient(cluster_id, ipc_port) if cluster_id is not None and ipc_port is not None else None
+    try:
+        async with ClientSession() as session, asyncpg.create_pool(
+            config.DB_URL,
+            command_timeout=30,
+            max_size=config.DB_POOL_SIZE,
+            min_size=min(config.DB_POOL_SIZE, 10),
+            init=db.init_connection,
+        ) as pool:
+            async with Spork(
+                pool=pool,
+                session=session,
+                cluster_id=cluster_id,
+                shard_ids=shard_ids,
+                shard_count=shard_count,
+                ipc=ipc,
+            ) as bot:
+                await bot.start(config.TOKEN, reconnect=True)
+    finally:
+        listener.stop()
+
+
+async def launch_cluster(clusters: int, shard_count: int | None) -> None:
+    listener = setup_logging()
+    try:
+        await Launcher(clusters, shard_count).run()
+    finally:
+        listener.stop()
+
+
+async def run_migrations() -> None:
+    listener = setup_logging()
+    try:
+        async with asyncpg.create_pool(config.DB_URL, command_timeout=None, max_size=1) as pool:
+            applied = await migrations.migrate(pool)
+        _logger.info("Applied %s migrations", len(applied) if applied else "no")
+    finally:
+        listener.stop()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Runs SuperiorSpork.")
+    parser.add_argument("--cluster", type=int, metavar="PROCESSES", help="run the bot across this many processes")
+    parser.add_argument("--shards", type=int, help="total shard count for --cluster, defaults to Discord's recommendation")
+    parser.add_argument("--migrate", action="store_true", help="apply pending database migrations and exit")
+    args = parser.parse_args()
+
+    if args.migrate:
+        asyncio.run(run_migrations())
+    elif args.cluster:
+        asyncio.run(launch_cluster(args.cluster, args.shards))
+    else:
+        asyncio.run(main())
@@ -0,0 +1,247 @@
+"""Runs the bot as several processes that each own a contiguous range of shards.
+
+The launcher starts one worker process per cluster and hosts a tiny IPC server on
+localhost. Workers push their stats to it periodically and can ask it for the
+latest stats of every cluster. Messages are newline delimited JSON objects.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import time
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+
+import config
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+_logger = logging.getLogger(__name__)
+
+# Seconds between stats reports from each worker.
+REPORT_INTERVAL = 10.0
+# Discord allows one IDENTIFY per 5 seconds per concurrency bucket.
+IDENTIFY_INTERVAL = 5.5
+
+
+def shard_ranges(shard_count: int, clusters: int) -> list[list[int]]:
+    per_cluster = math.ceil(shard_count / clusters)
+    return [list(range(start, min(start + per_cluster, shard_count))) for start in range(0, shard_count, per_cluster)]
+
+
+async def recommended_shards(token: str) -> int:
+    headers = {"Authorization": f"Bot {token}"}
+    async with aiohttp.ClientSession() as session:
+        async with session.get("https://discord.com/api/v10/gateway/bot", headers=headers) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+    return data["shards"]
+
+
+async def _send(writer: asyncio.StreamWriter, payload: dict[str, Any]) -> None:
+    writer.write(json.dumps(payload, separators=(",", ":")).encode() + b"\n")
+    await writer.drain()
+
+
+class IPCServer:
+    """The launcher's side of the IPC channel."""
+
+    def __init__(self) -> None:
+        self.stats: dict[int, dict[str, Any]] = {}
+        self.ready: dict[int, asyncio.Event] = {}
+        self._server: asyncio.Server | None = None
+
+    @property
+    def port(self) -> int:
+        assert self._server
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, host="127.0.0.1", port=0)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def ready_event(self, cluster_id: int) -> asyncio.Event:
+        return self.ready.setdefault(cluster_id, asyncio.Event())
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        cluster_id = None
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                op = message["op"]
+                if op == "identify":
+                    cluster_id = message["cluster"]
+                    _logger.info("Cluster %s connected to IPC", cluster_id)
+                elif op == "ready":
+                    self.ready_event(message["cluster"]).set()
+                elif op == "stats":
+                    self.stats[message["data"]["cluster"]] = message["data"]
+                elif op == "request" and message["type"] == "cluster_stats":
+                    data = sorted(self.stats.values(), key=lambda s: s["cluster"])
+                    await _send(writer, {"op": "response", "nonce": message["nonce"], "data": data})
+                else:
+                    _logger.warning("Unknown IPC message from cluster %s: %s", cluster_id, message)
+        except (ConnectionError, json.JSONDecodeError, KeyError):
+            _logger.exception("IPC connection with cluster %s failed", cluster_id)
+        finally:
+            writer.close()
+            _logger.info("Cluster %s disconnected from IPC", cluster_id)
+
+
+class IPCClient:
+    """A worker's side of the IPC channel."""
+
+    def __init__(self, cluster_id: int, port: int) -> None:
+        self.cluster_id = cluster_id
+        self.port = port
+        self._nonces = itertools.count()
+        self._pending: dict[int, asyncio.Future[Any]] = {}
+        self._writer: asyncio.StreamWriter | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+
+    async def connect(self, collect_stats: Callable[[], dict[str, Any]]) -> None:
+        reader, self._writer = await asyncio.open_connection("127.0.0.1", self.port)
+        await self.send("identify", cluster=self.cluster_id)
+        self._tasks = [
+            asyncio.create_task(self._read(reader)),
+            asyncio.create_task(self._report(collect_stats)),
+        ]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def send(self, op: str, **data: Any) -> None:
+        if self._writer is None:
+            raise ConnectionError("Not connected to the cluster launcher")
+        await _send(self._writer, {"op": op, **data})
+
+    async def request(self, type: str, *, timeout: float = 5.0) -> Any:
+        nonce = next(self._nonces)
+        future = self._pending[nonce] = asyncio.get_running_loop().create_future()
+        try:
+            await self.send("request", type=type, nonce=nonce)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(nonce, None)
+
+    async def cluster_stats(self) -> list[dict[str, Any]]:
+        return await self.request("cluster_stats")
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        while line := await reader.readline():
+            message = json.loads(line)
+            if message["op"] == "response" and (future := self._pending.get(message["nonce"])) and not future.done():
+                future.set_result(message["data"])
+        _logger.warning("Lost the IPC connection to the cluster launcher")
+
+    async def _report(self, collect_stats: Callable[[], dict[str, Any]]) -> None:
+        while True:
+            try:
+                await self.send("stats", data=collect_stats())
+            except ConnectionError:
+                _logger.warning("Could not report stats to the cluster launcher")
+            await asyncio.sleep(REPORT_INTERVAL)
+
+
+def _run_worker(cluster_id: int, shard_ids: list[int], shard_count: int, port: int) -> None:
+    import bot
+
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(bot.main(cluster_id=cluster_id, shard_ids=shard_ids, shard_count=shard_count, ipc_port=port))
+
+
+class Launcher:
+    def __init__(self, clusters: int, shard_count: int | None = None) -> None:
+        self.clusters = clusters
+        self.shard_count = shard_count
+        self.ipc = IPCServer()
+        self.processes: dict[int, multiprocessing.process.BaseProcess] = {}
+        self._context = multiprocessing.get_context("spawn")
+        self._closing = False
+
+    def _spawn(self, cluster_id: int, shard_ids: list[int], shard_count: int) -> None:
+        process = self._context.Process(
+            target=_run_worker,
+            args=(cluster_id, shard_ids, shard_count, self.ipc.port),
+            name=f"spork-cluster-{cluster_id}",
+        )
+        process.start()
+        self.processes[cluster_id] = process
+        _logger.info("Started cluster %s (pid %s) with shards %s-%s", cluster_id, process.pid, shard_ids[0], shard_ids[-1])
+
+    async def run(self) -> None:
+        shard_count = self.shard_count or await recommended_shards(config.TOKEN)
+        ranges = shard_ranges(shard_count, self.clusters)
+        await self.ipc.start()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+
+        try:
+            for cluster_id, shard_ids in enumerate(ranges):
+                if self._closing:
+                    return
+                self._spawn(cluster_id, shard_ids, shard_count)
+                # Start clusters one at a time so their IDENTIFYs don't trip the rate limit.
+                timeout = len(shard_ids) * IDENTIFY_INTERVAL + 60
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self.ipc.ready_event(cluster_id).wait(), timeout)
+
+            await self._supervise(ranges, shard_count)
+        finally:
+            self.stop()
+            for process in self.processes.values():
+                await asyncio.to_thread(process.join, 30)
+            await self.ipc.close()
+
+    async def _supervise(self, ranges: list[list[int]], shard_count: int) -> None:
+        restarted_at: dict[int, float] = {}
+        # Dead clusters waiting out their back-off, by when they can be restarted.
+        restart_after: dict[int, float] = {}
+        while not self._closing:
+            await asyncio.sleep(5)
+            for cluster_id, process in list(self.processes.items()):
+                if process.is_alive() or self._closing:
+                    continue
+                now = time.monotonic()
+                if cluster_id not in restart_after:
+                    _logger.warning("Cluster %s exited with code %s", cluster_id, process.exitcode)
+                    restart_after[cluster_id] = now
+                    # Back off if a cluster keeps dying straight away, without holding up the others.
+                    if cluster_id in restarted_at and now - restarted_at[cluster_id] < 60:
+                        restart_after[cluster_id] += 30
+                        _logger.warning("Cluster %s is crash looping, restarting it in 30s", cluster_id)
+                if now < restart_after[cluster_id]:
+                    continue
+                del restart_after[cluster_id]
+                restarted_at[cluster_id] = now
+                self.ipc.stats.pop(cluster_id, None)
+                self._spawn(cluster_id, ranges[cluster_id], shard_count)
+
+    def stop(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        for process in self.processes.values():
+            if process.is_alive() and process.pid is not None:
+                # SIGINT lets asyncio.run cancel the worker's main task so the bot closes cleanly.
+                os.kill(process.pid, signal.SIGINT)
@@ -10,9 +10,77 @@ _db_url = "dsn"
 _test_db_url = "dsn"
 DB_URL = _test_db_url if TESTING else _db_url
 
+# Connections kept open to the database, and how often buffered writes are flushed in seconds.
+DB_POOL_SIZE = 10
+DB_FLUSH_INTERVAL = 2.0
+
+# Apply pending migrations from database/migrations when the bot starts. Turn this off to
+# run `python bot.py --migrate` once before restarting the processes instead.
+RUN_MIGRATIONS_ON_START = True
+
 _prefix = ",,"
 _test_prefix = "t,"
 PREFIX = _test_prefix if TESTING else _prefix
 
+# Cache sizing, lean mode only caches the bot itself and members in voice channels
+# and doesn't chunk guilds, commands fall back to the API where they need full data.
+LEAN_CACHE = False
+MESSAGE_CACHE_SIZE = 1000  # None disables the message cache
+CACHE_PRESENCES = True
+# Guilds chunked at once in the background after startup, unless in lean mode.
+CHUNK_CONCURRENCY = 2
+
+# Member, online and booster counts of every guild are recorded every MEMBER_HISTORY_INTERVAL
+# seconds and rolled up hourly and daily. Each resolution is kept for this many days.
+MEMBER_HISTORY_INTERVAL = 600.0
+MEMBER_HISTORY_RAW_DAYS = 2
+MEMBER_HISTORY_HOURLY_DAYS = 35
+MEMBER_HISTORY_DAILY_DAYS = 730
+
+# Edited messages only run commands again if they were sent at most this many seconds ago.
+EDIT_COMMAND_MAX_AGE = 300.0
+
+# Start tracemalloc at boot with this many frames per allocation so memreport sees
+# every allocation, 0 leaves it off until the command is first used.
+TRACEMALLOC_FRAMES = 0
+
+# Serve Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics, None disables it.
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT: int | None = None
+
+# Log as one JSON object per line instead of plain text.
+LOG_JSON = False
+# Tracebacks are cut to their last LOG_MAX_TRACEBACK_FRAMES frames and only the first
+# LOG_MAX_TRACEBACKS_PER_MINUTE each minute are written in full.
+LOG_MAX_TRACEBACK_FRAMES = 30
+LOG_MAX_TRACEBACKS_PER_MINUTE = 60
+# Records waiting for the log writer thread, any more are dropped and counted.
+LOG_QUEUE_SIZE = 10_000
+
+# Command errors are grouped by exception type and location, each group's traceback is
+# logged once per ERROR_SUMMARY_INTERVAL seconds and repeats are summarised as counts.
+ERROR_SUMMARY_INTERVAL = 60.0
+# Also write the per-interval counts to the error_counts table.
+PERSIST_ERROR_COUNTS = False
+
+# Extensions only loaded once one of their commands is first used, e.g. ["exts.dev"].
+# They must only have text commands, slash commands aren't registered until they load.
+DEFERRED_EXTENSIONS: list[str] = []
+
+# Log any callback that keeps the event loop busy for longer than this many seconds.
+LOOP_BLOCK_THRESHOLD = 0.25
+
+# Sample CPU and memory use every HOST_SAMPLE_INTERVAL seconds, keeping the last HOST_SAMPLES samples.
+HOST_SAMPLE_INTERVAL = 5.0
+HOST_SAMPLES = 120
+
+# Rendered graphics previews are cached here, and rendered by this many worker processes.
+PREVIEW_CACHE_PATH = "cache/previews"
+PREVIEW_WORKERS = 2
+
+# Record raw gateway payloads to a new file in this directory on every start, for replaying with
+# `python -m benchmarks.replay`. Recording is off when this is None.
+GATEWAY_RECORD_PATH: str | None = None
+
 os.environ["JISHAKU_NO_UNDERSCORE"] = "True"
 os.environ["JISHAKU_NO_DM_TRACEBACK"] = "True"
@@ -0,0 +1,20 @@
+CREATE TABLE IF NOT EXISTS guilds (
+    id bigint PRIMARY KEY,
+    prefix text
+);
+
+-- Lets every bot process keep its prefix cache in sync (see exts/utils/prefixes.py)
+CREATE OR REPLACE FUNCTION notify_guild_prefix() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('guild_prefixes', json_build_object('id', OLD.id, 'prefix', NULL)::text);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('guild_prefixes', json_build_object('id', NEW.id, 'prefix', NEW.prefix)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER guild_prefix_changed
+    AFTER INSERT OR DELETE OR UPDATE OF prefix ON guilds
+    FOR EACH ROW EXECUTE FUNCTION notify_guild_prefix();
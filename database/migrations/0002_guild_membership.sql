@@ -0,0 +1,12 @@
+-- Written in batches by exts/utils/db.py
+ALTER TABLE guilds
+    ADD COLUMN IF NOT EXISTS joined_at timestamptz,
+    ADD COLUMN IF NOT EXISTS left_at timestamptz;
+
+CREATE TABLE IF NOT EXISTS guild_events (
+    guild_id bigint NOT NULL,
+    joined boolean NOT NULL,
+    at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS guild_events_guild_id_at_idx ON guild_events (guild_id, at);
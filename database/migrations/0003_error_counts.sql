@@ -0,0 +1,13 @@
+-- Command errors counted per fingerprint and summary window, written in batches by exts/utils/db.py
+CREATE TABLE IF NOT EXISTS error_counts (
+    fingerprint text NOT NULL,
+    window_start timestamptz NOT NULL,
+    error_type text NOT NULL,
+    location text NOT NULL,
+    message text NOT NULL,
+    commands jsonb NOT NULL,
+    count integer NOT NULL,
+    PRIMARY KEY (fingerprint, window_start)
+);
+
+CREATE INDEX IF NOT EXISTS error_counts_window_start_idx ON error_counts (window_start);
@@ -0,0 +1,6 @@
+-- The hash of the command tree last synced to each target, 0 being the global commands
+CREATE TABLE IF NOT EXISTS command_tree_hashes (
+    target bigint PRIMARY KEY,
+    hash text NOT NULL,
+    synced_at timestamptz NOT NULL DEFAULT now()
+);
@@ -0,0 +1,39 @@
+-- Periodic member counts per guild, written in batches by exts/utils/db.py. Raw samples are
+-- rolled up into hourly and daily aggregates and each table is pruned after its retention.
+CREATE TABLE IF NOT EXISTS member_counts (
+    guild_id bigint NOT NULL,
+    at timestamptz NOT NULL,
+    members integer NOT NULL,
+    online integer,
+    boosters integer NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS member_counts_at_idx ON member_counts (at);
+
+CREATE TABLE IF NOT EXISTS member_counts_hourly (
+    guild_id bigint NOT NULL,
+    hour timestamptz NOT NULL,
+    members_min integer NOT NULL,
+    members_max integer NOT NULL,
+    members_last integer NOT NULL,
+    online_avg real,
+    boosters_last integer NOT NULL,
+    samples integer NOT NULL,
+    PRIMARY KEY (guild_id, hour)
+);
+
+CREATE INDEX IF NOT EXISTS member_counts_hourly_hour_idx ON member_counts_hourly (hour);
+
+CREATE TABLE IF NOT EXISTS member_counts_daily (
+    guild_id bigint NOT NULL,
+    day timestamptz NOT NULL,
+    members_min integer NOT NULL,
+    members_max integer NOT NULL,
+    members_last integer NOT NULL,
+    online_avg real,
+    boosters_last integer NOT NULL,
+    samples integer NOT NULL,
+    PRIMARY KEY (guild_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS member_counts_daily_day_idx ON member_counts_daily (day);
@@ -0,0 +1,2 @@
+-- Written in batches by exts/utils/db.py
+ALTER TABLE guilds ADD COLUMN IF NOT EXISTS last_command_at timestamptz;
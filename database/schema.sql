@@ -1,4 +0,0 @@
-CREATE TABLE IF NOT EXISTS guilds (
-    id bigint PRIMARY KEY,
-    prefix text
-);
\ No newline at end of file
@@ -1,17 +1,34 @@
 from __future__ import annotations
 
+import asyncio
+import io
+import threading
+import tracemalloc
 from typing import TYPE_CHECKING, Literal, Optional
 
 import discord
 from discord.ext import commands
 
+from .utils.cache import CACHES
+from .utils.memory import cache_usage
+from .utils.profiler import StackSampler
+from .utils.tree import GLOBAL_TARGET, tree_hash
+
 if TYPE_CHECKING:
     from bot import Spork
 
 
+# Guilds synced at once, each sync is a single request.
+SYNC_CONCURRENCY = 5
+
+# The longest a profile may run, the sampler shares the GIL with the event loop throughout.
+MAX_PROFILE_SECONDS = 60.0
+
+
 class Developer(commands.Cog):
     def __init__(self, bot: Spork) -> None:
         self.bot = bot
+        self._profiling = asyncio.Lock()
 
     @commands.command()
     @commands.guild_only()
@@ -21,9 +38,12 @@ class Developer(commands.Cog):
         ctx: commands.Context,
         guilds: commands.Greedy[discord.Object],
         spec: Literal["~", "*", "^"] | None = None,
+        force: bool = False,
     ) -> None:
         """Syncs command tree.
 
+        Targets whose commands haven't changed since they were last synced are skipped.
+
         Parameters
         -----------
         guilds: list[int]
@@ -33,31 +53,132 @@ class Developer(commands.Cog):
             ~ -> Current Guild
             * -> Globals to current guild
             ^ -> Clear globals copied to current guild.
+        force: bool
+            Sync even if the commands haven't changed.
         """
+        tree = ctx.bot.tree
         if not guilds:
-            if spec == "~":
-                synced = await ctx.bot.tree.sync(guild=ctx.guild)
-            elif spec == "*":
-                ctx.bot.tree.copy_global_to(guild=ctx.guild)
-                synced = await ctx.bot.tree.sync(guild=ctx.guild)
+            if spec == "*":
+                tree.copy_global_to(guild=ctx.guild)
             elif spec == "^":
-                ctx.bot.tree.clear_commands(guild=ctx.guild)
-                await ctx.bot.tree.sync(guild=ctx.guild)
-                synced = []
-            else:
-                synced = await ctx.bot.tree.sync()
-            await ctx.send(f"Synced {len(synced)} commands {'globally' if spec is None else 'to the current guild.'}")
+                tree.clear_commands(guild=ctx.guild)
+
+            guild = None if spec is None else ctx.guild
+            target = GLOBAL_TARGET if guild is None else guild.id
+            where = "globally" if guild is None else "to the current guild"
+            digest = tree_hash(tree, guild)
+            if not force and (await self.bot.db.command_tree_hashes([target])).get(target) == digest:
+                await ctx.send(f"The commands {where} are already up to date, nothing was synced.")
+                return
+
+            synced = await tree.sync(guild=guild)
+            await self.bot.db.set_command_tree_hash(target, digest)
+            await ctx.send(f"Synced {len(synced)} commands {where}.")
             return
 
-        ret = 0
-        for guild in guilds:
+        digests = {guild.id: tree_hash(tree, guild) for guild in guilds}
+        synced = {} if force else await self.bot.db.command_tree_hashes(list(digests))
+        todo = [guild_id for guild_id, digest in digests.items() if synced.get(guild_id) != digest]
+        # discord.py waits out 429s per route, the limit keeps a large sync clear of the global rate limit.
+        limit = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+        async def sync_guild(guild_id: int) -> discord.HTTPException | None:
             try:
-                await ctx.bot.tree.sync(guild=guild)
-            except discord.HTTPException:
-                pass
-            else:
-                ret += 1
-        await ctx.send(f"Synced the tree to {ret}/{len(guilds)}.")
+                async with limit:
+                    await tree.sync(guild=discord.Object(guild_id))
+            except discord.HTTPException as e:
+                return e
+            await self.bot.db.set_command_tree_hash(guild_id, digests[guild_id])
+            return None
+
+        async with ctx.typing():
+            errors = await asyncio.gather(*(sync_guild(guild_id) for guild_id in todo))
+
+        failed = [(guild_id, error) for guild_id, error in zip(todo, errors) if error is not None]
+        message = (
+            f"Synced the tree to {len(todo) - len(failed)}/{len(todo)} guilds,"
+            f" {len(digests) - len(todo)} were already up to date."
+        )
+        if failed:
+            rows = "\n".join(f"{guild_id}: {error.status} {error.text}"[:100] for guild_id, error in failed[:20])
+            more = f"\n... and {len(failed) - 20} more" if len(failed) > 20 else ""
+            message += f"\n```\n{rows}{more}\n```"
+        await ctx.send(message)
+
+    @commands.command()
+    @commands.is_owner()
+    async def memreport(self, ctx: commands.Context) -> None:
+        """Shows how much memory each of the bot's caches is using."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            await ctx.send(
+                "tracemalloc wasn't running so it has been started now, only allocations made from now on will be seen."
+                " Set `TRACEMALLOC_FRAMES` in the config to trace from startup."
+            )
+            return
+
+        async with ctx.typing():
+            # Grouping a large snapshot takes a while, keep it off the event loop.
+            usage = await asyncio.to_thread(lambda: cache_usage(tracemalloc.take_snapshot()))
+
+        current, peak = tracemalloc.get_traced_memory()
+        mib = 1024 * 1024
+        rows = "\n".join(f"{entry.name:<16} {entry.size / mib:>9,.1f} MiB {entry.blocks:>12,} blocks" for entry in usage)
+        await ctx.send(
+            f"```\n{rows}\n```"
+            f"Traced: `{current / mib:,.1f} MiB` (peak `{peak / mib:,.1f} MiB`)"
+            f" | tracemalloc overhead: `{tracemalloc.get_tracemalloc_memory() / mib:,.1f} MiB`\n"
+            f"Guilds: `{len(self.bot.guilds):,}` | Users: `{len(self.bot.users):,}`"
+            f" | Messages: `{len(self.bot.cached_messages):,}`"
+        )
+
+    @commands.command()
+    @commands.is_owner()
+    async def cachestats(self, ctx: commands.Context) -> None:
+        """Shows the hit and miss counts of the bot's lookup caches."""
+        if not CACHES:
+            await ctx.send("There are no caches loaded.")
+            return
+
+        rows = []
+        for name in sorted(CACHES):
+            stats = CACHES[name].stats
+            rows.append(
+                f"{name:<12} size {stats.size:>6,} | hits {stats.hits:>8,} | negative {stats.negative_hits:>6,}"
+                f" | misses {stats.misses:>7,} | coalesced {stats.coalesced:>6,} | {stats.hit_ratio:.1%}"
+            )
+        rows = "\n".join(rows)
+        await ctx.send(f"```\n{rows}\n```")
+
+    @commands.command()
+    @commands.is_owner()
+    async def profile(self, ctx: commands.Context, seconds: commands.Range[float, 0.1, MAX_PROFILE_SECONDS] = 10.0) -> None:
+        """Samples what the event loop is doing and attaches the stacks for a flamegraph.
+
+        Parameters
+        -----------
+        seconds: float
+            How long to sample for, at most a minute.
+        """
+        if self._profiling.locked():
+            await ctx.send("A profile is already running.")
+            return
+
+        async with self._profiling, ctx.typing():
+            sampler = StackSampler(asyncio.get_running_loop(), threading.get_ident())
+            profile = await asyncio.to_thread(sampler.run, seconds)
+
+        top = "\n".join(
+            f"{count / profile.samples:>6.1%} {name}" for name, count in profile.tasks.most_common(10)
+        )
+        file = discord.File(io.BytesIO(profile.collapsed().encode()), filename="profile.collapsed.txt")
+        await ctx.send(
+            f"Took `{profile.samples:,}` samples over `{profile.duration:.1f}s`"
+            f" (interval `{profile.interval * 1000:.0f}ms`, overhead `{profile.overhead:.2%}`).\n"
+            f"```\n{top}\n```"
+            "Open the attachment with e.g. `flamegraph.pl` or speedscope.",
+            file=file,
+        )
 
 
 async def setup(bot: Spork) -> None:
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import math
-import traceback
 from typing import TYPE_CHECKING
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
+import config
+
 from .utils.checks import NotGuildOwner
+from .utils.errors import ErrorAggregator
 from .utils.wording import plural
 
 if TYPE_CHECKING:
@@ -21,28 +24,71 @@ _logger = logging.getLogger(__name__)
 class ErorrHandler(commands.Cog):
     def __init__(self, bot: Spork) -> None:
         self.bot = bot
+        self.errors = ErrorAggregator()
+        self._summariser: asyncio.Task[None] | None = None
 
     def cog_load(self) -> None:
         self._original_handler = self.bot.tree.on_error
         tree = self.bot.tree
         tree.on_error = self.on_app_command_error
+        self._summariser = asyncio.create_task(self._summarise_loop())
 
     def cog_unload(self) -> None:
         tree = self.bot.tree
         tree.on_error = self._original_handler
+        if self._summariser is not None:
+            self._summariser.cancel()
+        self._summarise()
+
+    async def _summarise_loop(self) -> None:
+        while True:
+            await asyncio.sleep(config.ERROR_SUMMARY_INTERVAL)
+            self._summarise()
+
+    def _summarise(self) -> None:
+        start, counts = self.errors.roll()
+        seconds = (discord.utils.utcnow() - start).total_seconds()
+        if summary := self.errors.summarise(counts, seconds):
+            _logger.warning(summary)
+
+        if config.PERSIST_ERROR_COUNTS:
+            for window in counts:
+                group = window.group
+                self.bot.db.error_count(
+                    group.fingerprint,
+                    start,
+                    group.error_type,
+                    group.location,
+                    group.message,
+                    dict(window.commands),
+                    window.count,
+                )
+
+    def _log_error(self, command: str | None, error: BaseException) -> None:
+        group, first = self.errors.record(error, command)
+        if first:
+            # The log writer formats the traceback, off the event loop and within its limits.
+            # Repeats in the same window are only counted and show up in the next summary.
+            _logger.error("Ignoring exception in command %s [%s]", command, group.fingerprint, exc_info=error)
 
     async def on_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError) -> None:
+        if interaction.command is not None:
+            self.bot.metrics.failed(interaction, interaction.command.qualified_name, error)
+
         if isinstance(error, app_commands.CommandOnCooldown):
             current_cooldown = math.floor(error.retry_after * 100) / 100
             return await interaction.response.send_message(
                 f"This command is on cooldown for another {plural(int(current_cooldown)):second}!"
             )
         else:
-            trace = "".join(traceback.format_exception(type(error), error, error.__traceback__))
-            _logger.exception(f"Ignoring exception in command {interaction.command}:\n {trace}")
+            command = interaction.command.qualified_name if interaction.command else None
+            self._log_error(command, getattr(error, "original", error))
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx: commands.Context, error: commands.CommandError) -> None | discord.Message:
+        if ctx.command is not None:
+            self.bot.metrics.failed(ctx, ctx.command.qualified_name, getattr(error, "original", error))
+
         if hasattr(ctx.command, "on_error"):
             return
 
@@ -67,8 +113,7 @@ class ErorrHandler(commands.Cog):
         elif isinstance(error, NotGuildOwner):
             return await ctx.send(f"The command `{command_used}` can only be used by the server owner.")
         else:
-            trace = "".join(traceback.format_exception(type(error), error, error.__traceback__))
-            _logger.exception(f"Ignoring exception in command {ctx.command}:\n {trace}")
+            self._log_error(ctx.command.qualified_name if ctx.command else None, error)
 
 
 async def setup(bot: Spork) -> None:
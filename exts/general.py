@@ -1,26 +1,33 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
+import io
 import logging
-import os
-import re
 import time
-from typing import TYPE_CHECKING
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
+import asyncpg
 import discord
-import psutil
 from discord import app_commands
 from discord.ext import commands
 
-from config import PREFIX
+import config
 
+from .utils.cache import TTLCache
+from .utils.checks import is_guild_owner
 from .utils.embeds import SporkEmbed
 from .utils.emojis import Status
 from .utils.guilds import GuildGraphics
+from .utils.message_index import split_by_bulk_window
+from .utils.preview import PreviewRenderer, PreviewUnavailable
 from .utils.time import how_old, ts
 from .utils.wording import plural
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     from discord.ext.commands import Context
 
     from bot import Spork
@@ -29,23 +36,76 @@ if TYPE_CHECKING:
 
 _logger = logging.getLogger(__name__)
 
+# How long a command waits for its guild to be chunked before making do without.
+CHUNK_WAIT = 5.0
+
 
 class General(commands.Cog):
     def __init__(self, bot: Spork) -> None:
         self.bot = bot
-        self._current_process = psutil.Process(os.getpid())
-
-    @commands.Cog.listener(name="on_message")
+        # Short enough that use and member counts stay roughly current.
+        self.invite_cache: TTLCache[str, discord.Invite] = TTLCache("invites", maxsize=2048, ttl=60.0, negative_ttl=15.0)
+        self.previews = PreviewRenderer(bot.session, Path(config.PREVIEW_CACHE_PATH), workers=config.PREVIEW_WORKERS)
+        # The rollups growth is read from only change hourly.
+        self.growth_cache: TTLCache[int, asyncpg.Record] = TTLCache("growth", maxsize=1024, ttl=600.0)
+
+    async def cog_unload(self) -> None:
+        self.previews.close()
+
+    async def _graphics_preview(self, embed: discord.Embed, graphics: GuildGraphics) -> discord.File | None:
+        """Renders a preview of a guild's graphics as the embed's image, noting why if it can't."""
+        try:
+            data = await self.previews.render(graphics)
+        except PreviewUnavailable as e:
+            embed.add_field(name="Preview", value=str(e), inline=False)
+            return None
+        embed.set_image(url="attachment://graphics.png")
+        return discord.File(io.BytesIO(data), filename="graphics.png")
+
+    async def _member_growth(self, guild_id: int, members: int) -> str | None:
+        """How much a guild grew over the last day, week and month, as far as its history goes back."""
+        try:
+            past = await self.growth_cache.get(guild_id, lambda: self.bot.db.member_growth(guild_id))
+        except (OSError, TimeoutError, asyncpg.PostgresError):
+            _logger.warning("Could not look up the member growth of guild %s", guild_id, exc_info=True)
+            return None
+
+        periods = (("day", "Day"), ("week", "Week"), ("month", "Month"))
+        growth = [f"{label}: `{members - past[key]:+,}`" for key, label in periods if past[key] is not None]
+        return " | ".join(growth) or None
+
+    @commands.Cog.listener(name="on_bot_mention")
     async def mention_responder(self, message: discord.Message) -> None | discord.Message:
+        # Only dispatched by Spork.on_message for messages that are just a mention of the bot.
         guild = message.guild
         if not guild:
             return
-        if re.fullmatch(rf"<@!?{guild.me.id}>", message.content):
-            embed = SporkEmbed(
-                description=f"Hello! My prefix is `{PREFIX}`",
-            )
-            return await message.reply(embed=embed)
-        return
+        embed = SporkEmbed(
+            description=f"Hello! My prefix is `{self.bot.prefixes.get(guild.id)}`",
+        )
+        return await message.reply(embed=embed)
+
+    @commands.command()
+    @commands.guild_only()
+    @is_guild_owner()
+    async def prefix(self, ctx: GuildContext, new_prefix: str | None = None) -> None:
+        """Shows or changes the prefix for this server.
+
+        Parameters
+        ----------
+        new_prefix : str | None, optional
+            The prefix to use from now on, by default None which shows the current prefix.
+        """
+        if new_prefix is None:
+            await ctx.send(f"My prefix here is `{self.bot.prefixes.get(ctx.guild.id)}`")
+            return
+
+        if len(new_prefix) > 15:
+            await ctx.send("Prefixes can be at most 15 characters long.")
+            return
+
+        await self.bot.prefixes.set(ctx.guild.id, new_prefix)
+        await ctx.send(f"My prefix here is now `{new_prefix}`")
 
     @commands.command(aliases=("cu", "pb"))
     @commands.guild_only()
@@ -68,17 +128,76 @@ class General(commands.Cog):
         async with ctx.typing():
             bulk = ctx.channel.permissions_for(ctx.guild.me).manage_messages
             try:
-                channel_prefixes = tuple(await self.bot.get_prefix(ctx.message))
-                msgs = await ctx.channel.purge(
-                    bulk=bulk,
-                    limit=amount,
-                    check=lambda m: m.author == self.bot.user or (bulk and m.content.startswith(channel_prefixes)),
-                )
-                await ctx.send(f"Removed {len(msgs)} messages.", delete_after=2.0)
+                # Without manage messages only our own messages can be deleted.
+                indexed, checked, floor = self.bot.message_index.lookup(c.id, amount, include_triggers=bulk)
+                removed = await self._delete_indexed(ctx.channel, indexed, bulk=bulk)
+
+                # Only when the index doesn't go back far enough are the rest checked in the history.
+                if checked < amount:
+                    channel_prefixes = tuple(await self.bot.get_prefix(ctx.message))
+                    msgs = await ctx.channel.purge(
+                        bulk=bulk,
+                        limit=amount - checked,
+                        before=discord.Object(floor),
+                        check=self._cleanup_check(channel_prefixes, bulk=bulk),
+                    )
+                    removed += len(msgs)
+
+                await ctx.send(f"Removed {removed} messages.", delete_after=2.0)
 
             except (discord.Forbidden, discord.HTTPException):
                 await ctx.send("I couldn't process this request. Please check my permissions.")
 
+    def _cleanup_check(self, prefixes: tuple[str, ...], *, bulk: bool) -> Callable[[discord.Message], bool]:
+        """Which messages from the history cleanup removes: the bot's own and, with manage messages, commands."""
+        me = self.bot.user
+
+        def check(message: discord.Message) -> bool:
+            return message.author == me or (bulk and message.content.startswith(prefixes))
+
+        return check
+
+    async def _delete_indexed(
+        self,
+        channel: discord.VoiceChannel | discord.TextChannel | discord.Thread,
+        message_ids: list[int],
+        *,
+        bulk: bool,
+    ) -> int:
+        removed = 0
+        recent, old = split_by_bulk_window(message_ids) if bulk else ([], message_ids)
+
+        for start in range(0, len(recent), 100):
+            batch = recent[start : start + 100]
+            try:
+                await channel.delete_messages([discord.Object(message_id) for message_id in batch])
+            except discord.NotFound:
+                # A message someone else already deleted fails the whole batch.
+                removed += await self._delete_each(channel, batch)
+            else:
+                removed += len(batch)
+
+        # Messages past the bulk delete window, or all of them without manage messages, go one by one.
+        removed += await self._delete_each(channel, old)
+
+        # Already deleted messages are dropped from the index too.
+        self.bot.message_index.discard(channel.id, message_ids)
+        return removed
+
+    async def _delete_each(
+        self,
+        channel: discord.VoiceChannel | discord.TextChannel | discord.Thread,
+        message_ids: list[int],
+    ) -> int:
+        removed = 0
+        for message_id in message_ids:
+            try:
+                await channel.get_partial_message(message_id).delete()
+            except discord.NotFound:
+                continue
+            removed += 1
+        return removed
+
     @commands.hybrid_command()
     @commands.guild_only()
     async def whois(self, ctx: GuildContext, *, user: discord.Member | discord.User | None = None) -> None:
@@ -90,6 +209,11 @@ class General(commands.Cog):
             A user or guild member, by default None
         """
         user = user or ctx.author
+        chunker = self.bot.chunker
+        if chunker.enabled and not ctx.guild.chunked:
+            async with ctx.typing():
+                await chunker.ensure(ctx.guild, timeout=CHUNK_WAIT)
+
         embed = SporkEmbed()
         # Roles and format_date credit: https://github.com/Rapptz/RoboDanny
         roles = [role.name.replace("@", "@\u200b") for role in getattr(user, "roles", [])]
@@ -117,87 +241,129 @@ class General(commands.Cog):
         if roles:
             embed.add_field(name="Roles", value=", ".join(roles) if len(roles) < 15 else f"{len(roles)} roles", inline=False)
 
-        embed.add_field(
-            name="Mutual Servers",
-            value=f"You are in `{len(user.mutual_guilds):,}` servers with the bot!",
-        )
+        mutual = f"You are in `{self.bot.user_guilds.count(user.id):,}` servers with the bot!"
+        if chunker.enabled:
+            chunked, total = chunker.progress()
+            if chunked < total:
+                mutual += f"\n(Still loading members, `{chunked:,}/{total:,}` servers so far.)"
+        embed.add_field(name="Mutual Servers", value=mutual)
         embed.set_footer(text=f"User ID: {user.id} | Date: {ctx.message.created_at.strftime('%m/%d/%Y')}")
         await ctx.send(embed=embed)
 
     @commands.hybrid_command()
     @commands.guild_only()
-    async def serverinfo(self, ctx: GuildContext) -> None:
-        """Show general info about the server"""
+    async def serverinfo(self, ctx: GuildContext, preview: bool = False) -> None:
+        """Show general info about the server
+
+        Parameters
+        ----------
+        preview : bool, optional
+            Whether to render a preview of the server's graphics, by default False
+        """
         guild = ctx.guild
         guild_age = how_old(discord.utils.utcnow() - guild.created_at)
-        bots = sum(member.bot for member in guild.members)
 
-        # Last boost, status info, role count inspired by:
-        # https://github.com/DuckBot-Discord/DuckBot
-        last_boost = max(guild.members, key=lambda m: m.premium_since or guild.created_at)
-        if last_boost.premium_since is not None:
-            boost = f"\n{last_boost}" f"\n╰ {ts(last_boost.premium_since):R}"
+        if self.bot.chunker.enabled and not guild.chunked:
+            # Chunking may still be catching up after a restart, this guild skips the queue.
+            async with ctx.typing():
+                await self.bot.chunker.ensure(guild, timeout=CHUNK_WAIT)
+
+        # In lean cache mode the member cache only holds part of the guild, so the
+        # totals come from the API and the breakdowns that need every member are left out.
+        stats = self.bot.guild_stats.get(guild) if guild.chunked else None
+        counts = None
+        if stats is None or not self.bot.intents.presences:
+            counts = await self.bot.fetch_guild(guild.id, with_counts=True)
+
+        if stats is not None:
+            member_count = stats.members
         else:
-            boost = "No active boosters"
+            assert counts
+            member_count = counts.approximate_member_count or guild.member_count or 0
 
         embed = SporkEmbed(
             title=guild.name,
-            description=f"{plural(len(guild.members)):member} are in this server!",
+            description=f"{plural(member_count):member} are in this server!",
         )
         embed.add_field(
             name="Info",
-            value=f"**Owner:** {guild.owner}"
+            value=f"**Owner:** {guild.owner or f'<@{guild.owner_id}>'}"
             f"\n**Role Count:** {len(guild.roles):,}"
             f"\n**File Size limit:** {guild.filesize_limit // 1048576:,}",
             inline=True,
         )
-        embed.add_field(
-            name="Boosts",
-            value=f"**Level:** {guild.premium_tier} | {plural(guild.premium_subscription_count):Boost}"
-            f"\n**Booster Count:** {len(guild.premium_subscribers):,}"
-            f"\n**Last Booster:** {boost}",
-            inline=True,
-        )
 
-        embed.add_field(name="Graphics", value=GuildGraphics.from_guild(guild), inline=True)
-        embed.add_field(
-            name="Members",
-            value=f"**Total:** {plural(len(guild.members)):member} ({plural(bots):bot})"
-            f"\n**Member Limit:** {guild.max_members:,}",
-            inline=True,
-        )
+        boosts = f"**Level:** {guild.premium_tier} | {plural(guild.premium_subscription_count):Boost}"
+        if stats is not None:
+            # Last boost, status info, role count inspired by:
+            # https://github.com/DuckBot-Discord/DuckBot
+            latest_booster = stats.latest_booster
+            if latest_booster is not None:
+                member_id, premium_since = latest_booster
+                boost = f"\n{guild.get_member(member_id) or member_id}" f"\n╰ {ts(premium_since):R}"
+            else:
+                boost = "No active boosters"
+            boosts += f"\n**Booster Count:** {stats.booster_count:,}\n**Last Booster:** {boost}"
+        embed.add_field(name="Boosts", value=boosts, inline=True)
 
-        online_count = sum(m.status is discord.Status.online for m in guild.members)
-        idle_count = sum(m.status is discord.Status.idle for m in guild.members)
-        dnd_count = sum(m.status is discord.Status.dnd for m in guild.members)
-        offline_count = sum(m.status is discord.Status.offline for m in guild.members)
+        embed.add_field(name="Graphics", value=GuildGraphics.from_guild(guild), inline=True)
+        bots = f" ({plural(stats.bots):bot})" if stats else ""
+        members = f"**Total:** {plural(member_count):member}{bots}\n**Member Limit:** {guild.max_members:,}"
+        if growth := await self._member_growth(guild.id, member_count):
+            members += f"\n**Growth:** {growth}"
+        embed.add_field(name="Members", value=members, inline=True)
+
+        if counts is None:
+            assert stats
+            online_count = stats.statuses[discord.Status.online]
+            idle_count = stats.statuses[discord.Status.idle]
+            dnd_count = stats.statuses[discord.Status.dnd]
+            offline_count = stats.statuses[discord.Status.offline]
+
+            status_counts = (
+                f"{Status.online.value} Online: {online_count:,}"
+                f"\n{Status.idle.value} Idle: {idle_count:,}"
+                f"\n{Status.dnd.value} DND: {dnd_count:,}"
+                f"\n{Status.offline.value} Offline: {offline_count:,}"
+            )
+        else:
+            online_count = counts.approximate_presence_count or 0
+            status_counts = (
+                f"{Status.online.value} Online: ~{online_count:,}"
+                f"\n{Status.offline.value} Offline: ~{max(member_count - online_count, 0):,}"
+            )
 
-        embed.add_field(
-            name="Status Counts",
-            value=f"{Status.online.value} Online: {online_count:,}"
-            f"\n{Status.idle.value} Idle: {idle_count:,}"
-            f"\n{Status.dnd.value} DND: {dnd_count:,}"
-            f"\n{Status.offline.value} Offline: {offline_count:,}",
-            inline=True,
-        )
+        embed.add_field(name="Status Counts", value=status_counts, inline=True)
         embed.set_thumbnail(url=guild.icon)
         embed.set_footer(text=f"The server is {guild_age} • Guild ID: {guild.id}")
-        await ctx.send(embed=embed)
+
+        file = None
+        if preview:
+            async with ctx.typing():
+                file = await self._graphics_preview(embed, GuildGraphics.from_guild(guild))
+        await ctx.send(embed=embed, file=file)  # type: ignore
 
     @commands.hybrid_command()
     @app_commands.allowed_installs(guilds=True, users=True)
     @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
-    async def inviteinfo(self, ctx: Context, invite_code: str) -> discord.Message | None:
+    async def inviteinfo(self, ctx: Context, invite_code: str, preview: bool = False) -> discord.Message | None:
         """Get information about a guilds invite
 
         Parameters
         ----------
         invite_code : str
             A guilds invite or vanity
+        preview : bool, optional
+            Whether to render a preview of the guild's graphics, by default False
         """
-        invite = await self.bot.fetch_invite(invite_code, with_counts=True, with_expiration=True)
-
-        if invite is None:
+        try:
+            code = discord.utils.resolve_invite(invite_code).code
+            invite = await self.invite_cache.get(
+                code,
+                lambda: self.bot.fetch_invite(code, with_counts=True, with_expiration=True),
+                negative=(discord.NotFound,),
+            )
+        except (ValueError, discord.NotFound):
             return await ctx.send("Could not get information about that invite.")
 
         embed = SporkEmbed(title="Invite Information")
@@ -250,7 +416,26 @@ class General(commands.Cog):
                 value=f"Users Online: `{invite.approximate_presence_count:,}`\nMember Count: `{invite.approximate_member_count:,}`\nBooster Count: `{f'{invite.guild.premium_subscription_count:,}' if invite.guild.premium_subscription_count != 0 else ':('}`",
             )
 
-        await ctx.send(embed=embed)
+        file = None
+        if preview and isinstance(invite.guild, (discord.PartialInviteGuild, discord.Guild)):
+            async with ctx.typing():
+                file = await self._graphics_preview(embed, GuildGraphics.from_guild(invite.guild))
+        await ctx.send(embed=embed, file=file)  # type: ignore
+
+    async def _cluster_stats(self) -> list[dict[str, Any]]:
+        local = self.bot.cluster_stats()
+        if self.bot.ipc is None:
+            return [local]
+
+        try:
+            clusters = await self.bot.ipc.cluster_stats()
+        except (TimeoutError, ConnectionError):
+            _logger.warning("Could not get cluster stats over IPC, only showing this cluster")
+            return [local]
+
+        # Our own numbers are fresher than the last report the launcher has.
+        others = [stats for stats in clusters if stats["cluster"] != local["cluster"]]
+        return [local, *others]
 
     @commands.hybrid_command()
     async def about(self, ctx: Context) -> None:
@@ -260,29 +445,73 @@ class General(commands.Cog):
         after_check = time.perf_counter()
         api_latency = (after_check - before_check) * 1000
         seconds_running = (discord.utils.utcnow() - self.bot.start_time).total_seconds()
+
+        clusters = await self._cluster_stats()
+        guild_count = sum(stats["guilds"] for stats in clusters)
+        user_count = sum(stats["users"] for stats in clusters)
+        shards = {int(shard_id): latency for stats in clusters for shard_id, latency in stats["shards"].items()}
+        latencies = [latency for latency in shards.values() if latency is not None]
+        latency_info = f"Latency: `{round(sum(latencies) / len(latencies) * 1000):,}ms`" if latencies else "Latency: `N/A`"
+        if len(shards) > 1:
+            slowest_shard = max(shards, key=lambda shard_id: shards[shard_id] or 0.0)
+            latency_info += (
+                f" across {plural(len(shards)):shard} in {plural(len(clusters)):cluster}\n"
+                f"Slowest Shard: `#{slowest_shard}` at `{round((shards[slowest_shard] or 0.0) * 1000):,}ms`"
+            )
+
         embed = SporkEmbed(
             title="Statistics",
             description=f"Running since {ts(self.bot.start_time):F}",
         )
         embed.add_field(
             name="Bot Information",
-            value=f"Total Guilds: `{len(self.bot.guilds):,}`\n"
-            f"Total Users: `{len(self.bot.users):,}`\n"
+            value=f"Total Guilds: `{guild_count:,}`\n"
+            f"Total Users: `{user_count:,}`\n"
             f"Total Seconds Running: `{int(seconds_running):,}s`",
             inline=True,
         )
-        embed.add_field(
-            name="Host Information",
-            value=f"CPU Usage: `{self._current_process.cpu_percent()}%`\n"
-            f"RAM Usage: `{self._current_process.memory_percent():.2}%`\n"
-            f"Running on `{self._current_process.num_threads()}` threads",
-            inline=False,
-        )
+        chunker = self.bot.chunker
+        if chunker.enabled:
+            chunked, total = chunker.progress()
+            if chunked < total:
+                chunk_info = (
+                    f"Chunked: `{chunked:,}/{total:,}` guilds (`{chunked / total:.0%}`)\n"
+                    f"Queued: `{chunker.waiting:,}` | In Flight: `{chunker.in_flight}`"
+                )
+            else:
+                took = f" in `{chunker.finished_in:,.0f}s`" if chunker.finished_in is not None else ""
+                chunk_info = f"All `{total:,}` guilds chunked{took}"
+            if chunker.failed:
+                chunk_info += f"\nFailed: `{chunker.failed:,}`"
+            embed.add_field(name="Member Chunking (this cluster)", value=chunk_info, inline=True)
+        host = self.bot.host_stats.summary()
+        if host:
+            cpu, memory, threads = host["cpu_percent"], host["memory_percent"], host["threads"]
+            minutes = max(round(self.bot.host_stats.covered / 60), 1)
+            embed.add_field(
+                name=f"Host Information (last {minutes} minutes, min/avg/max)",
+                value=f"CPU Usage: `{cpu.min:.1f}% / {cpu.avg:.1f}% / {cpu.max:.1f}%`\n"
+                f"RAM Usage: `{memory.min:.2f}% / {memory.avg:.2f}% / {memory.max:.2f}%`\n"
+                f"Running on `{int(threads.max)}` threads",
+                inline=False,
+            )
         embed.add_field(
             name="Latencies",
-            value=f"Latency: `{round(self.bot.latency * 1000):,}ms`\nAPI Latency: `{int(api_latency):,}ms`",
+            value=f"{latency_info}\nAPI Latency: `{int(api_latency):,}ms`",
             inline=False,
         )
+
+        monitor = self.bot.loop_monitor
+        if monitor.lag:
+            loop_info = (
+                f"Loop Lag: `{sum(monitor.lag) / len(monitor.lag) * 1000:,.1f}ms` avg,"
+                f" `{max(monitor.lag) * 1000:,.0f}ms` max\n"
+                f"Gateway Events: `{monitor.events_per_second:,.0f}/s`\n"
+                f"Blocking Callbacks: `{monitor.blocked:,}`"
+            )
+            if monitor.worst_block is not None:
+                loop_info += f" (worst `{monitor.worst_block.seconds:.2f}s` in `{monitor.worst_block.handler}`)"
+            embed.add_field(name="Event Loop", value=loop_info, inline=False)
         embed.set_footer(text=f"Made in discord.py {discord.__version__}")
         await ctx.send(embed=embed)
 
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING
+
+import discord
+from discord.ext import commands
+
+from .utils.embeds import SporkEmbed
+from .utils.time import ts
+
+if TYPE_CHECKING:
+    from bot import Spork
+
+    from .utils.context import GuildContext
+    from .utils.invites import Attribution
+
+_logger = logging.getLogger(__name__)
+
+# A guild's invites are fetched at most this often, in seconds. Joins during a raid share a fetch.
+FETCH_INTERVAL = 10.0
+# Failed fetches are retried after twice as long each time, up to this many seconds.
+FETCH_MAX_BACKOFF = 300.0
+# How many guilds have their invites fetched at once.
+FETCH_CONCURRENCY = 2
+
+HOW = {
+    "only invite": "the only invite the server had",
+    "used up": "the invite was used up by this join",
+    "diff": "the only invite used since the last check",
+}
+
+
+class Invites(commands.Cog):
+    """Works out who invited each member that joins.
+
+    A guild's invites are first fetched on its first join or invite creation after startup,
+    not for every guild on startup. That first join can't be attributed.
+    """
+
+    def __init__(self, bot: Spork) -> None:
+        self.bot = bot
+        self.tracker = bot.invite_tracker
+        self._fetches: dict[int, asyncio.Task[None]] = {}
+        self._fetched_at: dict[int, float] = {}
+        self._limit = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def cog_unload(self) -> None:
+        for task in self._fetches.values():
+            task.cancel()
+
+    @staticmethod
+    def can_fetch(guild: discord.Guild) -> bool:
+        return guild.me is not None and guild.me.guild_permissions.manage_guild
+
+    def schedule(self, guild: discord.Guild) -> None:
+        """Fetches a guild's invites soon, unless a fetch for it is already waiting or running."""
+        if guild.id in self._fetches or not self.can_fetch(guild):
+            return
+        self._fetches[guild.id] = asyncio.create_task(self._fetch(guild.id))
+        self._fetches[guild.id].add_done_callback(lambda task: self._fetched(guild.id, task))
+
+    def _fetched(self, guild_id: int, task: asyncio.Task[None]) -> None:
+        # A cancelled fetch may already have been replaced.
+        if self._fetches.get(guild_id) is task:
+            del self._fetches[guild_id]
+
+    def forget(self, guild_id: int) -> None:
+        self.tracker.forget(guild_id)
+        self._fetched_at.pop(guild_id, None)
+        if task := self._fetches.get(guild_id):
+            task.cancel()
+
+    async def _fetch(self, guild_id: int) -> None:
+        # Keeps going until no joins are waiting, joins that arrive meanwhile wait for the next round.
+        interval = FETCH_INTERVAL
+        while True:
+            wait = self._fetched_at.get(guild_id, 0.0) + interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            guild = self.bot.get_guild(guild_id)
+            if guild is None or not self.can_fetch(guild):
+                self.tracker.forget(guild_id)
+                return
+
+            async with self._limit:
+                # Only the joins before the fetch are in its use counts.
+                resolve = self.tracker.pending(guild_id)
+                self._fetched_at[guild_id] = time.monotonic()
+                try:
+                    invites = await guild.invites()
+                    vanity = await guild.vanity_invite() if "VANITY_URL" in guild.features else None
+                except discord.Forbidden:
+                    self.tracker.forget(guild_id)
+                    return
+                except discord.HTTPException as e:
+                    # The joins waiting on it would otherwise wait for the next join.
+                    interval = min(interval * 2, FETCH_MAX_BACKOFF)
+                    _logger.warning("Could not fetch the invites of guild %s, retrying in %.0fs: %s", guild_id, interval, e)
+                    continue
+
+            interval = FETCH_INTERVAL
+            for attribution in self.tracker.snapshot(guild_id, invites, vanity and vanity.uses, resolve=resolve):
+                _logger.debug("Attributed the join of %s to guild %s: %s", attribution.member_id, guild_id, attribution)
+            if not self.tracker.pending(guild_id):
+                return
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.forget(guild.id)
+
+    @commands.Cog.listener()
+    async def on_invite_create(self, invite: discord.Invite) -> None:
+        if not isinstance(invite.guild, discord.Guild):
+            return
+        if self.tracker.tracks(invite.guild.id):
+            self.tracker.created(invite.guild.id, invite)
+        else:
+            # Someone's handing out invites, joins are likely to follow.
+            self.schedule(invite.guild)
+
+    @commands.Cog.listener()
+    async def on_invite_delete(self, invite: discord.Invite) -> None:
+        if invite.guild is not None:
+            self.tracker.deleted(invite.guild.id, invite.code)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        # Guilds that aren't tracked yet get their first snapshot, joins waiting on a fetch get it scheduled.
+        if self.tracker.joined(member) is None:
+            self.schedule(member.guild)
+
+    def describe(self, attribution: Attribution) -> str:
+        if attribution.how == "vanity":
+            return "Joined with the server's vanity invite."
+        if attribution.how == "ambiguous":
+            candidates = ", ".join(f"`{code}`" for code in attribution.candidates)
+            return f"Joined with one of {candidates}, several were used at once."
+        if attribution.how == "unknown":
+            return "Couldn't tell which invite was used."
+
+        inviter = f"<@{attribution.inviter_id}>" if attribution.inviter_id else "an unknown user"
+        return f"Invited by {inviter} with `{attribution.code}` ({HOW[attribution.how]})."
+
+    @commands.hybrid_command()
+    @commands.guild_only()
+    async def invitedby(self, ctx: GuildContext, *, member: discord.Member | None = None) -> None:
+        """Shows who invited a member to the server
+
+        Parameters
+        ----------
+        member : discord.Member | None, optional
+            A server member, by default None
+        """
+        member = member or ctx.author
+        attribution = self.tracker.get(ctx.guild.id, member.id)
+
+        if attribution is not None:
+            description = self.describe(attribution)
+        elif self.tracker.waiting(ctx.guild.id, member.id):
+            description = "Still working out which invite was used, try again in a few seconds."
+        elif not self.can_fetch(ctx.guild):
+            description = "I need the Manage Server permission to see which invites are used."
+        else:
+            description = "I don't know, they joined before I started keeping track."
+
+        embed = SporkEmbed(description=description)
+        embed.set_author(name=member, icon_url=member.display_avatar.url)
+        if member.joined_at is not None:
+            embed.add_field(name="Joined", value=f"{ts(member.joined_at):F} ({ts(member.joined_at):R})")
+        await ctx.send(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
+
+async def setup(bot: Spork) -> None:
+    await bot.add_cog(Invites(bot))
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Any
+
+import discord
+from aiohttp import web
+from discord import app_commands
+from discord.ext import commands
+
+import config
+
+from .utils.cache import CACHES
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Iterable
+
+    from bot import Spork
+
+    Hook = Callable[[commands.Context[Any]], Awaitable[Any]]
+
+_logger = logging.getLogger(__name__)
+
+
+def cache_metrics() -> Iterable[str]:
+    yield "# HELP spork_cache_lookups_total Lookup cache results by outcome."
+    yield "# TYPE spork_cache_lookups_total counter"
+    for name, cache in sorted(CACHES.items()):
+        stats = cache.stats
+        for outcome in ("hits", "negative_hits", "misses", "coalesced"):
+            yield f'spork_cache_lookups_total{{cache="{name}",outcome="{outcome}"}} {getattr(stats, outcome)}'
+    yield "# TYPE spork_cache_size gauge"
+    for name, cache in sorted(CACHES.items()):
+        yield f'spork_cache_size{{cache="{name}"}} {len(cache)}'
+
+
+class Metrics(commands.Cog):
+    """Times every command and serves the results for Prometheus."""
+
+    def __init__(self, bot: Spork) -> None:
+        self.bot = bot
+        self._runner: web.AppRunner | None = None
+        # Global hooks registered before this cog's, called after its own and put back on unload.
+        self._previous_before: Hook | None = None
+        self._previous_after: Hook | None = None
+
+    async def cog_load(self) -> None:
+        # The bot only holds one of each hook and there's no public way to read them.
+        self._previous_before, self._previous_after = self.bot._before_invoke, self.bot._after_invoke
+        self.bot.before_invoke(self._before_invoke)
+        self.bot.after_invoke(self._after_invoke)
+        self.bot.metrics.add_collector(cache_metrics)
+        self.bot.metrics.add_collector(self.bot.db.render_metrics)
+        self.bot.metrics.add_collector(self.bot.edit_filter.render_metrics)
+
+        if config.METRICS_PORT is not None:
+            app = web.Application()
+            app.router.add_get("/metrics", self._serve_metrics)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, config.METRICS_HOST, config.METRICS_PORT).start()
+            _logger.info("Serving metrics on http://%s:%s/metrics", config.METRICS_HOST, config.METRICS_PORT)
+
+    async def cog_unload(self) -> None:
+        # Put back the hooks from before this cog's, unless something has replaced ours since.
+        if self.bot._before_invoke == self._before_invoke:
+            self.bot._before_invoke = self._previous_before
+        if self.bot._after_invoke == self._after_invoke:
+            self.bot._after_invoke = self._previous_after
+        self.bot.metrics.remove_collector(cache_metrics)
+        self.bot.metrics.remove_collector(self.bot.db.render_metrics)
+        self.bot.metrics.remove_collector(self.bot.edit_filter.render_metrics)
+
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _serve_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.bot.metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def _before_invoke(self, ctx: commands.Context[Any]) -> None:
+        self.bot.metrics.started(ctx)
+        if self._previous_before is not None:
+            await self._previous_before(ctx)
+
+    async def _after_invoke(self, ctx: commands.Context[Any]) -> None:
+        assert ctx.command
+        self.bot.metrics.finished(ctx, ctx.command.qualified_name)
+        if self._previous_after is not None:
+            await self._previous_after(ctx)
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction) -> None:
+        if interaction.type is discord.InteractionType.application_command:
+            self.bot.metrics.started(interaction)
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(
+        self,
+        interaction: discord.Interaction,
+        command: app_commands.Command[Any, ..., Any] | app_commands.ContextMenu,
+    ) -> None:
+        self.bot.metrics.finished(interaction, command.qualified_name)
+
+    @commands.command()
+    @commands.is_owner()
+    async def slowest(self, ctx: commands.Context, amount: int = 10) -> None:
+        """Shows the commands that take the longest to run.
+
+        Parameters
+        ----------
+        amount : int, optional
+            The number of commands to show, by default 10
+        """
+        slowest = self.bot.metrics.slowest(max(min(amount, 25), 1))
+        if not slowest:
+            await ctx.send("No commands have been timed yet.")
+            return
+
+        rows = "\n".join(
+            f"{name:<20} p95 {histogram.quantile(0.95) * 1000:>8,.0f}ms | mean {histogram.mean * 1000:>8,.1f}ms"
+            f" | max {histogram.max * 1000:>8,.0f}ms | {histogram.count:>6,} runs"
+            for name, histogram in slowest
+        )
+        await ctx.send(f"```\n{rows}\n```")
+
+
+async def setup(bot: Spork) -> None:
+    await bot.add_cog(Metrics(bot))
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from discord.ext import commands
+
+if TYPE_CHECKING:
+    from bot import Spork
+
+
+class Monitor(commands.Cog):
+    """Feeds the bot's loop monitor, host sampler and gateway recorder and publishes what they see."""
+
+    def __init__(self, bot: Spork) -> None:
+        self.bot = bot
+
+    async def cog_load(self) -> None:
+        self.bot.loop_monitor.start()
+        self.bot.metrics.add_collector(self.bot.loop_monitor.render_metrics)
+        self.bot.host_stats.start()
+        self.bot.metrics.add_collector(self.bot.host_stats.render_metrics)
+        if self.bot.gateway_recorder is not None:
+            self.bot.gateway_recorder.start()
+
+    async def cog_unload(self) -> None:
+        self.bot.loop_monitor.stop()
+        self.bot.metrics.remove_collector(self.bot.loop_monitor.render_metrics)
+        self.bot.host_stats.stop()
+        self.bot.metrics.remove_collector(self.bot.host_stats.render_metrics)
+        if self.bot.gateway_recorder is not None:
+            self.bot.gateway_recorder.stop()
+
+    @commands.Cog.listener()
+    async def on_socket_event_type(self, event_type: str) -> None:
+        self.bot.loop_monitor.count_event(event_type)
+
+    @commands.Cog.listener()
+    async def on_socket_raw_receive(self, msg: str) -> None:
+        # Only dispatched when the bot was created with debug events, i.e. while recording.
+        if self.bot.gateway_recorder is not None:
+            self.bot.gateway_recorder.record(msg)
+
+
+async def setup(bot: Spork) -> None:
+    await bot.add_cog(Monitor(bot))
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+import time
+from typing import TYPE_CHECKING
+
+import asyncpg
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+import config
+
+if TYPE_CHECKING:
+    from bot import Spork
+
+    from .utils.context import GuildContext
+
+_logger = logging.getLogger(__name__)
+
+# Member counts are rolled up and pruned this often, in seconds.
+ROLLUP_INTERVAL = 3600.0
+
+
+class Tracking(commands.Cog):
+    """Keeps the bot's derived guild data in step with gateway events."""
+
+    def __init__(self, bot: Spork) -> None:
+        self.bot = bot
+        self._history: asyncio.Task[None] | None = None
+
+    async def cog_load(self) -> None:
+        self.bot.chunker.start()
+        # Guilds that became available before a reload are already in the cache.
+        for guild in self.bot.guilds:
+            self.bot.chunker.add(guild)
+        self._history = asyncio.create_task(self._member_history_loop())
+
+    async def cog_unload(self) -> None:
+        self.bot.chunker.stop()
+        if self._history is not None:
+            self._history.cancel()
+
+    def record_member_counts(self) -> None:
+        now = discord.utils.utcnow()
+        presences = self.bot.intents.presences
+        for guild in self.bot.guilds:
+            if guild.unavailable:
+                continue
+            online = None
+            # Online counts are only known for chunked guilds with presences.
+            stats = self.bot.guild_stats.peek(guild.id)
+            if presences and stats is not None and stats.built_chunked:
+                online = stats.members - stats.statuses[discord.Status.offline]
+            self.bot.db.member_count(guild.id, now, guild.member_count or 0, online, guild.premium_subscription_count)
+
+    async def _member_history_loop(self) -> None:
+        await self.bot.wait_until_ready()
+        # Roll up on the first round too, a bot restarted more often than hourly would never prune otherwise.
+        last_rollup = float("-inf")
+        while True:
+            await asyncio.sleep(config.MEMBER_HISTORY_INTERVAL)
+            self.record_member_counts()
+
+            if time.monotonic() - last_rollup < ROLLUP_INTERVAL:
+                continue
+            last_rollup = time.monotonic()
+            try:
+                await self.bot.db.rollup_member_counts(
+                    raw=datetime.timedelta(days=config.MEMBER_HISTORY_RAW_DAYS),
+                    hourly=datetime.timedelta(days=config.MEMBER_HISTORY_HOURLY_DAYS),
+                    daily=datetime.timedelta(days=config.MEMBER_HISTORY_DAILY_DAYS),
+                )
+            except (OSError, TimeoutError, asyncpg.PostgresError):
+                _logger.exception("Could not roll up member counts")
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        self.bot.guild_stats.rebuild(guild)
+        self.bot.user_guilds.add_guild(guild)
+        self.bot.chunker.add(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        self.bot.guild_stats.rebuild(guild)
+        self.bot.user_guilds.add_guild(guild)
+        self.bot.chunker.add(guild)
+        self.bot.db.guild_joined(guild.id, discord.utils.utcnow())
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.bot.guild_stats.discard(guild.id)
+        self.bot.chunker.discard(guild.id)
+        self.bot.user_guilds.remove_guild(guild)
+        self.bot.db.guild_left(guild.id, discord.utils.utcnow())
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        self.bot.user_guilds.add(member.id, member.guild.id)
+        if stats := self.bot.guild_stats.peek(member.guild.id):
+            stats.add(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member) -> None:
+        self.bot.user_guilds.remove(member.id, member.guild.id)
+        if stats := self.bot.guild_stats.peek(member.guild.id):
+            stats.remove(member)
+
+    @commands.Cog.listener()
+    async def on_presence_update(self, before: discord.Member, after: discord.Member) -> None:
+        if stats := self.bot.guild_stats.peek(after.guild.id):
+            stats.update_status(before.status, after.status)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        if before.premium_since == after.premium_since:
+            return
+        if stats := self.bot.guild_stats.peek(after.guild.id):
+            stats.update_boost(after.id, after.premium_since)
+
+    @commands.Cog.listener()
+    async def on_command(self, ctx: commands.Context[Spork]) -> None:
+        if ctx.guild is not None:
+            self.bot.db.guild_used(ctx.guild.id, ctx.message.created_at)
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(
+        self, interaction: discord.Interaction[Spork], command: app_commands.Command | app_commands.ContextMenu
+    ) -> None:
+        if interaction.guild_id is not None:
+            self.bot.db.guild_used(interaction.guild_id, interaction.created_at)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        self.bot.message_index.discard(payload.channel_id, (payload.message_id,))
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent) -> None:
+        self.bot.message_index.discard(payload.channel_id, payload.message_ids)
+
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id: int) -> None:
+        # A new session means messages were missed, the index no longer has every message since its floor.
+        self.bot.message_index.clear()
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        self.bot.message_index.forget_channel(channel.id)
+
+    @commands.Cog.listener()
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent) -> None:
+        self.bot.message_index.forget_channel(payload.thread_id)
+
+    @commands.command(hidden=True)
+    @commands.guild_only()
+    @commands.is_owner()
+    async def statscheck(self, ctx: GuildContext, rebuild: bool = False) -> None:
+        """Checks the tracked stats of this server against the member cache.
+
+        Parameters
+        ----------
+        rebuild : bool, optional
+            Whether to rebuild the stats from the cache afterwards, by default False
+        """
+        mismatches = self.bot.guild_stats.verify(ctx.guild)
+        if mismatches:
+            _logger.warning("Guild stats for %s drifted: %s", ctx.guild.id, ", ".join(mismatches))
+
+        if rebuild:
+            self.bot.guild_stats.rebuild(ctx.guild)
+
+        if not mismatches:
+            await ctx.send("The stats for this server match the member cache.")
+            return
+
+        lines = "\n".join(mismatches)
+        await ctx.send(f"The stats for this server have drifted{' and were rebuilt' if rebuild else ''}:\n```\n{lines}\n```")
+
+
+async def setup(bot: Spork) -> None:
+    await bot.add_cog(Tracking(bot))
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# Every live TTLCache by name, so their stats can be looked at from one place.
+CACHES: weakref.WeakValueDictionary[str, TTLCache] = weakref.WeakValueDictionary()
+
+
+@dataclass(slots=True)
+class CacheStats:
+    size: int
+    hits: int
+    negative_hits: int
+    misses: int
+    coalesced: int
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.negative_hits + self.misses + self.coalesced
+        return (self.hits + self.negative_hits + self.coalesced) / lookups if lookups else 0.0
+
+
+class TTLCache(Generic[K, V]):
+    """A size bounded cache whose entries expire after a while.
+
+    Failures listed as negative are cached too, for a shorter time, and lookups of a
+    key that is already being fetched wait for that fetch instead of starting another.
+    """
+
+    def __init__(self, name: str, *, maxsize: int, ttl: float, negative_ttl: float = 0.0) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict[K, tuple[float, V | Exception]] = OrderedDict()
+        self._inflight: dict[K, asyncio.Task[V]] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        CACHES[name] = self
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(len(self._entries), self.hits, self.negative_hits, self.misses, self.coalesced)
+
+    async def get(
+        self,
+        key: K,
+        fetch: Callable[[], Awaitable[V]],
+        *,
+        negative: tuple[type[Exception], ...] = (),
+    ) -> V:
+        """Returns the cached value for ``key``, calling ``fetch`` to get it if needed.
+
+        Exceptions of the types in ``negative`` are remembered for ``negative_ttl``
+        seconds and raised again for lookups in that window.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                if isinstance(value, Exception):
+                    self.negative_hits += 1
+                    # Every raise adds to the traceback, which would grow and keep frames alive until expiry.
+                    raise value.with_traceback(None)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._inflight[key] = asyncio.create_task(self._load(key, fetch, negative))
+            task.add_done_callback(_consume_exception)
+        else:
+            self.coalesced += 1
+
+        # Shielded so one caller giving up doesn't cancel the fetch for everyone else.
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def _load(self, key: K, fetch: Callable[[], Awaitable[V]], negative: tuple[type[Exception], ...]) -> V:
+        try:
+            value = await fetch()
+        except negative as exc:
+            if self.negative_ttl > 0:
+                self._store(key, exc, self.negative_ttl)
+            raise
+        else:
+            self._store(key, value, self.ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _store(self, key: K, value: V | Exception, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    # Every caller may have been cancelled before the fetch failed, don't warn about that.
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import TYPE_CHECKING
+
+import discord
+
+if TYPE_CHECKING:
+    from bot import Spork
+
+_logger = logging.getLogger(__name__)
+
+# Priority classes, lowest first.
+URGENT = 0  # a command is waiting for the guild
+ACTIVE = 1  # messages were seen in the guild, most recent first
+IDLE = 2  # everything else, smallest first
+
+# Activity only moves a guild up the queue this often, on_message calls touch() for every message.
+TOUCH_INTERVAL = 30.0
+
+
+class ChunkScheduler:
+    """Chunks guilds in the background, most wanted first, instead of before the bot is ready.
+
+    Guilds a command is waiting on go first, then guilds with recent messages, then the
+    rest from smallest to largest. At most ``concurrency`` guilds are chunked at once.
+    """
+
+    def __init__(self, bot: Spork, *, concurrency: int = 2, enabled: bool = True) -> None:
+        self.bot = bot
+        self.concurrency = concurrency
+        self.enabled = enabled
+        self.in_flight = 0
+        self.failed = 0
+        self.started_at: float | None = None
+        self.finished_in: float | None = None
+        self._heap: list[tuple[tuple[int, float], int, int]] = []
+        self._pending: dict[int, tuple[int, float]] = {}
+        self._touched: dict[int, float] = {}
+        self._waiters: dict[int, asyncio.Future[bool]] = {}
+        self._counter = itertools.count()
+        self._wake = asyncio.Event()
+        self._workers: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        self.started_at = time.monotonic()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        for waiter in self._waiters.values():
+            if not waiter.done():
+                waiter.set_result(False)
+        self._waiters.clear()
+
+    def progress(self) -> tuple[int, int]:
+        """How many of the bot's guilds are chunked, out of how many."""
+        guilds = self.bot.guilds
+        return sum(1 for guild in guilds if guild.chunked), len(guilds)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._pending)
+
+    def _push(self, guild_id: int, priority: tuple[int, float]) -> None:
+        current = self._pending.get(guild_id)
+        if current is not None and current <= priority:
+            return
+        # Superseded entries are left in the heap and skipped when popped.
+        self._pending[guild_id] = priority
+        heapq.heappush(self._heap, (priority, next(self._counter), guild_id))
+        self._wake.set()
+
+    def add(self, guild: discord.Guild) -> None:
+        if self.enabled and not guild.chunked:
+            self._push(guild.id, (IDLE, guild.member_count or 0))
+
+    def discard(self, guild_id: int) -> None:
+        self._pending.pop(guild_id, None)
+        self._touched.pop(guild_id, None)
+
+    def touch(self, guild_id: int) -> None:
+        current = self._pending.get(guild_id)
+        if current is None or current[0] == URGENT:
+            return
+        now = time.monotonic()
+        if now - self._touched.get(guild_id, 0.0) < TOUCH_INTERVAL:
+            return
+        self._touched[guild_id] = now
+        # Re-pushed as a new entry, a later touch sorts first.
+        self._pending.pop(guild_id)
+        self._push(guild_id, (ACTIVE, -now))
+
+    async def ensure(self, guild: discord.Guild, *, timeout: float) -> bool:
+        """Moves a guild to the front of the queue and waits up to ``timeout`` seconds for it to be chunked."""
+        if guild.chunked:
+            return True
+        if not self.enabled or not self._workers:
+            return False
+
+        waiter = self._waiters.get(guild.id)
+        if waiter is None:
+            waiter = self._waiters[guild.id] = asyncio.get_running_loop().create_future()
+        self._push(guild.id, (URGENT, next(self._counter)))
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter), timeout=timeout)
+        except TimeoutError:
+            return False
+
+    async def _next(self) -> int:
+        while True:
+            while self._heap:
+                priority, _, guild_id = heapq.heappop(self._heap)
+                if self._pending.get(guild_id) == priority:
+                    del self._pending[guild_id]
+                    self._touched.pop(guild_id, None)
+                    return guild_id
+            self._wake.clear()
+            await self._wake.wait()
+
+    async def _work(self) -> None:
+        while True:
+            guild_id = await self._next()
+            guild = self.bot.get_guild(guild_id)
+            if guild is not None and not guild.chunked:
+                await self._chunk(guild)
+
+            waiter = self._waiters.pop(guild_id, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(guild is not None and guild.chunked)
+
+            if self.finished_in is None and not self._pending and not self.in_flight and self.bot.is_ready():
+                assert self.started_at is not None
+                self.finished_in = time.monotonic() - self.started_at
+                _logger.info("Chunked every guild in %.1fs (%s failed)", self.finished_in, self.failed)
+
+    async def _chunk(self, guild: discord.Guild) -> None:
+        # Chunks arrive at roughly a thousand members each, leave plenty of room for a busy shard.
+        timeout = 60.0 + (guild.member_count or 0) / 1000
+        self.in_flight += 1
+        try:
+            await asyncio.wait_for(guild.chunk(cache=True), timeout=timeout)
+        except TimeoutError:
+            self.failed += 1
+            _logger.warning("Timed out chunking guild %s after %.0fs", guild.id, timeout)
+        except (discord.ClientException, ConnectionError) as e:
+            self.failed += 1
+            _logger.warning("Could not chunk guild %s: %s", guild.id, e)
+        else:
+            # Members only known from chunking weren't there when the guild became available.
+            self.bot.user_guilds.add_guild(guild)
+        finally:
+            self.in_flight -= 1
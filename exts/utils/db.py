@@ -0,0 +1,467 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any
+
+import asyncpg
+import discord
+
+from .metrics import Histogram
+
+if TYPE_CHECKING:
+    import datetime
+    from collections.abc import AsyncIterator, Callable, Hashable, Iterable, Sequence
+
+    from asyncpg.pool import PoolConnectionProxy
+    from asyncpg.prepared_stmt import PreparedStatement
+
+_logger = logging.getLogger(__name__)
+
+# Hot queries, prepared once per connection under a fixed name the first time they're used.
+STATEMENTS: dict[str, str] = {
+    "guild_prefixes": "SELECT id, prefix FROM guilds WHERE prefix IS NOT NULL",
+    "set_guild_prefix": (
+        "INSERT INTO guilds (id, prefix) VALUES ($1, $2) ON CONFLICT (id) DO UPDATE SET prefix = EXCLUDED.prefix"
+    ),
+    "command_tree_hashes": "SELECT target, hash FROM command_tree_hashes WHERE target = ANY($1::bigint[])",
+    "set_command_tree_hash": (
+        "INSERT INTO command_tree_hashes (target, hash) VALUES ($1, $2)"
+        " ON CONFLICT (target) DO UPDATE SET hash = EXCLUDED.hash, synced_at = now()"
+    ),
+    # Each lookup is a backwards scan of a rollup's primary key.
+    "member_growth": """
+        SELECT
+            (SELECT members_last FROM member_counts_hourly
+             WHERE guild_id = $1 AND hour <= now() - interval '1 day' ORDER BY hour DESC LIMIT 1) AS day,
+            (SELECT members_last FROM member_counts_daily
+             WHERE guild_id = $1 AND day <= now() - interval '7 days' ORDER BY day DESC LIMIT 1) AS week,
+            (SELECT members_last FROM member_counts_daily
+             WHERE guild_id = $1 AND day <= now() - interval '30 days' ORDER BY day DESC LIMIT 1) AS month
+    """,
+}
+
+# Rollups re-aggregate everything from the latest bucket they already have onwards, so
+# running them again, or after a gap, is always safe.
+ROLLUP_HOURLY = """
+    INSERT INTO member_counts_hourly
+        (guild_id, hour, members_min, members_max, members_last, online_avg, boosters_last, samples)
+    SELECT
+        guild_id,
+        date_trunc('hour', at),
+        min(members),
+        max(members),
+        (array_agg(members ORDER BY at DESC))[1],
+        avg(online),
+        (array_agg(boosters ORDER BY at DESC))[1],
+        count(*)
+    FROM member_counts
+    WHERE at >= COALESCE((SELECT max(hour) FROM member_counts_hourly), '-infinity')
+    GROUP BY 1, 2
+    ON CONFLICT (guild_id, hour) DO UPDATE SET
+        members_min = EXCLUDED.members_min,
+        members_max = EXCLUDED.members_max,
+        members_last = EXCLUDED.members_last,
+        online_avg = EXCLUDED.online_avg,
+        boosters_last = EXCLUDED.boosters_last,
+        samples = EXCLUDED.samples
+"""
+
+ROLLUP_DAILY = """
+    INSERT INTO member_counts_daily
+        (guild_id, day, members_min, members_max, members_last, online_avg, boosters_last, samples)
+    SELECT
+        guild_id,
+        date_trunc('day', hour),
+        min(members_min),
+        max(members_max),
+        (array_agg(members_last ORDER BY hour DESC))[1],
+        sum(online_avg * samples) / NULLIF(sum(samples) FILTER (WHERE online_avg IS NOT NULL), 0),
+        (array_agg(boosters_last ORDER BY hour DESC))[1],
+        sum(samples)
+    FROM member_counts_hourly
+    WHERE hour >= COALESCE((SELECT max(day) FROM member_counts_daily), '-infinity')
+    GROUP BY 1, 2
+    ON CONFLICT (guild_id, day) DO UPDATE SET
+        members_min = EXCLUDED.members_min,
+        members_max = EXCLUDED.members_max,
+        members_last = EXCLUDED.members_last,
+        online_avg = EXCLUDED.online_avg,
+        boosters_last = EXCLUDED.boosters_last,
+        samples = EXCLUDED.samples
+"""
+
+# Key of the advisory lock held while rolling up, so only one cluster does it at a time.
+ROLLUP_LOCK_KEY = 0x5350_4F52_4C
+
+# Acquiring a connection should be near instant, anything slower means the pool is saturated.
+ACQUIRE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# Prepared statements by the backend PID of the connection they belong to.
+_prepared: dict[int, dict[str, PreparedStatement]] = {}
+
+
+async def init_connection(conn: asyncpg.Connection) -> None:
+    """Pool ``init`` callback that forgets a connection's prepared statements once it closes."""
+    pid = conn.get_server_pid()
+    _prepared[pid] = {}
+    conn.add_termination_listener(lambda _: _prepared.pop(pid, None))
+
+
+def _merge_membership(old: tuple[Any, ...], new: tuple[Any, ...]) -> tuple[Any, ...]:
+    guild_id, joined_at, left_at = new
+    # A leave doesn't know when the guild was joined, keep a join from the same flush.
+    if joined_at is None:
+        joined_at = old[1]
+    return guild_id, joined_at, left_at
+
+
+class WriteBuffer(abc.ABC):
+    """Rows waiting to be written together by :class:`Database`.
+
+    Rows added while a flush fails are kept for the next one, up to ``max_pending``,
+    after which the oldest are dropped.
+    """
+
+    def __init__(self, name: str, *, flush_at: int = 500, max_pending: int = 50_000) -> None:
+        self.name = name
+        self.flush_at = flush_at
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+        self.failures = 0
+
+    @abc.abstractmethod
+    def __len__(self) -> int: ...
+
+    @abc.abstractmethod
+    def _take(self) -> list[Any]: ...
+
+    @abc.abstractmethod
+    def _restore(self, rows: list[Any]) -> None: ...
+
+    @abc.abstractmethod
+    async def _write(self, conn: PoolConnectionProxy, rows: list[Any]) -> None: ...
+
+    async def flush(self, conn: PoolConnectionProxy) -> None:
+        rows = self._take()
+        if not rows:
+            return
+        try:
+            await self._write(conn, rows)
+        except BaseException:
+            # Cancellation included, so rows being written at shutdown aren't lost.
+            self.failures += 1
+            self._restore(rows)
+            raise
+        self.written += len(rows)
+
+
+class CopyBuffer(WriteBuffer):
+    """Appends rows to a table with ``COPY``."""
+
+    def __init__(self, name: str, table: str, columns: Sequence[str], **kwargs: Any) -> None:
+        super().__init__(name, **kwargs)
+        self.table = table
+        self.columns = columns
+        self._rows: list[tuple[Any, ...]] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, *row: Any) -> None:
+        self._rows.append(row)
+
+    def _take(self) -> list[tuple[Any, ...]]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    def _restore(self, rows: list[tuple[Any, ...]]) -> None:
+        self._rows[:0] = rows
+        overflow = len(self._rows) - self.max_pending
+        if overflow > 0:
+            del self._rows[:overflow]
+            self.dropped += overflow
+
+    async def _write(self, conn: PoolConnectionProxy, rows: list[tuple[Any, ...]]) -> None:
+        await conn.copy_records_to_table(self.table, records=rows, columns=self.columns)
+
+
+class UpsertBuffer(WriteBuffer):
+    """Keeps one row per key and writes them with ``executemany``.
+
+    A newer row for a key replaces the one waiting, or is combined with it by ``merge``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        query: str,
+        *,
+        merge: Callable[[tuple[Any, ...], tuple[Any, ...]], tuple[Any, ...]] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(name, **kwargs)
+        self.query = query
+        self.merge = merge
+        self._rows: dict[Hashable, tuple[Any, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, key: Hashable, *row: Any) -> None:
+        # Re-inserting moves the key to the end so the oldest rows are the ones dropped.
+        old = self._rows.pop(key, None)
+        self._rows[key] = row if old is None or self.merge is None else self.merge(old, row)
+
+    def _take(self) -> list[tuple[Hashable, tuple[Any, ...]]]:
+        rows = list(self._rows.items())
+        self._rows.clear()
+        return rows
+
+    def _restore(self, rows: list[tuple[Hashable, tuple[Any, ...]]]) -> None:
+        # Anything added since is newer than what failed, so it wins or is merged into it.
+        newer, self._rows = self._rows, dict(rows)
+        for key, row in newer.items():
+            self.add(key, *row)
+        while len(self._rows) > self.max_pending:
+            del self._rows[next(iter(self._rows))]
+            self.dropped += 1
+
+    async def _write(self, conn: PoolConnectionProxy, rows: list[tuple[Hashable, tuple[Any, ...]]]) -> None:
+        await conn.executemany(self.query, [row for _, row in rows])
+
+
+class Database:
+    """The bot's way into Postgres.
+
+    Hot queries go through named prepared statements, connection waits are timed so a
+    saturated pool shows up in the metrics, and frequent small writes are buffered and
+    flushed together every ``flush_interval`` seconds.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, *, flush_interval: float = 2.0) -> None:
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.acquire_wait = Histogram(ACQUIRE_BUCKETS)
+        self.in_use = 0
+        self.queries: dict[str, int] = dict.fromkeys(STATEMENTS, 0)
+
+        self.guild_events = CopyBuffer("guild_events", "guild_events", ("guild_id", "joined", "at"))
+        self.guild_membership = UpsertBuffer(
+            "guild_membership",
+            """
+            INSERT INTO guilds (id, joined_at, left_at) VALUES ($1, $2, $3)
+            ON CONFLICT (id) DO UPDATE
+            SET joined_at = COALESCE(EXCLUDED.joined_at, guilds.joined_at), left_at = EXCLUDED.left_at
+            """,
+            merge=_merge_membership,
+        )
+        # The last time each guild used a command, touched on every invocation.
+        self.guild_activity = UpsertBuffer(
+            "guild_activity",
+            """
+            INSERT INTO guilds (id, last_command_at) VALUES ($1, $2)
+            ON CONFLICT (id) DO UPDATE
+            SET last_command_at = GREATEST(guilds.last_command_at, EXCLUDED.last_command_at)
+            """,
+        )
+        self.error_counts = UpsertBuffer(
+            "error_counts",
+            """
+            INSERT INTO error_counts (fingerprint, window_start, error_type, location, message, commands, count)
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            ON CONFLICT (fingerprint, window_start) DO UPDATE
+            SET message = EXCLUDED.message, commands = EXCLUDED.commands, count = EXCLUDED.count
+            """,
+        )
+        self.member_counts = CopyBuffer(
+            "member_counts", "member_counts", ("guild_id", "at", "members", "online", "boosters"), flush_at=5000
+        )
+        self.buffers: list[WriteBuffer] = [
+            self.guild_membership,
+            self.guild_activity,
+            self.guild_events,
+            self.error_counts,
+            self.member_counts,
+        ]
+
+        self._wake = asyncio.Event()
+        self._flusher: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[PoolConnectionProxy]:
+        start = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            self.acquire_wait.observe(time.perf_counter() - start)
+            self.in_use += 1
+            try:
+                yield conn
+            finally:
+                self.in_use -= 1
+
+    async def _statement(self, conn: PoolConnectionProxy, name: str) -> PreparedStatement:
+        statements = _prepared.setdefault(conn.get_server_pid(), {})
+        statement = statements.get(name)
+        if statement is None:
+            statement = statements[name] = await conn.prepare(STATEMENTS[name], name=f"spork_{name}")
+        self.queries[name] += 1
+        return statement
+
+    async def fetch(self, name: str, *args: Any) -> list[asyncpg.Record]:
+        async with self.acquire() as conn:
+            return await (await self._statement(conn, name)).fetch(*args)
+
+    async def execute(self, name: str, *args: Any) -> None:
+        async with self.acquire() as conn:
+            # A prepared statement has no execute, fetch with no rows returned is the same.
+            await (await self._statement(conn, name)).fetch(*args)
+
+    # Repository
+
+    async def guild_prefixes(self) -> list[asyncpg.Record]:
+        return await self.fetch("guild_prefixes")
+
+    async def set_guild_prefix(self, guild_id: int, prefix: str | None) -> None:
+        await self.execute("set_guild_prefix", guild_id, prefix)
+
+    async def command_tree_hashes(self, targets: list[int]) -> dict[int, str]:
+        return {record["target"]: record["hash"] for record in await self.fetch("command_tree_hashes", targets)}
+
+    async def set_command_tree_hash(self, target: int, digest: str) -> None:
+        await self.execute("set_command_tree_hash", target, digest)
+
+    def guild_joined(self, guild_id: int, at: datetime.datetime) -> None:
+        self.guild_events.add(guild_id, True, at)
+        self.guild_membership.add(guild_id, guild_id, at, None)
+        self._maybe_wake(self.guild_events)
+
+    def guild_left(self, guild_id: int, at: datetime.datetime) -> None:
+        self.guild_events.add(guild_id, False, at)
+        self.guild_membership.add(guild_id, guild_id, None, at)
+        self._maybe_wake(self.guild_events)
+
+    def guild_used(self, guild_id: int, at: datetime.datetime) -> None:
+        self.guild_activity.add(guild_id, guild_id, at)
+        self._maybe_wake(self.guild_activity)
+
+    def error_count(
+        self,
+        fingerprint: str,
+        window_start: datetime.datetime,
+        error_type: str,
+        location: str,
+        message: str,
+        commands: dict[str, int],
+        count: int,
+    ) -> None:
+        row = (fingerprint, window_start, error_type, location, message, json.dumps(commands), count)
+        self.error_counts.add((fingerprint, window_start), *row)
+        self._maybe_wake(self.error_counts)
+
+    def member_count(self, guild_id: int, at: datetime.datetime, members: int, online: int | None, boosters: int) -> None:
+        self.member_counts.add(guild_id, at, members, online, boosters)
+        self._maybe_wake(self.member_counts)
+
+    async def member_growth(self, guild_id: int) -> asyncpg.Record:
+        """A guild's member count a day, a week and a month ago, as far as the rollups go back."""
+        return (await self.fetch("member_growth", guild_id))[0]
+
+    async def rollup_member_counts(
+        self, *, raw: datetime.timedelta, hourly: datetime.timedelta, daily: datetime.timedelta
+    ) -> bool:
+        """Rolls member counts up into hourly and daily aggregates and prunes rows past their retention.
+
+        Returns False without doing anything if another process is already rolling up.
+        """
+        # The latest samples may still be buffered.
+        await self.flush()
+        now = discord.utils.utcnow()
+        async with self.acquire() as conn, conn.transaction():
+            if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", ROLLUP_LOCK_KEY):
+                return False
+            await conn.execute(ROLLUP_HOURLY)
+            await conn.execute(ROLLUP_DAILY)
+            await conn.execute("DELETE FROM member_counts WHERE at < $1", now - raw)
+            await conn.execute("DELETE FROM member_counts_hourly WHERE hour < $1", now - hourly)
+            await conn.execute("DELETE FROM member_counts_daily WHERE day < $1", now - daily)
+        return True
+
+    # Write-behind
+
+    def _maybe_wake(self, buffer: WriteBuffer) -> None:
+        if len(buffer) >= buffer.flush_at:
+            self._wake.set()
+
+    async def flush(self) -> None:
+        if not any(len(buffer) for buffer in self.buffers):
+            return
+        async with self.acquire() as conn:
+            for buffer in self.buffers:
+                try:
+                    await buffer.flush(conn)
+                except (OSError, TimeoutError, asyncpg.PostgresError):
+                    _logger.exception("Could not flush %s rows of %s, retrying later", len(buffer), buffer.name)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except (OSError, TimeoutError, asyncpg.PostgresError):
+                _logger.exception("Could not get a connection to flush buffered writes")
+
+    def render_metrics(self) -> Iterable[str]:
+        yield "# HELP spork_db_pool_connections Connections in the pool by state."
+        yield "# TYPE spork_db_pool_connections gauge"
+        yield f'spork_db_pool_connections{{state="in_use"}} {self.in_use}'
+        yield f'spork_db_pool_connections{{state="idle"}} {self.pool.get_idle_size()}'
+        yield f'spork_db_pool_connections{{state="open"}} {self.pool.get_size()}'
+        yield f'spork_db_pool_connections{{state="max"}} {self.pool.get_max_size()}'
+
+        yield "# HELP spork_db_acquire_seconds Time spent waiting for a pool connection."
+        yield "# TYPE spork_db_acquire_seconds histogram"
+        for bound, count in self.acquire_wait.cumulative():
+            yield f'spork_db_acquire_seconds_bucket{{le="{bound}"}} {count}'
+        yield f"spork_db_acquire_seconds_sum {self.acquire_wait.total}"
+        yield f"spork_db_acquire_seconds_count {self.acquire_wait.count}"
+
+        yield "# HELP spork_db_prepared_queries_total Prepared statement executions by name."
+        yield "# TYPE spork_db_prepared_queries_total counter"
+        for name, count in sorted(self.queries.items()):
+            yield f'spork_db_prepared_queries_total{{statement="{name}"}} {count}'
+
+        yield "# HELP spork_db_buffered_rows Rows waiting to be written."
+        yield "# TYPE spork_db_buffered_rows gauge"
+        for buffer in self.buffers:
+            yield f'spork_db_buffered_rows{{buffer="{buffer.name}"}} {len(buffer)}'
+        yield "# HELP spork_db_buffered_rows_total Buffered rows by what happened to them."
+        yield "# TYPE spork_db_buffered_rows_total counter"
+        for buffer in self.buffers:
+            yield f'spork_db_buffered_rows_total{{buffer="{buffer.name}",outcome="written"}} {buffer.written}'
+            yield f'spork_db_buffered_rows_total{{buffer="{buffer.name}",outcome="dropped"}} {buffer.dropped}'
+        yield "# HELP spork_db_flush_failures_total Flushes of buffered rows that failed."
+        yield "# TYPE spork_db_flush_failures_total counter"
+        for buffer in self.buffers:
+            yield f'spork_db_flush_failures_total{{buffer="{buffer.name}"}} {buffer.failures}'
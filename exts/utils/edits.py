@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import datetime
+from collections import Counter, OrderedDict
+
+import discord
+
+
+class EditFilter:
+    """Decides which message edits should run commands again.
+
+    Edit events also arrive for embed unfurls, pins and edits to old messages. Only an
+    edit that changed the content of a recent message, to content that wasn't already
+    handled for that message, is let through. Handled message/content pairs are kept
+    in a bounded LRU.
+    """
+
+    def __init__(self, *, max_age: float, size: int = 10_000) -> None:
+        self.max_age = datetime.timedelta(seconds=max_age)
+        self.size = size
+        self.processed = 0
+        self.skipped: Counter[str] = Counter()
+        self._handled: OrderedDict[tuple[int, int], None] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._handled)
+
+    def mark(self, message: discord.Message) -> bool:
+        """Remembers that a message was handled with its current content, returning whether it already was."""
+        key = (message.id, hash(message.content))
+        if key in self._handled:
+            self._handled.move_to_end(key)
+            return True
+        self._handled[key] = None
+        if len(self._handled) > self.size:
+            self._handled.popitem(last=False)
+        return False
+
+    def should_process(self, before: discord.Message, after: discord.Message) -> bool:
+        if before.content == after.content:
+            reason = "unchanged"
+        elif discord.utils.utcnow() - after.created_at > self.max_age:
+            reason = "stale"
+        elif self.mark(after):
+            reason = "handled"
+        else:
+            self.processed += 1
+            return True
+
+        self.skipped[reason] += 1
+        return False
+
+    def render_metrics(self) -> list[str]:
+        lines = [
+            "# HELP spork_message_edits_total Message edits by whether commands were run for them again.",
+            "# TYPE spork_message_edits_total counter",
+            f'spork_message_edits_total{{outcome="processed"}} {self.processed}',
+        ]
+        lines.extend(
+            f'spork_message_edits_total{{outcome="skipped_{reason}"}} {count}'
+            for reason, count in sorted(self.skipped.items())
+        )
+        return lines
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import hashlib
+import traceback
+from collections import Counter
+from typing import TYPE_CHECKING
+
+import discord
+
+from .frames import is_own, where
+
+if TYPE_CHECKING:
+    import datetime
+
+
+def locate(error: BaseException) -> str:
+    """Where an exception was raised: the innermost frame of the bot's own code and, if
+    the exception came from deeper inside a library, the library frame that raised it.
+    """
+    frames = traceback.extract_tb(error.__traceback__)
+    if not frames:
+        return "<unknown>"
+    own = next((frame for frame in reversed(frames) if is_own(frame.filename)), None)
+    if own is None or own is frames[-1]:
+        return where(frames[-1])
+    return f"{where(own)} -> {where(frames[-1])}"
+
+
+class ErrorGroup:
+    __slots__ = ("error_type", "fingerprint", "first_seen", "last_seen", "location", "message", "total")
+
+    def __init__(self, fingerprint: str, error_type: str, location: str) -> None:
+        self.fingerprint = fingerprint
+        self.error_type = error_type
+        self.location = location
+        self.message = ""
+        self.total = 0
+        self.first_seen = self.last_seen = discord.utils.utcnow()
+
+
+class WindowCount:
+    __slots__ = ("commands", "count", "group")
+
+    def __init__(self, group: ErrorGroup) -> None:
+        self.group = group
+        self.count = 0
+        self.commands: Counter[str] = Counter()
+
+
+class ErrorAggregator:
+    """Groups command errors by fingerprint, the exception type and where it was raised.
+
+    Errors are counted in windows. Only the first error of a group in each window needs
+    its traceback logged, the rest are reported as counts when the window is rolled over.
+    """
+
+    def __init__(self, *, max_groups: int = 1000) -> None:
+        self.max_groups = max_groups
+        self.groups: dict[str, ErrorGroup] = {}
+        self.window_start = discord.utils.utcnow()
+        self._window: dict[str, WindowCount] = {}
+
+    def record(self, error: BaseException, command: str | None) -> tuple[ErrorGroup, bool]:
+        """Counts an error, returning its group and whether it's the group's first in this window."""
+        error_type = f"{type(error).__module__}.{type(error).__qualname__}"
+        location = locate(error)
+        fingerprint = hashlib.sha1(f"{error_type}|{location}".encode()).hexdigest()[:12]
+
+        group = self.groups.get(fingerprint)
+        if group is None:
+            if len(self.groups) >= self.max_groups:
+                self._evict()
+            group = self.groups[fingerprint] = ErrorGroup(fingerprint, error_type, location)
+        group.message = str(error)[:200]
+        group.total += 1
+        group.last_seen = discord.utils.utcnow()
+
+        window = self._window.get(fingerprint)
+        first = window is None
+        if window is None:
+            window = self._window[fingerprint] = WindowCount(group)
+        window.count += 1
+        window.commands[command or "<none>"] += 1
+        return group, first
+
+    def roll(self) -> tuple[datetime.datetime, list[WindowCount]]:
+        """Ends the current window, returning when it started and its counts, most frequent first."""
+        start, counts = self.window_start, sorted(self._window.values(), key=lambda window: window.count, reverse=True)
+        self.window_start = discord.utils.utcnow()
+        self._window = {}
+        return start, counts
+
+    def _evict(self) -> None:
+        # Groups that haven't been seen this window go first, oldest first.
+        idle = sorted(
+            (group for fingerprint, group in self.groups.items() if fingerprint not in self._window),
+            key=lambda group: group.last_seen,
+        )
+        for group in idle[: max(1, len(self.groups) // 10)]:
+            del self.groups[group.fingerprint]
+
+    @staticmethod
+    def summarise(counts: list[WindowCount], seconds: float) -> str | None:
+        """A log message for the errors whose repeats weren't logged, if there were any."""
+        repeated = [window for window in counts if window.count > 1]
+        if not repeated:
+            return None
+        lines = [f"Repeated errors in the last {seconds:.0f}s:"]
+        for window in repeated:
+            group = window.group
+            commands = ", ".join(f"{name} x{count}" for name, count in window.commands.most_common(5))
+            lines.append(
+                f"  {window.count}x [{group.fingerprint}] {group.error_type}: {group.message}"
+                f"\n    at {group.location} ({commands})"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import ast
+import asyncio
+import importlib
+import importlib.util
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pkgutil import ModuleInfo
+
+    from discord.ext import commands
+
+_logger = logging.getLogger(__name__)
+
+# Decorators from ``discord.ext.commands`` that create a top level text command.
+_COMMAND_DECORATORS = {"command", "hybrid_command", "group", "hybrid_group"}
+
+
+class StartupTimer:
+    """Records how long each step of starting the bot takes."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.steps: list[tuple[str, float]] = []
+        self.ready: float | None = None
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - start))
+
+    def mark_ready(self) -> float:
+        """Marks the bot as ready, returning the seconds since the timer was created."""
+        self.ready = time.perf_counter() - self.started
+        return self.ready
+
+    def report(self) -> str:
+        width = max((len(name) for name, _ in self.steps), default=0)
+        lines = [f"{name:<{width}}  {seconds * 1000:>8.1f}ms" for name, seconds in self.steps]
+        if self.ready is not None:
+            lines.append(f"{'ready':<{width}}  {self.ready * 1000:>8.1f}ms")
+        return "\n".join(lines)
+
+
+@dataclass(slots=True)
+class ExtensionInfo:
+    name: str
+    ispkg: bool = False
+    depends_on: tuple[str, ...] = ()
+    imports: tuple[str, ...] = ()
+    commands: tuple[str, ...] = ()
+
+
+def _command_names(node: ast.FunctionDef | ast.AsyncFunctionDef) -> list[str]:
+    for decorator in node.decorator_list:
+        if not (
+            isinstance(decorator, ast.Call)
+            and isinstance(decorator.func, ast.Attribute)
+            and decorator.func.attr in _COMMAND_DECORATORS
+            and isinstance(decorator.func.value, ast.Name)
+            and decorator.func.value.id == "commands"
+        ):
+            continue
+
+        names = [node.name]
+        for keyword in decorator.keywords:
+            if keyword.arg == "name" and isinstance(keyword.value, ast.Constant):
+                names[0] = str(keyword.value.value)
+            elif keyword.arg == "aliases" and isinstance(keyword.value, (ast.List, ast.Tuple)):
+                names.extend(str(elt.value) for elt in keyword.value.elts if isinstance(elt, ast.Constant))
+        return names
+    return []
+
+
+def scan_extension(module: ModuleInfo) -> ExtensionInfo:
+    """Reads what an extension imports, depends on and which commands it adds without importing it.
+
+    An extension can declare other extensions that must be loaded before it with a
+    module level ``DEPENDS_ON`` tuple of extension names.
+    """
+    info = ExtensionInfo(module.name, module.ispkg)
+    spec = importlib.util.find_spec(module.name)
+    if spec is None or spec.origin is None:
+        return info
+
+    package = module.name if module.ispkg else module.name.rpartition(".")[0]
+    tree = ast.parse(Path(spec.origin).read_bytes(), filename=spec.origin)
+
+    imports: list[str] = []
+    commands: list[str] = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            imports.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module != "__future__":
+            try:
+                imports.append(importlib.util.resolve_name("." * node.level + (node.module or ""), package))
+            except ImportError:
+                pass
+        elif isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "DEPENDS_ON" for t in node.targets):
+            info.depends_on = tuple(ast.literal_eval(node.value))
+        elif isinstance(node, ast.ClassDef):
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    commands.extend(_command_names(item))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            commands.extend(_command_names(node))
+
+    info.imports = tuple(imports)
+    info.commands = tuple(name.lower() for name in commands)
+    return info
+
+
+def load_waves(extensions: Iterable[ExtensionInfo]) -> list[list[ExtensionInfo]]:
+    """Groups extensions into waves where every extension only depends on ones in earlier waves."""
+    pending = {info.name: info for info in extensions}
+    loaded: set[str] = set()
+    waves: list[list[ExtensionInfo]] = []
+    while pending:
+        wave = [info for info in pending.values() if all(dep in loaded or dep not in pending for dep in info.depends_on)]
+        if not wave:
+            raise RuntimeError(f"Extensions have circular dependencies: {', '.join(pending)}")
+        for info in wave:
+            del pending[info.name]
+            loaded.add(info.name)
+        waves.append(wave)
+    return waves
+
+
+class ExtensionLoader:
+    """Loads extensions concurrently in dependency order and defers some until their first use.
+
+    Deferred extensions are only scanned at startup, the first time one of their commands
+    is invoked they are loaded and the command is looked up again. Only text commands are
+    seen before that, so extensions with application commands shouldn't be deferred.
+    """
+
+    def __init__(self, bot: commands.Bot, timer: StartupTimer) -> None:
+        self.bot = bot
+        self.timer = timer
+        self.deferred: dict[str, ExtensionInfo] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def load(self, modules: Iterable[ModuleInfo], *, defer: Iterable[str] = ()) -> None:
+        defer = set(defer)
+        with self.timer.step("scan extensions"):
+            infos = [scan_extension(module) for module in modules]
+
+        eager = [info for info in infos if info.name not in defer]
+        for info in infos:
+            if info.name in defer:
+                self.deferred.update((command, info) for command in info.commands)
+                _logger.info("Deferred extension: %s (%s)", info.name, ", ".join(info.commands) or "no commands")
+
+        with self.timer.step("imports"):
+            await self._prewarm(eager)
+
+        with self.timer.step("cog setup"):
+            for wave in load_waves(eager):
+                await asyncio.gather(*(self._load_timed(info) for info in wave))
+
+    async def _prewarm(self, extensions: Iterable[ExtensionInfo]) -> None:
+        # Extensions themselves are executed by load_extension, but whatever they import
+        # can be imported beforehand in threads so the slow parts overlap.
+        missing = {name for info in extensions for name in info.imports if name not in sys.modules}
+
+        def import_module(name: str) -> None:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                # load_extension will import it again and report the error properly.
+                _logger.debug("Could not import %s ahead of time", name, exc_info=True)
+
+        await asyncio.gather(*(asyncio.to_thread(import_module, name) for name in sorted(missing)))
+
+    async def _load_timed(self, info: ExtensionInfo) -> None:
+        start = time.perf_counter()
+        await self.bot.load_extension(info.name)
+        elapsed = (time.perf_counter() - start) * 1000
+        _logger.info("Loaded %sextension: %s in %.1fms", "module " if info.ispkg else "", info.name, elapsed)
+
+    def deferred_for(self, command: str) -> ExtensionInfo | None:
+        info = self.deferred.get(command.lower())
+        if info is None or info.name in self.bot.extensions:
+            return None
+        return info
+
+    async def load_deferred(self, info: ExtensionInfo) -> None:
+        lock = self._locks.setdefault(info.name, asyncio.Lock())
+        async with lock:
+            if info.name not in self.bot.extensions:
+                await self._load_timed(info)
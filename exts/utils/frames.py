@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import traceback
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def is_own(filename: str) -> bool:
+    """Whether a frame's file is the bot's code, and not a library, even one installed in a virtualenv in the checkout."""
+    return "site-packages" not in filename and Path(filename).is_relative_to(PROJECT_ROOT)
+
+
+def where(frame: traceback.FrameSummary) -> str:
+    """A frame as ``path:line in function``, with paths in the checkout made relative to it."""
+    path = Path(frame.filename)
+    if path.is_relative_to(PROJECT_ROOT):
+        path = path.relative_to(PROJECT_ROOT)
+    return f"{path}:{frame.lineno} in {frame.name}"
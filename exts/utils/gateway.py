@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import datetime
+import gzip
+import logging
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+
+class GatewayRecorder:
+    """Writes every raw gateway payload to a gzipped file, one ``offset<TAB>payload`` line each.
+
+    The offset is the seconds since recording started. Payloads are handed to a writer
+    thread so compression never runs on the event loop, if it falls behind by more than
+    ``max_pending`` payloads the rest are dropped and counted.
+    """
+
+    def __init__(self, directory: Path, *, cluster_id: int | None = None, max_pending: int = 100_000) -> None:
+        stamp = datetime.datetime.now(datetime.UTC).strftime("%Y%m%d-%H%M%S")
+        suffix = "" if cluster_id is None else f"-cluster{cluster_id}"
+        self.path = directory / f"gateway-{stamp}{suffix}.jsonl.gz"
+        self.recorded = 0
+        self.dropped = 0
+        self._started = 0.0
+        self._queue: queue.Queue[str | None] = queue.Queue(maxsize=max_pending)
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._write, name="spork-gateway-recorder", daemon=True)
+        self._thread.start()
+        _logger.info("Recording gateway payloads to %s", self.path)
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        _logger.info("Recorded %s gateway payloads to %s (%s dropped)", self.recorded, self.path, self.dropped)
+
+    def record(self, payload: str | bytes) -> None:
+        if isinstance(payload, bytes):
+            payload = payload.decode()
+        try:
+            self._queue.put_nowait(f"{time.monotonic() - self._started:.6f}\t{payload}\n")
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self) -> None:
+        with gzip.open(self.path, "at", encoding="utf-8") as file:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    return
+                file.write(line)
+                self.recorded += 1
+                if self._queue.empty():
+                    file.flush()
+
+
+def read_recording(path: Path) -> Iterator[tuple[float, str]]:
+    """Yields the ``(offset, payload)`` pairs of a recording, streaming it from disk."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            offset, _, payload = line.rstrip("\n").partition("\t")
+            yield float(offset), payload
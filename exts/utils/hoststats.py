@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, fields
+
+import psutil
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class HostSample:
+    at: float
+    cpu_percent: float
+    system_cpu_percent: float
+    memory_percent: float
+    rss: int
+    threads: int
+
+
+@dataclass(frozen=True, slots=True)
+class Range:
+    min: float
+    avg: float
+    max: float
+
+
+class HostSampler:
+    """Samples process and host usage from a background thread into a ring buffer.
+
+    ``cpu_percent`` is measured over each interval, so every sample is the usage
+    between it and the one before it.
+    """
+
+    def __init__(self, *, interval: float = 5.0, samples: int = 120) -> None:
+        self.interval = interval
+        self.samples: deque[HostSample] = deque(maxlen=samples)
+        self._process = psutil.Process(os.getpid())
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def covered(self) -> float:
+        """The seconds covered by the samples in the buffer."""
+        return len(self.samples) * self.interval
+
+    @property
+    def latest(self) -> HostSample | None:
+        return self.samples[-1] if self.samples else None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        # The first call of either only sets the baseline the next one is measured against.
+        self._process.cpu_percent()
+        psutil.cpu_percent()
+        self._thread = threading.Thread(target=self._run, name="spork-host-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.samples.append(self._sample())
+            except psutil.Error:
+                _logger.exception("Could not sample host stats")
+
+    def _sample(self) -> HostSample:
+        with self._process.oneshot():
+            return HostSample(
+                at=time.time(),
+                cpu_percent=self._process.cpu_percent(),
+                system_cpu_percent=psutil.cpu_percent(),
+                memory_percent=self._process.memory_percent(),
+                rss=self._process.memory_info().rss,
+                threads=self._process.num_threads(),
+            )
+
+    def summary(self, seconds: float | None = None) -> dict[str, Range]:
+        """The min, average and max of every field over the last ``seconds``, or the whole buffer."""
+        samples = list(self.samples)
+        if seconds is not None:
+            cutoff = time.time() - seconds
+            samples = [sample for sample in samples if sample.at >= cutoff]
+        if not samples:
+            return {}
+
+        ret = {}
+        for field in fields(HostSample):
+            if field.name == "at":
+                continue
+            values = [getattr(sample, field.name) for sample in samples]
+            ret[field.name] = Range(min(values), sum(values) / len(values), max(values))
+        return ret
+
+    def render_metrics(self) -> list[str]:
+        sample = self.latest
+        if sample is None:
+            return []
+        return [
+            "# HELP spork_process_cpu_percent CPU used by the bot process over the last sample interval.",
+            "# TYPE spork_process_cpu_percent gauge",
+            f"spork_process_cpu_percent {sample.cpu_percent}",
+            "# HELP spork_host_cpu_percent CPU used by the whole host over the last sample interval.",
+            "# TYPE spork_host_cpu_percent gauge",
+            f"spork_host_cpu_percent {sample.system_cpu_percent}",
+            "# HELP spork_process_resident_memory_bytes Resident memory of the bot process.",
+            "# TYPE spork_process_resident_memory_bytes gauge",
+            f"spork_process_resident_memory_bytes {sample.rss}",
+            "# HELP spork_process_threads Threads in the bot process.",
+            "# TYPE spork_process_threads gauge",
+            f"spork_process_threads {sample.threads}",
+        ]
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import datetime
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import discord
+
+# An invite deleted this soon before or after a join, one use short of its limit, was used up by it.
+USED_UP_WINDOW = 15.0
+
+
+@dataclass(slots=True)
+class TrackedInvite:
+    code: str
+    uses: int
+    max_uses: int  # 0 is unlimited
+    inviter_id: int | None
+    expires_at: datetime.datetime | None
+
+    @classmethod
+    def from_invite(cls, invite: discord.Invite) -> TrackedInvite:
+        expires_at = invite.expires_at
+        # Invites from INVITE_CREATE only say how long they last.
+        if expires_at is None and invite.max_age and invite.created_at is not None:
+            expires_at = invite.created_at + datetime.timedelta(seconds=invite.max_age)
+        return cls(
+            invite.code,
+            invite.uses or 0,
+            invite.max_uses or 0,
+            invite.inviter.id if invite.inviter else None,
+            expires_at,
+        )
+
+    def usable(self, now: datetime.datetime) -> bool:
+        return (self.expires_at is None or self.expires_at > now) and (not self.max_uses or self.uses < self.max_uses)
+
+    @property
+    def last_use(self) -> bool:
+        return self.max_uses > 0 and self.uses + 1 == self.max_uses
+
+
+@dataclass(slots=True)
+class Attribution:
+    guild_id: int
+    member_id: int
+    joined_at: datetime.datetime
+    # How the invite was worked out: "only invite", "used up", "diff", "vanity", "ambiguous" or "unknown".
+    how: str
+    code: str | None = None
+    inviter_id: int | None = None
+    candidates: tuple[str, ...] = ()
+
+
+@dataclass(slots=True)
+class GuildInvites:
+    invites: dict[str, TrackedInvite]
+    vanity_uses: int | None
+    # Deleted invites by code, with when they were deleted.
+    deleted: dict[str, tuple[TrackedInvite, float]] = field(default_factory=dict)
+    # Members whose invite can only be told from a fresh fetch.
+    pending: list[tuple[int, datetime.datetime]] = field(default_factory=list)
+
+    def prune_deleted(self, now: float) -> None:
+        for code, (_, deleted_at) in list(self.deleted.items()):
+            if now - deleted_at > USED_UP_WINDOW:
+                del self.deleted[code]
+
+
+class InviteTracker:
+    """Works out which invite each member joined with from snapshots of every guild's invites.
+
+    Snapshots are kept current from invite create and delete events. Most joins can be
+    attributed from the snapshot alone: a guild with a single usable invite, or an
+    invite deleted as it hit its use limit. The rest wait in the guild's snapshot until
+    its invites are fetched again and the use counts are diffed.
+    """
+
+    def __init__(self, *, max_attributions: int = 50_000) -> None:
+        self.max_attributions = max_attributions
+        self.guilds: dict[int, GuildInvites] = {}
+        self.attributions: OrderedDict[tuple[int, int], Attribution] = OrderedDict()
+
+    def tracks(self, guild_id: int) -> bool:
+        return guild_id in self.guilds
+
+    def pending(self, guild_id: int) -> int:
+        snapshot = self.guilds.get(guild_id)
+        return len(snapshot.pending) if snapshot is not None else 0
+
+    def waiting(self, guild_id: int, member_id: int) -> bool:
+        """Whether a member's join is waiting for a fetch to be attributed."""
+        snapshot = self.guilds.get(guild_id)
+        return snapshot is not None and any(pending_id == member_id for pending_id, _ in snapshot.pending)
+
+    def forget(self, guild_id: int) -> None:
+        self.guilds.pop(guild_id, None)
+
+    def get(self, guild_id: int, member_id: int) -> Attribution | None:
+        return self.attributions.get((guild_id, member_id))
+
+    def _record(self, attribution: Attribution) -> Attribution:
+        key = (attribution.guild_id, attribution.member_id)
+        self.attributions.pop(key, None)
+        self.attributions[key] = attribution
+        if len(self.attributions) > self.max_attributions:
+            self.attributions.popitem(last=False)
+        return attribution
+
+    def created(self, guild_id: int, invite: discord.Invite) -> None:
+        if (snapshot := self.guilds.get(guild_id)) is not None:
+            snapshot.invites[invite.code] = TrackedInvite.from_invite(invite)
+
+    def deleted(self, guild_id: int, code: str) -> None:
+        if (snapshot := self.guilds.get(guild_id)) is None:
+            return
+        invite = snapshot.invites.pop(code, None)
+        if invite is not None:
+            snapshot.deleted[code] = (invite, time.monotonic())
+
+    def joined(self, member: discord.Member) -> Attribution | None:
+        """Attributes a join from the snapshot, or returns None if it has to wait for a fetch."""
+        snapshot = self.guilds.get(member.guild.id)
+        if snapshot is None:
+            return None
+        joined_at = member.joined_at or discord.utils.utcnow()
+        snapshot.prune_deleted(time.monotonic())
+
+        used_up = [code for code, (invite, _) in snapshot.deleted.items() if invite.last_use]
+        if len(used_up) == 1:
+            invite, _ = snapshot.deleted.pop(used_up[0])
+            return self._record(Attribution(member.guild.id, member.id, joined_at, "used up", invite.code, invite.inviter_id))
+
+        usable = [invite for invite in snapshot.invites.values() if invite.usable(joined_at)]
+        if len(usable) == 1 and not used_up and snapshot.vanity_uses is None:
+            invite = usable[0]
+            invite.uses += 1
+            return self._record(Attribution(member.guild.id, member.id, joined_at, "only invite", invite.code, invite.inviter_id))
+
+        snapshot.pending.append((member.id, joined_at))
+        return None
+
+    def snapshot(
+        self, guild_id: int, invites: list[discord.Invite], vanity_uses: int | None, *, resolve: int = 0
+    ) -> list[Attribution]:
+        """Replaces a guild's snapshot with freshly fetched invites.
+
+        The first ``resolve`` pending joins, those that were pending when the fetch was made,
+        are attributed from the diff, along with any later ones whose uses the
+        counts already show. The rest stay pending for the next fetch.
+        """
+        old = self.guilds.get(guild_id)
+        new = GuildInvites({invite.code: TrackedInvite.from_invite(invite) for invite in invites}, vanity_uses)
+        self.guilds[guild_id] = new
+        if old is None:
+            return []
+        if not resolve:
+            new.pending = old.pending
+            return []
+
+        increased: dict[str, TrackedInvite] = {}
+        added = 0
+        for code, invite in new.invites.items():
+            before = old.invites.get(code)
+            if invite.uses > (before_uses := before.uses if before is not None else 0):
+                increased[code] = invite
+                added += invite.uses - before_uses
+        old.prune_deleted(time.monotonic())
+        for code, (invite, _) in old.deleted.items():
+            if invite.last_use:
+                increased[code] = invite
+                added += 1
+        vanity = vanity_uses is not None and old.vanity_uses is not None and vanity_uses > old.vanity_uses
+        if vanity:
+            added += vanity_uses - old.vanity_uses
+
+        # Joins made while the fetch was in flight can already be in its counts, any surplus uses are theirs.
+        resolve = max(resolve, min(added, len(old.pending)))
+        new.pending = old.pending[resolve:]
+
+        attributions = []
+        for member_id, joined_at in old.pending[:resolve]:
+            if len(increased) == 1 and not vanity:
+                invite = next(iter(increased.values()))
+                attribution = Attribution(guild_id, member_id, joined_at, "diff", invite.code, invite.inviter_id)
+            elif vanity and not increased:
+                attribution = Attribution(guild_id, member_id, joined_at, "vanity")
+            elif increased or vanity:
+                candidates = (*increased, *(("vanity",) if vanity else ()))
+                attribution = Attribution(guild_id, member_id, joined_at, "ambiguous", candidates=candidates)
+            else:
+                attribution = Attribution(guild_id, member_id, joined_at, "unknown")
+            attributions.append(self._record(attribution))
+        return attributions
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import traceback
+from types import TracebackType
+from typing import Any
+
+_ExcInfo = tuple[type[BaseException], BaseException, TracebackType | None]
+
+
+class CappedTracebackFormatter(logging.Formatter):
+    """A formatter that keeps tracebacks short and, past a budget, skips them altogether.
+
+    Only the last ``max_frames`` frames of a traceback are formatted, and at most
+    ``per_minute`` full tracebacks are formatted each minute. Beyond that only the
+    exception line is kept so an error storm stays cheap to log.
+    """
+
+    def __init__(self, *args: Any, max_frames: int = 30, per_minute: int = 60, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.max_frames = max_frames
+        self.per_minute = per_minute
+        self.skipped = 0
+        self._window = 0
+        self._formatted = 0
+
+    def formatException(self, ei: _ExcInfo) -> str:  # type: ignore
+        window = int(time.monotonic() // 60)
+        if window != self._window:
+            self._window = window
+            self._formatted = 0
+
+        if self._formatted >= self.per_minute:
+            self.skipped += 1
+            return "".join(traceback.format_exception_only(ei[0], ei[1])).rstrip() + " (traceback skipped)"
+
+        self._formatted += 1
+        return "".join(traceback.format_exception(*ei, limit=-self.max_frames)).rstrip()
+
+
+class JSONFormatter(CappedTracebackFormatter):
+    """Formats each record as a single line of JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: dict[str, Any] = {
+            "time": datetime.datetime.fromtimestamp(record.created, tz=datetime.UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "line": record.lineno,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)  # type: ignore
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str)
+
+
+class BatchFlushMixin:
+    """Makes a stream handler leave flushing to :class:`BatchingQueueListener`."""
+
+    def flush(self) -> None:
+        pass
+
+    def flush_batch(self) -> None:
+        super().flush()  # type: ignore
+
+
+class BatchedStreamHandler(BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class BatchedRotatingFileHandler(BatchFlushMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Puts records on a bounded queue without formatting them, dropping records once it is full."""
+
+    def __init__(self, queue: queue.Queue[logging.LogRecord]) -> None:
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now in case they change later, formatting and tracebacks
+        # are left for the writer thread.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener:
+    """Writes queued records to its handlers from a background thread.
+
+    Records are handled in batches of up to ``batch_size`` and the handlers are flushed
+    once per batch, or at least every ``flush_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        queue: queue.Queue[logging.LogRecord],
+        *handlers: logging.Handler,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        queue_handler: DroppingQueueHandler | None = None,
+    ) -> None:
+        self.queue = queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_handler = queue_handler
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="spork-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        reported_drops = 0
+        while not (self._stopping.is_set() and self.queue.empty()):
+            batch: list[logging.LogRecord] = []
+            try:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if self.queue_handler is not None and self.queue_handler.dropped != reported_drops:
+                dropped = self.queue_handler.dropped - reported_drops
+                reported_drops = self.queue_handler.dropped
+                batch.append(
+                    logging.makeLogRecord(
+                        {
+                            "name": __name__,
+                            "levelno": logging.WARNING,
+                            "levelname": "WARNING",
+                            "msg": f"Dropped {dropped} log records because the log queue was full",
+                        }
+                    )
+                )
+
+            for record in batch:
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+            for handler in self.handlers:
+                if isinstance(handler, BatchFlushMixin):
+                    handler.flush_batch()
+                else:
+                    handler.flush()
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from .frames import is_own, where
+
+if TYPE_CHECKING:
+    from types import FrameType
+
+_logger = logging.getLogger(__name__)
+
+# How often the loop checks in with the watchdog thread.
+TICK = 0.1
+
+
+@dataclass(slots=True)
+class BlockedCallback:
+    seconds: float
+    handler: str
+    location: str
+
+
+def _describe_stack(frame: FrameType | None) -> str:
+    """The innermost frame of our own code in a stack, falling back to the innermost frame."""
+    if frame is None:
+        return "unknown"
+    stack = traceback.extract_stack(frame)
+    for summary in reversed(stack):
+        if is_own(summary.filename):
+            return where(summary)
+    return where(stack[-1])
+
+
+class LoopMonitor:
+    """Samples event loop lag, counts gateway events and reports callbacks that block the loop.
+
+    Lag is measured from how late a sleep wakes up. Blocking is detected by a watchdog
+    thread that notices when the loop stops checking in and grabs its stack.
+    """
+
+    def __init__(self, *, interval: float = 0.5, block_threshold: float = 0.25, samples: int = 600) -> None:
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.lag: deque[float] = deque(maxlen=samples)
+        self.events: Counter[str] = Counter()
+        self.event_rates: dict[str, float] = {}
+        self.blocked = 0
+        self.worst_block: BlockedCallback | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread = 0
+        self._beat = time.monotonic()
+        self._tick_handle: asyncio.TimerHandle | None = None
+        self._sampler: asyncio.Task[None] | None = None
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._sampler is not None
+
+    @property
+    def events_per_second(self) -> float:
+        return sum(self.event_rates.values())
+
+    def count_event(self, event_type: str) -> None:
+        self.events[event_type] += 1
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._tick()
+        self._sampler = self._loop.create_task(self._sample())
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="spork-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._tick_handle is not None:
+            self._tick_handle.cancel()
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+
+    def _tick(self) -> None:
+        self._beat = time.monotonic()
+        assert self._loop
+        self._tick_handle = self._loop.call_later(TICK, self._tick)
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        previous = self.events.copy()
+        previous_at = loop.time()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            self.lag.append(max(now - start - self.interval, 0.0))
+
+            if now - previous_at >= 1.0:
+                elapsed = now - previous_at
+                self.event_rates = {name: (count - previous[name]) / elapsed for name, count in self.events.items()}
+                previous = self.events.copy()
+                previous_at = now
+
+    def _watch(self) -> None:
+        stalled_since: float | None = None
+        handler = location = "unknown"
+        while not self._stop.wait(TICK / 2):
+            beat = self._beat
+            if stalled_since is not None and beat != stalled_since:
+                # The loop checked in again, so the stall is over.
+                self._record_block(BlockedCallback(beat - stalled_since - TICK, handler, location))
+                stalled_since = None
+
+            if stalled_since is None and time.monotonic() - beat > TICK + self.block_threshold:
+                # Catch whatever is running while it's still running.
+                stalled_since = beat
+                handler, location = self._current_handler()
+
+    def _current_handler(self) -> tuple[str, str]:
+        frame = sys._current_frames().get(self._loop_thread)
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        if task is not None:
+            coro = task.get_coro()
+            handler = f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+        else:
+            handler = "a plain callback"
+        return handler, _describe_stack(frame)
+
+    def _record_block(self, block: BlockedCallback) -> None:
+        self.blocked += 1
+        if self.worst_block is None or block.seconds > self.worst_block.seconds:
+            self.worst_block = block
+        _logger.warning("Event loop was blocked for %.3fs by %s at %s", block.seconds, block.handler, block.location)
+
+    def render_metrics(self) -> list[str]:
+        lines = [
+            "# HELP spork_event_loop_lag_seconds How late the last event loop lag probe woke up.",
+            "# TYPE spork_event_loop_lag_seconds gauge",
+            f"spork_event_loop_lag_seconds {self.lag[-1] if self.lag else 0.0}",
+            "# HELP spork_event_loop_blocked_total Callbacks that blocked the event loop past the threshold.",
+            "# TYPE spork_event_loop_blocked_total counter",
+            f"spork_event_loop_blocked_total {self.blocked}",
+            "# HELP spork_gateway_events_total Gateway events received by type.",
+            "# TYPE spork_gateway_events_total counter",
+        ]
+        lines.extend(f'spork_gateway_events_total{{type="{name}"}} {count}' for name, count in sorted(self.events.items()))
+        return lines
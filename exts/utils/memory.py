@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import functools
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import tracemalloc
+
+# Which of discord.py's modules allocate the objects held by each cache.
+CACHE_MODULES: dict[str, tuple[str, ...]] = {
+    "members": ("member.py",),
+    "users": ("user.py", "primary_guild.py", "collectible.py"),
+    "presences": ("activity.py", "presences.py"),
+    "messages": ("message.py", "embeds.py", "components.py", "reaction.py", "sticker.py", "poll.py"),
+    "channels": ("channel.py", "threads.py", "stage_instance.py"),
+    "guilds": ("guild.py", "role.py", "emoji.py", "partial_emoji.py", "permissions.py", "scheduled_event.py", "soundboard.py"),
+}
+
+_MODULE_CATEGORIES = {module: category for category, modules in CACHE_MODULES.items() for module in modules}
+
+
+@dataclass(slots=True)
+class CategoryUsage:
+    name: str
+    size: int = 0
+    blocks: int = 0
+
+
+# Snapshots repeat the same few files in every traceback.
+@functools.cache
+def _categorise(filename: str) -> str | None:
+    path = Path(filename)
+    if path.parent.name != "discord":
+        return None
+    return _MODULE_CATEGORIES.get(path.name, "discord (other)")
+
+
+def cache_usage(snapshot: tracemalloc.Snapshot, /) -> list[CategoryUsage]:
+    """Sums the memory in a snapshot by the cache that allocated it.
+
+    Each allocation is attributed to the innermost discord.py frame of its traceback,
+    so snapshots taken with more frames attribute more precisely.
+    """
+    usage: dict[str, CategoryUsage] = {}
+    for stat in snapshot.statistics("traceback"):
+        category = "other"
+        for frame in reversed(stat.traceback):
+            if (found := _categorise(frame.filename)) is not None:
+                category = found
+                break
+
+        entry = usage.setdefault(category, CategoryUsage(category))
+        entry.size += stat.size
+        entry.blocks += stat.count
+
+    return sorted(usage.values(), key=lambda u: u.size, reverse=True)
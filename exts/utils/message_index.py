@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import datetime
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import TYPE_CHECKING
+
+import discord
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+class ChannelIndex:
+    __slots__ = ("floor", "messages", "own", "triggers")
+
+    def __init__(self, floor: int, maxlen: int) -> None:
+        # Every message in the channel at or after this snowflake is in messages, oldest first.
+        self.floor = floor
+        self.messages: deque[int] = deque(maxlen=maxlen)
+        self.own: set[int] = set()
+        self.triggers: set[int] = set()
+
+    def add(self, message_id: int, *, own: bool, trigger: bool) -> None:
+        if self.messages and message_id <= self.messages[-1]:
+            # An edit turned an earlier message into a command.
+            if trigger and message_id >= self.floor:
+                self.triggers.add(message_id)
+            return
+
+        if len(self.messages) == self.messages.maxlen:
+            oldest = self.messages[0]
+            self.floor = oldest + 1
+            self.own.discard(oldest)
+            self.triggers.discard(oldest)
+        self.messages.append(message_id)
+        if own:
+            self.own.add(message_id)
+        if trigger:
+            self.triggers.add(message_id)
+
+    def discard(self, message_id: int) -> None:
+        try:
+            self.messages.remove(message_id)
+        except ValueError:
+            return
+        self.own.discard(message_id)
+        self.triggers.discard(message_id)
+
+
+class MessageIndex:
+    """Remembers recent message IDs in the channels the bot is used in, and which it sent or was invoked by.
+
+    This lets cleanup find its messages among the newest ones without paging through channel history.
+    """
+
+    def __init__(self, *, per_channel: int = 100, max_channels: int = 5000) -> None:
+        self.per_channel = per_channel
+        self.max_channels = max_channels
+        self._channels: OrderedDict[int, ChannelIndex] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def add(self, channel_id: int, message_id: int, *, own: bool = False, trigger: bool = False) -> None:
+        """Records a message, channels are only tracked from the first message the bot sent or was invoked by."""
+        if own or trigger:
+            index = self._get(channel_id, message_id)
+        elif (index := self._channels.get(channel_id)) is None:
+            return
+        index.add(message_id, own=own, trigger=trigger)
+
+    def discard(self, channel_id: int, message_ids: Iterable[int]) -> None:
+        if (index := self._channels.get(channel_id)) is None:
+            return
+        for message_id in message_ids:
+            index.discard(message_id)
+
+    def forget_channel(self, channel_id: int) -> None:
+        self._channels.pop(channel_id, None)
+
+    def clear(self) -> None:
+        self._channels.clear()
+
+    def lookup(self, channel_id: int, limit: int, *, include_triggers: bool = True) -> tuple[list[int], int, int]:
+        """Looks through the newest ``limit`` messages of a channel as far as the index goes back.
+
+        Returns the IDs of those to clean up, newest first, how many messages were looked
+        through and the snowflake the index starts at. Older messages aren't indexed.
+        """
+        index = self._channels.get(channel_id)
+        if index is None:
+            return [], 0, _now_snowflake()
+
+        checked = min(limit, len(index.messages))
+        ids = [
+            message_id
+            for message_id in islice(reversed(index.messages), checked)
+            if message_id in index.own or (include_triggers and message_id in index.triggers)
+        ]
+        return ids, checked, index.floor
+
+    def _get(self, channel_id: int, message_id: int) -> ChannelIndex:
+        index = self._channels.get(channel_id)
+        if index is None:
+            # A channel we haven't seen since startup (or forgot) is only known from this message on.
+            index = self._channels[channel_id] = ChannelIndex(message_id, self.per_channel)
+            if len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        else:
+            self._channels.move_to_end(channel_id)
+        return index
+
+
+def _now_snowflake() -> int:
+    return discord.utils.time_snowflake(discord.utils.utcnow())
+
+
+def split_by_bulk_window(message_ids: list[int]) -> tuple[list[int], list[int]]:
+    """Splits IDs into those that can still be bulk deleted (under 14 days old) and those that can't."""
+    # A little margin so nothing crosses the line while the request is in flight.
+    cutoff = discord.utils.time_snowflake(discord.utils.utcnow() - datetime.timedelta(days=14, minutes=-1))
+    recent = [message_id for message_id in message_ids if message_id > cutoff]
+    old = [message_id for message_id in message_ids if message_id <= cutoff]
+    return recent, old
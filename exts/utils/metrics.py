@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import bisect
+import time
+import weakref
+from collections import Counter
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+import discord
+
+if TYPE_CHECKING:
+    from discord.ext import commands
+
+# Upper bounds in seconds, roughly exponential from "instant" to "probably stuck".
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Where the invocation state of a command lives in its state mapping.
+_STATE_KEY = "spork_metrics_started"
+
+Collector = Callable[[], Iterable[str]]
+
+
+@dataclass(slots=True)
+class Histogram:
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    counts: list[int] = field(init=False)
+    total: float = 0.0
+    count: int = 0
+    max: float = 0.0
+
+    def __post_init__(self) -> None:
+        # One count per bucket plus the implicit +Inf bucket.
+        self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        ret = []
+        seen = 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            seen += count
+            ret.append(("+Inf" if bound == float("inf") else repr(bound), seen))
+        return ret
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class CommandMetrics:
+    """Latency histograms and invocation/error counts for text, hybrid and application commands.
+
+    Each invocation is timed from :meth:`started` to :meth:`finished` or :meth:`failed`,
+    whichever comes first, and counted once.
+    """
+
+    def __init__(self) -> None:
+        self.latencies: dict[str, Histogram] = {}
+        self.invocations: Counter[str] = Counter()
+        self.errors: Counter[tuple[str, str]] = Counter()
+        self.collectors: list[Collector] = []
+        self._contexts: weakref.WeakKeyDictionary[commands.Context[Any], dict[str, Any]] = weakref.WeakKeyDictionary()
+
+    def add_collector(self, collector: Collector) -> None:
+        """Adds a callable returning extra lines in the Prometheus text format to the output."""
+        self.collectors.append(collector)
+
+    def remove_collector(self, collector: Collector) -> None:
+        try:
+            self.collectors.remove(collector)
+        except ValueError:
+            pass
+
+    def _state(self, target: commands.Context[Any] | discord.Interaction) -> dict[str, Any]:
+        # Hybrid commands used as slash commands share the interaction's state so they aren't counted twice.
+        if not isinstance(target, discord.Interaction):
+            if target.interaction is None:
+                return self._contexts.setdefault(target, {})
+            target = target.interaction
+        return target.extras
+
+    def started(self, target: commands.Context[Any] | discord.Interaction) -> None:
+        self._state(target)[_STATE_KEY] = time.perf_counter()
+
+    def finished(self, target: commands.Context[Any] | discord.Interaction, command: str) -> None:
+        state = self._state(target)
+        started = state.get(_STATE_KEY)
+        if started is None:
+            return
+        state[_STATE_KEY] = None
+        self._observe(command, time.perf_counter() - started)
+
+    def failed(self, target: commands.Context[Any] | discord.Interaction, command: str, error: BaseException) -> None:
+        self.errors[command, type(error).__name__] += 1
+
+        state = self._state(target)
+        if _STATE_KEY not in state:
+            # It failed before it was even started, e.g. in a check.
+            self.invocations[command] += 1
+            return
+
+        started = state[_STATE_KEY]
+        if started is not None:
+            state[_STATE_KEY] = None
+            self._observe(command, time.perf_counter() - started)
+
+    def _observe(self, command: str, seconds: float) -> None:
+        self.invocations[command] += 1
+        histogram = self.latencies.get(command)
+        if histogram is None:
+            histogram = self.latencies[command] = Histogram()
+        histogram.observe(seconds)
+
+    def slowest(self, limit: int = 10) -> list[tuple[str, Histogram]]:
+        return sorted(self.latencies.items(), key=lambda item: item[1].quantile(0.95), reverse=True)[:limit]
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = [
+            "# HELP spork_command_duration_seconds Time taken to run commands.",
+            "# TYPE spork_command_duration_seconds histogram",
+        ]
+        for command, histogram in sorted(self.latencies.items()):
+            label = f'command="{escape_label(command)}"'
+            lines.extend(
+                f'spork_command_duration_seconds_bucket{{{label},le="{bound}"}} {count}'
+                for bound, count in histogram.cumulative()
+            )
+            lines.append(f"spork_command_duration_seconds_sum{{{label}}} {histogram.total}")
+            lines.append(f"spork_command_duration_seconds_count{{{label}}} {histogram.count}")
+
+        lines.append("# HELP spork_command_invocations_total Commands invoked, including ones that failed.")
+        lines.append("# TYPE spork_command_invocations_total counter")
+        lines.extend(
+            f'spork_command_invocations_total{{command="{escape_label(command)}"}} {count}'
+            for command, count in sorted(self.invocations.items())
+        )
+
+        lines.append("# HELP spork_command_errors_total Command failures by error type.")
+        lines.append("# TYPE spork_command_errors_total counter")
+        lines.extend(
+            f'spork_command_errors_total{{command="{escape_label(command)}",error="{escape_label(error)}"}} {count}'
+            for (command, error), count in sorted(self.errors.items())
+        )
+
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
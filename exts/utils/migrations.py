@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import asyncpg
+
+_logger = logging.getLogger(__name__)
+
+MIGRATIONS_PATH = Path("./database/migrations")
+
+# Key of the advisory lock held while migrating, so only one process migrates at a time.
+LOCK_KEY = 0x5350_4F52_4B
+
+_FILENAME = re.compile(r"(?P<version>\d+)_(?P<name>\w+)\.sql")
+
+
+class MigrationError(Exception):
+    """Raised when the migrations on disk don't agree with the ones applied to the database."""
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode()).hexdigest()
+
+
+def discover(path: Path = MIGRATIONS_PATH) -> list[Migration]:
+    """Reads the numbered migrations in a directory, e.g. ``0002_add_member_counts.sql``, in order."""
+    migrations: dict[int, Migration] = {}
+    for file in path.glob("*.sql"):
+        match = _FILENAME.fullmatch(file.name)
+        if match is None:
+            raise MigrationError(f"{file.name} isn't named like 0001_description.sql")
+
+        version = int(match["version"])
+        if version in migrations:
+            raise MigrationError(f"Migrations {migrations[version].name} and {match['name']} share version {version}")
+        migrations[version] = Migration(version, match["name"], file.read_text())
+    return [migrations[version] for version in sorted(migrations)]
+
+
+async def _pending(conn: asyncpg.Connection, migrations: list[Migration]) -> list[Migration]:
+    applied = {row["version"]: row["checksum"] for row in await conn.fetch("SELECT version, checksum FROM schema_migrations")}
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum is not None and checksum != migration.checksum:
+            raise MigrationError(f"Migration {migration.version} ({migration.name}) was changed after it was applied")
+    return [migration for migration in migrations if migration.version not in applied]
+
+
+async def pending(pool: asyncpg.Pool, path: Path = MIGRATIONS_PATH) -> list[Migration]:
+    """The migrations that haven't been applied yet, without taking any locks."""
+    migrations = discover(path)
+    async with pool.acquire() as conn:
+        if await conn.fetchval("SELECT to_regclass('schema_migrations')") is None:
+            return migrations
+        return await _pending(conn, migrations)  # type: ignore
+
+
+async def migrate(pool: asyncpg.Pool, path: Path = MIGRATIONS_PATH) -> list[Migration]:
+    """Applies every pending migration, each in its own transaction, and returns the ones applied.
+
+    When everything is up to date this only reads the version table. Otherwise the
+    migrations run under an advisory lock so processes starting together don't race.
+    """
+    todo = await pending(pool, path)
+    if not todo:
+        return []
+
+    migrations = discover(path)
+    async with pool.acquire() as conn:
+        await conn.execute("SELECT pg_advisory_lock($1)", LOCK_KEY)
+        try:
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version integer PRIMARY KEY,
+                    name text NOT NULL,
+                    checksum text NOT NULL,
+                    applied_at timestamptz NOT NULL DEFAULT now()
+                )
+                """
+            )
+            # Another process may have applied them while we waited for the lock.
+            todo = await _pending(conn, migrations)  # type: ignore
+            for migration in todo:
+                async with conn.transaction():
+                    await conn.execute(migration.sql)
+                    await conn.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+                        migration.version,
+                        migration.name,
+                        migration.checksum,
+                    )
+                _logger.info("Applied migration %s: %s", migration.version, migration.name)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", LOCK_KEY)
+    return todo
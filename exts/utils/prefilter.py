@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import re
+from enum import Enum
+
+
+class MessageKind(Enum):
+    ignore = 0
+    mention = 1
+    command = 2
+
+
+class MessageFilter:
+    """Sorts incoming messages with a single compiled regex per prefix.
+
+    A message is either a bare mention of the bot, something that starts with one
+    of the bot's prefixes (and so may be a command) or ordinary chat to be ignored.
+    """
+
+    def __init__(self, user_id: int, *, max_patterns: int = 256) -> None:
+        self.user_id = user_id
+        self.max_patterns = max_patterns
+        self._patterns: dict[str, re.Pattern[str]] = {}
+
+    def classify(self, content: str, prefix: str) -> MessageKind:
+        match = self._pattern(prefix).match(content)
+        if match is None:
+            return MessageKind.ignore
+        if match.lastgroup == "mention":
+            return MessageKind.mention
+        return MessageKind.command
+
+    def _pattern(self, prefix: str) -> re.Pattern[str]:
+        try:
+            return self._patterns[prefix]
+        except KeyError:
+            pass
+
+        if len(self._patterns) >= self.max_patterns:
+            self._patterns.clear()
+
+        mention = rf"<@!?{self.user_id}>"
+        pattern = self._patterns[prefix] = re.compile(rf"(?P<mention>{mention}\Z)|{mention}|{re.escape(prefix)}")
+        return pattern
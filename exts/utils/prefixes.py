@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+from typing import TYPE_CHECKING
+
+import asyncpg
+
+if TYPE_CHECKING:
+    from asyncpg.pool import PoolConnectionProxy
+
+    from .db import Database
+
+_logger = logging.getLogger(__name__)
+
+# Must match the channel used by notify_guild_prefix() in database/migrations/0001_initial.sql
+CHANNEL = "guild_prefixes"
+
+
+class PrefixCache:
+    """An in-memory copy of ``guilds.prefix``.
+
+    The whole table is loaded once and then kept current through LISTEN/NOTIFY,
+    so resolving a prefix never touches the database.
+    """
+
+    def __init__(self, db: Database, default: str) -> None:
+        self.db = db
+        self.pool = db.pool
+        self.default = default
+        self._prefixes: dict[int, str] = {}
+        self._listener: PoolConnectionProxy | None = None
+        self._reconnecting: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._prefixes)
+
+    def get(self, guild_id: int | None, /) -> str:
+        if guild_id is None:
+            return self.default
+        return self._prefixes.get(guild_id, self.default)
+
+    async def start(self) -> None:
+        # Listen before loading so no change can slip in between the two.
+        await self._listen()
+        await self.load()
+
+    async def load(self) -> None:
+        rows = await self.db.guild_prefixes()
+        self._prefixes = {row["id"]: row["prefix"] for row in rows}
+        _logger.info("Loaded %s custom guild prefixes", len(self._prefixes))
+
+    async def set(self, guild_id: int, prefix: str | None) -> None:
+        """Stores a prefix for a guild, ``None`` or the default prefix resets it."""
+        if prefix == self.default:
+            prefix = None
+
+        await self.db.set_guild_prefix(guild_id, prefix)
+        # The notification will do the same, this just makes the change visible right away.
+        self._apply(guild_id, prefix)
+
+    async def close(self) -> None:
+        # A reconnect left running could listen again on a pool that's closing.
+        task, self._reconnecting = self._reconnecting, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await self._unlisten()
+
+    async def _unlisten(self) -> None:
+        conn, self._listener = self._listener, None
+        if conn is None:
+            return
+        try:
+            await conn.remove_listener(CHANNEL, self._on_notify)
+        finally:
+            await self.pool.release(conn)
+
+    async def _listen(self) -> None:
+        conn = await self.pool.acquire()
+        await conn.add_listener(CHANNEL, self._on_notify)
+        conn.add_termination_listener(self._on_terminate)
+        self._listener = conn
+
+    async def _reconnect(self, conn: PoolConnectionProxy) -> None:
+        try:
+            await self.pool.release(conn)
+        except Exception:
+            pass
+
+        # Notifications sent while we were disconnected are lost, so reload everything.
+        delay = 1.0
+        while True:
+            try:
+                await self.start()
+            except (OSError, TimeoutError, asyncpg.PostgresError):
+                _logger.warning("Could not re-establish the prefix listener, retrying in %ss", delay)
+                await self._unlisten()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+            else:
+                _logger.info("Re-established the prefix listener")
+                return
+
+    def _apply(self, guild_id: int, prefix: str | None) -> None:
+        if prefix is None:
+            self._prefixes.pop(guild_id, None)
+        else:
+            self._prefixes[guild_id] = prefix
+
+    def _on_notify(self, conn: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        data = json.loads(payload)
+        self._apply(data["id"], data["prefix"])
+
+    def _on_terminate(self, conn: asyncpg.Connection) -> None:
+        listener, self._listener = self._listener, None
+        if listener is None:
+            return
+        _logger.warning("Lost the prefix listener connection")
+        # Held on to so the task isn't garbage collected while it retries.
+        self._reconnecting = asyncio.create_task(self._reconnect(listener))
+        self._reconnecting.add_done_callback(self._reconnected)
+
+    def _reconnected(self, task: asyncio.Task[None]) -> None:
+        if self._reconnecting is task:
+            self._reconnecting = None
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING
+
+import aiohttp
+
+try:
+    from PIL import Image, ImageDraw, ImageOps
+except ImportError:
+    Image = None  # type: ignore
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import discord
+
+    from .guilds import GuildGraphics
+
+_logger = logging.getLogger(__name__)
+
+# Bump whenever the layout changes so previously rendered previews aren't reused.
+RENDER_VERSION = 1
+
+WIDTH = 960
+SECTION_HEIGHT = 360
+ICON_SIZE = 192
+ICON_PADDING = 16
+BACKGROUND = (43, 45, 49, 255)
+
+
+class PreviewUnavailable(Exception):
+    """Raised when a preview can't be rendered."""
+
+
+def _decode(data: bytes) -> Image.Image:
+    with Image.open(io.BytesIO(data)) as image:
+        image.seek(0)
+        return image.convert("RGBA")
+
+
+def _round_icon(icon: Image.Image) -> Image.Image:
+    icon = ImageOps.fit(icon, (ICON_SIZE, ICON_SIZE), Image.Resampling.LANCZOS)
+    # Drawn at 4x and scaled down so the edge is smooth.
+    mask = Image.new("L", (ICON_SIZE * 4, ICON_SIZE * 4), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, *mask.size), fill=255)
+    icon.putalpha(mask.resize(icon.size, Image.Resampling.LANCZOS))
+    return icon
+
+
+def render_preview(icon: bytes | None, splash: bytes | None, banner: bytes | None) -> bytes:
+    """Composes a guild's graphics into one PNG: banner and splash stacked, icon in a strip below.
+
+    Runs in a worker process, so it only takes and returns bytes.
+    """
+    sections = [_decode(data) for data in (banner, splash) if data is not None]
+    strip = ICON_SIZE + ICON_PADDING * 2 if icon is not None else 0
+    canvas = Image.new("RGBA", (WIDTH, SECTION_HEIGHT * len(sections) + strip), BACKGROUND)
+
+    for i, section in enumerate(sections):
+        canvas.paste(ImageOps.fit(section, (WIDTH, SECTION_HEIGHT), Image.Resampling.LANCZOS), (0, SECTION_HEIGHT * i))
+
+    if icon is not None:
+        rounded = _round_icon(_decode(icon))
+        canvas.alpha_composite(rounded, (ICON_PADDING, SECTION_HEIGHT * len(sections) + ICON_PADDING))
+
+    out = io.BytesIO()
+    canvas.save(out, format="PNG")
+    return out.getvalue()
+
+
+class PreviewRenderer:
+    """Renders guild graphics previews in a process pool and caches them on disk.
+
+    Previews are stored under a hash of the graphics' asset hashes, so a guild only
+    needs a new preview once it changes one of them, and guilds sharing assets share
+    previews. Concurrent requests for the same preview wait for a single render.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        path: Path,
+        *,
+        workers: int = 2,
+        max_downloads: int = 4,
+        max_files: int = 5000,
+    ) -> None:
+        self.session = session
+        self.path = path
+        self.workers = workers
+        self.max_files = max_files
+        self.hits = 0
+        self.renders = 0
+        self._downloads = asyncio.Semaphore(max_downloads)
+        self._executor: ProcessPoolExecutor | None = None
+        self._inflight: dict[str, asyncio.Task[bytes]] = {}
+        self._writes = 0
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @staticmethod
+    def key(graphics: GuildGraphics) -> str:
+        assets = (graphics.icon, graphics.splash, graphics.banner)
+        raw = ":".join([str(RENDER_VERSION), *(asset.key if asset is not None else "" for asset in assets)])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _file(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.png"
+
+    async def render(self, graphics: GuildGraphics) -> bytes:
+        """Returns the PNG preview of a guild's graphics, rendering it if it isn't cached."""
+        if not self.available:
+            raise PreviewUnavailable("Pillow isn't installed.")
+        if not graphics.has_any_graphics:
+            raise PreviewUnavailable("This guild has no graphics.")
+
+        key = self.key(graphics)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._load(key, graphics))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, graphics: GuildGraphics) -> bytes:
+        file = self._file(key)
+        try:
+            data = await asyncio.to_thread(file.read_bytes)
+        except FileNotFoundError:
+            pass
+        else:
+            self.hits += 1
+            return data
+
+        try:
+            icon, splash, banner = await asyncio.gather(
+                self._download(graphics.icon, 256),
+                self._download(graphics.splash, 1024),
+                self._download(graphics.banner, 1024),
+            )
+        except (aiohttp.ClientError, TimeoutError) as e:
+            raise PreviewUnavailable("Could not download the guild's graphics.") from e
+
+        if self._executor is None:
+            # Spawned rather than forked, forking copies the whole bot and its threads.
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(self._executor, render_preview, icon, splash, banner)
+        except BrokenProcessPool as e:
+            # A worker died, start a fresh pool next time.
+            self.close()
+            raise PreviewUnavailable("The renderer crashed, try again.") from e
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Undecodable, oversized or otherwise broken images.
+            raise PreviewUnavailable("Could not read the guild's graphics.") from e
+        self.renders += 1
+
+        await asyncio.to_thread(self._store, file, data)
+        return data
+
+    async def _download(self, asset: discord.Asset | None, size: int) -> bytes | None:
+        if asset is None:
+            return None
+        async with self._downloads, self.session.get(asset.replace(size=size, format="png").url) as resp:
+            resp.raise_for_status()
+            return await resp.read()
+
+    def _store(self, file: Path, data: bytes) -> None:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        # Written next to the final name and moved into place so readers never see half a file.
+        # Clusters share the directory, so each process writes its own partial file.
+        partial = file.with_suffix(f".{os.getpid()}.tmp")
+        partial.write_bytes(data)
+        partial.replace(file)
+
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def _prune(self) -> None:
+        files = list(self.path.glob("*/*.png"))
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda file: file.stat().st_mtime)
+        for file in files[: len(files) - self.max_files]:
+            file.unlink(missing_ok=True)
+        _logger.info("Pruned %s cached previews", len(files) - self.max_files)
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from types import CodeType, FrameType
+
+# The running task of each loop. There's no public way to read it from another thread, this
+# private dict was checked against Python 3.11, 3.12 and 3.13. Without it every sample is "(loop)".
+_current_tasks: dict[asyncio.AbstractEventLoop, asyncio.Task] = getattr(asyncio.tasks, "_current_tasks", {})
+
+
+@dataclass(slots=True)
+class Profile:
+    duration: float
+    interval: float
+    overhead: float
+    stacks: Counter[str] = field(default_factory=Counter)
+    tasks: Counter[str] = field(default_factory=Counter)
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """The stacks in the collapsed format flamegraph tools read, one ``frame;frame;frame count`` per line."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class StackSampler:
+    """Samples the stack of a thread running an event loop, from a background thread.
+
+    Each sample is the thread's stack, rooted at the name of the task that was running,
+    so time is grouped per listener and command. The sampler times itself and backs off
+    whenever sampling takes more than ``max_overhead`` of the time, the GIL it holds
+    while walking a stack is time the event loop can't run.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        thread_id: int,
+        *,
+        interval: float = 0.005,
+        max_overhead: float = 0.02,
+    ) -> None:
+        self.loop = loop
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self._labels: dict[CodeType, str] = {}
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = Path(code.co_filename)
+            label = self._labels[code] = f"{path.parent.name}/{path.name}:{code.co_qualname}"
+        return label
+
+    def _stack(self, frame: FrameType | None) -> list[str]:
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def run(self, duration: float) -> Profile:
+        """Samples for ``duration`` seconds, blocking the calling thread."""
+        profile = Profile(duration=duration, interval=self.interval, overhead=0.0)
+        interval = self.interval
+        busy = 0.0
+        start = time.perf_counter()
+        deadline = start + duration
+
+        while (now := time.perf_counter()) < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            task = _current_tasks.get(self.loop)
+            root = task.get_name() if task is not None else "(idle)" if frame is None else "(loop)"
+            profile.tasks[root] += 1
+            profile.stacks[";".join([root, *self._stack(frame)])] += 1
+            del frame
+
+            spent = time.perf_counter() - now
+            busy += spent
+            elapsed = now + spent - start
+            # Adjusted as a share of all the time so far, a single slow sample doesn't count for much.
+            if busy > self.max_overhead * elapsed:
+                interval = min(interval * 2, 0.1)
+            elif interval > self.interval and busy < self.max_overhead / 2 * elapsed:
+                interval /= 2
+            time.sleep(max(interval - spent, 0.0))
+
+        profile.interval = interval
+        profile.overhead = busy / max(time.perf_counter() - start, 1e-9)
+        return profile
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import datetime
+
+    import discord
+
+
+class GuildStats:
+    """Member statistics for a guild that are updated as events come in.
+
+    Reading any of the counts is O(1), only building from scratch walks the member cache.
+    """
+
+    __slots__ = ("_boosters", "_latest_booster", "bots", "built_chunked", "guild_id", "members", "statuses")
+
+    def __init__(self, guild_id: int) -> None:
+        self.guild_id = guild_id
+        self.members = 0
+        self.bots = 0
+        self.statuses: Counter[discord.Status | str] = Counter()
+        self.built_chunked = False
+        self._boosters: dict[int, datetime.datetime] = {}
+        self._latest_booster: int | None = None
+
+    @classmethod
+    def from_guild(cls, guild: discord.Guild, /) -> GuildStats:
+        self = cls(guild.id)
+        for member in guild.members:
+            self.add(member)
+        self.built_chunked = guild.chunked
+        return self
+
+    @property
+    def booster_count(self) -> int:
+        return len(self._boosters)
+
+    @property
+    def latest_booster(self) -> tuple[int, datetime.datetime] | None:
+        """The ID of the member who boosted most recently and when they did so."""
+        if self._latest_booster is None:
+            if not self._boosters:
+                return None
+            self._latest_booster = max(self._boosters, key=self._boosters.__getitem__)
+        return self._latest_booster, self._boosters[self._latest_booster]
+
+    def add(self, member: discord.Member, /) -> None:
+        self.members += 1
+        self.bots += member.bot
+        self.statuses[member.status] += 1
+        if member.premium_since is not None:
+            self._add_booster(member.id, member.premium_since)
+
+    def remove(self, member: discord.Member, /) -> None:
+        self.members -= 1
+        self.bots -= member.bot
+        self.statuses[member.status] -= 1
+        self._remove_booster(member.id)
+
+    def update_status(self, before: discord.Status | str, after: discord.Status | str, /) -> None:
+        if before != after:
+            self.statuses[before] -= 1
+            self.statuses[after] += 1
+
+    def update_boost(self, member_id: int, premium_since: datetime.datetime | None, /) -> None:
+        if premium_since is None:
+            self._remove_booster(member_id)
+        else:
+            self._add_booster(member_id, premium_since)
+
+    def diff(self, other: GuildStats, /) -> list[str]:
+        """Describes every count that differs between these stats and ``other``."""
+        ret: list[str] = []
+        for attr in ("members", "bots", "booster_count", "latest_booster"):
+            ours, theirs = getattr(self, attr), getattr(other, attr)
+            if ours != theirs:
+                ret.append(f"{attr}: {ours} != {theirs}")
+
+        ret.extend(
+            f"{status}: {self.statuses[status]} != {other.statuses[status]}"
+            for status in sorted(self.statuses.keys() | other.statuses.keys(), key=str)
+            if self.statuses[status] != other.statuses[status]
+        )
+        return ret
+
+    def _add_booster(self, member_id: int, premium_since: datetime.datetime) -> None:
+        previous = self._boosters.get(member_id)
+        self._boosters[member_id] = premium_since
+        latest = self._latest_booster
+        if latest is not None and latest != member_id and premium_since > self._boosters[latest]:
+            self._latest_booster = member_id
+        elif latest == member_id and previous is not None and premium_since < previous:
+            # Their boost date went backwards, someone else may be the latest now, work it out again on the next read.
+            self._latest_booster = None
+
+    def _remove_booster(self, member_id: int) -> None:
+        if self._boosters.pop(member_id, None) is not None and self._latest_booster == member_id:
+            self._latest_booster = None
+
+
+class GuildStatsStore:
+    """Holds the :class:`GuildStats` of every guild, building them lazily from the member cache."""
+
+    def __init__(self) -> None:
+        self._stats: dict[int, GuildStats] = {}
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def get(self, guild: discord.Guild, /) -> GuildStats:
+        stats = self._stats.get(guild.id)
+        # Stats built before chunking finished only know about part of the guild.
+        if stats is None or (guild.chunked and not stats.built_chunked):
+            stats = self.rebuild(guild)
+        return stats
+
+    def peek(self, guild_id: int, /) -> GuildStats | None:
+        """Returns the stats for a guild only if they were already built."""
+        return self._stats.get(guild_id)
+
+    def rebuild(self, guild: discord.Guild, /) -> GuildStats:
+        stats = self._stats[guild.id] = GuildStats.from_guild(guild)
+        return stats
+
+    def verify(self, guild: discord.Guild, /) -> list[str]:
+        """Compares the maintained stats with a fresh count of the member cache."""
+        return self.get(guild).diff(GuildStats.from_guild(guild))
+
+    def discard(self, guild_id: int, /) -> None:
+        self._stats.pop(guild_id, None)
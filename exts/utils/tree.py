@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import discord
+    from discord import app_commands
+
+# Where the global commands' hash is stored, guilds use their ID.
+GLOBAL_TARGET = 0
+
+
+def tree_hash(tree: app_commands.CommandTree, guild: discord.abc.Snowflake | None = None) -> str:
+    """A hash of exactly what syncing the tree to ``guild`` (or globally) would upload."""
+    payloads = [command.to_dict(tree) for command in tree.get_commands(guild=guild)]
+    payloads.sort(key=lambda payload: (payload.get("type", 1), payload["name"]))
+    raw = json.dumps(payloads, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import bisect
+from array import array
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    import discord
+
+
+class UserGuildIndex:
+    """Which guilds every cached user is in, for lookups that don't scan every guild.
+
+    Guild IDs are swapped for small slot numbers and each user keeps a sorted
+    ``array`` of slots, which is several times smaller than a set of IDs. Slots of
+    guilds the bot left are never reused, so stale entries are simply skipped.
+    """
+
+    def __init__(self) -> None:
+        self._users: dict[int, array[int]] = {}
+        self._slots: dict[int, int] = {}
+        self._guilds: array[int] = array("Q")
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def _slot(self, guild_id: int) -> int:
+        slot = self._slots.get(guild_id)
+        if slot is None:
+            slot = self._slots[guild_id] = len(self._guilds)
+            self._guilds.append(guild_id)
+        return slot
+
+    def add(self, user_id: int, guild_id: int) -> None:
+        slot = self._slot(guild_id)
+        slots = self._users.get(user_id)
+        if slots is None:
+            self._users[user_id] = array("I", (slot,))
+            return
+
+        i = bisect.bisect_left(slots, slot)
+        if i == len(slots) or slots[i] != slot:
+            slots.insert(i, slot)
+
+    def remove(self, user_id: int, guild_id: int) -> None:
+        slot = self._slots.get(guild_id)
+        slots = self._users.get(user_id)
+        if slot is None or slots is None:
+            return
+
+        i = bisect.bisect_left(slots, slot)
+        if i < len(slots) and slots[i] == slot:
+            del slots[i]
+            if not slots:
+                del self._users[user_id]
+
+    def add_guild(self, guild: discord.Guild) -> None:
+        self.add_members(guild.id, (member.id for member in guild.members))
+
+    def add_members(self, guild_id: int, user_ids: Iterable[int]) -> None:
+        # add() inlined, this runs for every member of every guild at startup.
+        slot = self._slot(guild_id)
+        users = self._users
+        for user_id in user_ids:
+            slots = users.get(user_id)
+            if slots is None:
+                users[user_id] = array("I", (slot,))
+            elif slots[-1] < slot:
+                slots.append(slot)
+            else:
+                i = bisect.bisect_left(slots, slot)
+                if slots[i] != slot:
+                    slots.insert(i, slot)
+
+    def remove_guild(self, guild: discord.Guild) -> None:
+        slot = self._slots.pop(guild.id, None)
+        if slot is None:
+            return
+        for member in guild.members:
+            slots = self._users.get(member.id)
+            if slots is None:
+                continue
+            i = bisect.bisect_left(slots, slot)
+            if i < len(slots) and slots[i] == slot:
+                del slots[i]
+                if not slots:
+                    del self._users[member.id]
+
+    def _live(self, user_id: int) -> Iterable[int]:
+        for slot in self._users.get(user_id, ()):
+            guild_id = self._guilds[slot]
+            # Anything the member cache didn't know about when the guild was removed.
+            if self._slots.get(guild_id) == slot:
+                yield guild_id
+
+    def guild_ids(self, user_id: int, /) -> list[int]:
+        return list(self._live(user_id))
+
+    def count(self, user_id: int, /) -> int:
+        return sum(1 for _ in self._live(user_id))
@@ -0,0 +1,33 @@
+"""Stand-ins for the discord.py models the unit tests need, with only the attributes the code reads."""
+
+from __future__ import annotations
+
+import datetime
+from types import SimpleNamespace
+
+import discord
+
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+
+def fake_member(
+    member_id: int,
+    *,
+    guild_id: int = 1,
+    bot: bool = False,
+    status: discord.Status = discord.Status.online,
+    premium_since: datetime.datetime | None = None,
+    joined_at: datetime.datetime = EPOCH,
+) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=member_id,
+        guild=SimpleNamespace(id=guild_id),
+        bot=bot,
+        status=status,
+        premium_since=premium_since,
+        joined_at=joined_at,
+    )
+
+
+def fake_guild(*members: SimpleNamespace, guild_id: int = 1, chunked: bool = True) -> SimpleNamespace:
+    return SimpleNamespace(id=guild_id, members=list(members), chunked=chunked)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from exts.utils import cache
+from exts.utils.cache import TTLCache
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+class Fetcher:
+    def __init__(self, *results: object) -> None:
+        self.results = list(results)
+        self.calls = 0
+
+    async def __call__(self) -> object:
+        self.calls += 1
+        await asyncio.sleep(0)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_hits_until_expired(clock: Clock) -> None:
+    async def run() -> None:
+        ttl: TTLCache[str, object] = TTLCache("test-expiry", maxsize=10, ttl=60)
+        fetch = Fetcher("a", "b")
+
+        assert await ttl.get("key", fetch) == "a"
+        clock.now += 59
+        assert await ttl.get("key", fetch) == "a"
+        clock.now += 2
+        assert await ttl.get("key", fetch) == "b"
+
+        assert fetch.calls == 2
+        assert (ttl.stats.hits, ttl.stats.misses) == (1, 2)
+
+    asyncio.run(run())
+
+
+def test_concurrent_lookups_share_a_fetch(clock: Clock) -> None:
+    async def run() -> None:
+        ttl: TTLCache[str, object] = TTLCache("test-coalesce", maxsize=10, ttl=60)
+        fetch = Fetcher("a")
+
+        assert await asyncio.gather(*(ttl.get("key", fetch) for _ in range(5))) == ["a"] * 5
+        assert fetch.calls == 1
+        assert (ttl.stats.misses, ttl.stats.coalesced) == (1, 4)
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_does_not_cancel_the_fetch(clock: Clock) -> None:
+    async def run() -> None:
+        ttl: TTLCache[str, object] = TTLCache("test-cancel", maxsize=10, ttl=60)
+        fetch = Fetcher("a")
+
+        first = asyncio.create_task(ttl.get("key", fetch))
+        second = asyncio.create_task(ttl.get("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == "a"
+        assert fetch.calls == 1
+
+    asyncio.run(run())
+
+
+def test_negative_results_are_cached_for_negative_ttl(clock: Clock) -> None:
+    async def run() -> None:
+        ttl: TTLCache[str, object] = TTLCache("test-negative", maxsize=10, ttl=60, negative_ttl=5)
+        fetch = Fetcher(LookupError("missing"), "a")
+
+        for _ in range(2):
+            with pytest.raises(LookupError):
+                await ttl.get("key", fetch, negative=(LookupError,))
+        assert fetch.calls == 1
+        assert ttl.stats.negative_hits == 1
+
+        clock.now += 6
+        assert await ttl.get("key", fetch, negative=(LookupError,)) == "a"
+
+    asyncio.run(run())
+
+
+def test_negative_hits_do_not_grow_the_traceback(clock: Clock) -> None:
+    def depth(exc: BaseException) -> int:
+        tb, frames = exc.__traceback__, 0
+        while tb is not None:
+            tb, frames = tb.tb_next, frames + 1
+        return frames
+
+    async def run() -> None:
+        ttl: TTLCache[str, object] = TTLCache("test-traceback", maxsize=10, ttl=60, negative_ttl=5)
+        fetch = Fetcher(LookupError("missing"))
+        with pytest.raises(LookupError):
+            await ttl.get("key", fetch, negative=(LookupError,))
+
+        depths = []
+        for _ in range(3):
+            with pytest.raises(LookupError) as info:
+                await ttl.get("key", fetch, negative=(LookupError,))
+            depths.append(depth(info.value))
+        assert depths[0] == depths[-1]
+
+    asyncio.run(run())
+
+
+def test_other_errors_are_not_cached(clock: Clock) -> None:
+    async def run() -> None:
+        ttl: TTLCache[str, object] = TTLCache("test-errors", maxsize=10, ttl=60, negative_ttl=5)
+        fetch = Fetcher(RuntimeError("boom"), "a")
+
+        with pytest.raises(RuntimeError):
+            await ttl.get("key", fetch, negative=(LookupError,))
+        assert await ttl.get("key", fetch, negative=(LookupError,)) == "a"
+
+    asyncio.run(run())
+
+
+def test_least_recently_used_is_evicted(clock: Clock) -> None:
+    async def run() -> None:
+        ttl: TTLCache[str, object] = TTLCache("test-lru", maxsize=2, ttl=60)
+
+        await ttl.get("a", Fetcher(1))
+        await ttl.get("b", Fetcher(2))
+        await ttl.get("a", Fetcher())
+        await ttl.get("c", Fetcher(3))
+
+        fetch = Fetcher(4)
+        assert await ttl.get("a", Fetcher()) == 1
+        assert await ttl.get("b", fetch) == 4
+        assert len(ttl) == 2
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import datetime
+from types import SimpleNamespace
+
+import discord
+
+from exts.utils.edits import EditFilter
+
+
+def message(content: str, *, message_id: int = 1, age: float = 0.0) -> SimpleNamespace:
+    created_at = discord.utils.utcnow() - datetime.timedelta(seconds=age)
+    return SimpleNamespace(id=message_id, content=content, created_at=created_at)
+
+
+def test_changed_content_is_processed() -> None:
+    edits = EditFilter(max_age=300)
+
+    assert edits.should_process(message("!pnig"), message("!ping"))
+    assert edits.processed == 1
+
+
+def test_unchanged_content_is_skipped() -> None:
+    edits = EditFilter(max_age=300)
+
+    # Embed unfurls and pins arrive as edits with the same content.
+    assert not edits.should_process(message("!ping"), message("!ping"))
+    assert edits.skipped["unchanged"] == 1
+
+
+def test_old_messages_are_skipped() -> None:
+    edits = EditFilter(max_age=300)
+
+    assert not edits.should_process(message("!pnig", age=301), message("!ping", age=301))
+    assert edits.skipped["stale"] == 1
+
+
+def test_content_already_handled_is_skipped() -> None:
+    edits = EditFilter(max_age=300)
+    assert not edits.mark(message("!ping"))
+
+    # Edited away and back again, the original content already ran.
+    assert edits.should_process(message("!ping"), message("!pong"))
+    assert not edits.should_process(message("!pong"), message("!ping"))
+    assert edits.skipped["handled"] == 1
+
+    # The same content on another message is separate.
+    assert edits.should_process(message("!pong", message_id=2), message("!ping", message_id=2))
+
+
+def test_handled_pairs_are_bounded() -> None:
+    edits = EditFilter(max_age=300, size=2)
+    for message_id in range(3):
+        edits.mark(message("!ping", message_id=message_id))
+
+    assert len(edits) == 2
+    # The oldest pair was evicted, so its content would run again.
+    assert not edits.mark(message("!ping", message_id=0))
+    assert edits.mark(message("!ping", message_id=2))
+
+
+def test_render_metrics() -> None:
+    edits = EditFilter(max_age=300)
+    edits.should_process(message("!pnig"), message("!ping"))
+    edits.should_process(message("!ping"), message("!ping"))
+
+    assert edits.render_metrics()[2:] == [
+        'spork_message_edits_total{outcome="processed"} 1',
+        'spork_message_edits_total{outcome="skipped_unchanged"} 1',
+    ]
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+
+from conftest import fake_member
+
+from exts.utils import invites as invites_module
+from exts.utils.invites import USED_UP_WINDOW, InviteTracker
+
+if TYPE_CHECKING:
+    import pytest
+
+GUILD_ID = 1
+
+
+def invite(code: str, uses: int = 0, *, max_uses: int = 0, inviter_id: int | None = 100) -> SimpleNamespace:
+    inviter = SimpleNamespace(id=inviter_id) if inviter_id is not None else None
+    return SimpleNamespace(
+        code=code, uses=uses, max_uses=max_uses, inviter=inviter, expires_at=None, max_age=0, created_at=None
+    )
+
+
+def make_tracker(*invites: SimpleNamespace, vanity_uses: int | None = None) -> InviteTracker:
+    tracker = InviteTracker()
+    assert tracker.snapshot(GUILD_ID, list(invites), vanity_uses) == []
+    return tracker
+
+
+def test_untracked_guild() -> None:
+    tracker = InviteTracker()
+
+    assert tracker.joined(fake_member(10)) is None
+    assert not tracker.tracks(GUILD_ID)
+    assert not tracker.waiting(GUILD_ID, 10)
+
+
+def test_only_invite() -> None:
+    tracker = make_tracker(invite("abc", 3, inviter_id=7))
+
+    attribution = tracker.joined(fake_member(10))
+
+    assert attribution is not None
+    assert (attribution.how, attribution.code, attribution.inviter_id) == ("only invite", "abc", 7)
+    assert tracker.get(GUILD_ID, 10) is attribution
+    # The snapshot counts the use, so the next fetch has nothing to diff.
+    assert tracker.guilds[GUILD_ID].invites["abc"].uses == 4
+
+
+def test_only_invite_ignores_vanity_guilds() -> None:
+    tracker = make_tracker(invite("abc"), vanity_uses=5)
+
+    assert tracker.joined(fake_member(10)) is None
+    assert tracker.waiting(GUILD_ID, 10)
+
+
+def test_used_up_invite() -> None:
+    tracker = make_tracker(invite("abc", 4, max_uses=5, inviter_id=7), invite("def"))
+
+    # Discord deletes an invite as it hits its limit, around when the member joins.
+    tracker.deleted(GUILD_ID, "abc")
+    attribution = tracker.joined(fake_member(10))
+
+    assert attribution is not None
+    assert (attribution.how, attribution.code, attribution.inviter_id) == ("used up", "abc", 7)
+    assert not tracker.guilds[GUILD_ID].deleted
+
+
+def test_deleted_invite_not_at_its_limit_is_not_used_up() -> None:
+    tracker = make_tracker(invite("abc", 2, max_uses=5), invite("def"))
+
+    # Deleted by hand, so the join came through the invite that's left.
+    tracker.deleted(GUILD_ID, "abc")
+    attribution = tracker.joined(fake_member(10))
+
+    assert attribution is not None
+    assert (attribution.how, attribution.code) == ("only invite", "def")
+
+
+def test_several_used_up_invites_wait_for_a_fetch() -> None:
+    tracker = make_tracker(invite("abc", 4, max_uses=5), invite("def", 0, max_uses=1), invite("ghi"))
+    tracker.deleted(GUILD_ID, "abc")
+    tracker.deleted(GUILD_ID, "def")
+
+    assert tracker.joined(fake_member(10)) is None
+    assert tracker.pending(GUILD_ID) == 1
+
+
+def test_deleted_invites_expire(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 1000.0
+    monkeypatch.setattr(invites_module.time, "monotonic", lambda: now)
+    tracker = make_tracker(invite("abc", 4, max_uses=5), invite("def"))
+    tracker.deleted(GUILD_ID, "abc")
+
+    now += USED_UP_WINDOW + 1
+    attribution = tracker.joined(fake_member(10))
+
+    assert attribution is not None
+    assert (attribution.how, attribution.code) == ("only invite", "def")
+
+
+def test_diff() -> None:
+    tracker = make_tracker(invite("abc", 1, inviter_id=7), invite("def", 5))
+    assert tracker.joined(fake_member(10)) is None
+
+    (attribution,) = tracker.snapshot(GUILD_ID, [invite("abc", 2, inviter_id=7), invite("def", 5)], None, resolve=1)
+
+    assert (attribution.member_id, attribution.how, attribution.code, attribution.inviter_id) == (10, "diff", "abc", 7)
+    assert tracker.get(GUILD_ID, 10) is attribution
+    assert not tracker.waiting(GUILD_ID, 10)
+
+
+def test_diff_with_a_jump_of_several_uses() -> None:
+    tracker = make_tracker(invite("abc", 1), invite("def", 5))
+    for member_id in (10, 11, 12):
+        tracker.joined(fake_member(member_id))
+
+    attributions = tracker.snapshot(GUILD_ID, [invite("abc", 4), invite("def", 5)], None, resolve=3)
+
+    assert [(a.member_id, a.code) for a in attributions] == [(10, "abc"), (11, "abc"), (12, "abc")]
+    assert {a.how for a in attributions} == {"diff"}
+    assert tracker.pending(GUILD_ID) == 0
+
+
+def test_new_invite_used_before_it_was_seen() -> None:
+    tracker = make_tracker(invite("abc"), invite("def"))
+    tracker.joined(fake_member(10))
+
+    # Created and used between fetches, with the create event missed.
+    (attribution,) = tracker.snapshot(GUILD_ID, [invite("abc"), invite("def"), invite("ghi", 1)], None, resolve=1)
+
+    assert (attribution.how, attribution.code) == ("diff", "ghi")
+
+
+def test_used_up_invite_in_the_diff() -> None:
+    tracker = make_tracker(invite("abc", 4, max_uses=5), invite("def", 0, max_uses=1), invite("ghi"))
+    tracker.deleted(GUILD_ID, "abc")
+    tracker.deleted(GUILD_ID, "def")
+    tracker.joined(fake_member(10))
+
+    (attribution,) = tracker.snapshot(GUILD_ID, [invite("ghi")], None, resolve=1)
+
+    assert attribution.how == "ambiguous"
+    assert set(attribution.candidates) == {"abc", "def"}
+
+
+def test_vanity() -> None:
+    tracker = make_tracker(invite("abc"), vanity_uses=5)
+    tracker.joined(fake_member(10))
+
+    (attribution,) = tracker.snapshot(GUILD_ID, [invite("abc")], 6, resolve=1)
+
+    assert (attribution.how, attribution.code) == ("vanity", None)
+
+
+def test_ambiguous() -> None:
+    tracker = make_tracker(invite("abc"), invite("def"), vanity_uses=5)
+    tracker.joined(fake_member(10))
+    tracker.joined(fake_member(11))
+
+    attributions = tracker.snapshot(GUILD_ID, [invite("abc", 1), invite("def")], 6, resolve=2)
+
+    assert [a.how for a in attributions] == ["ambiguous", "ambiguous"]
+    assert attributions[0].candidates == ("abc", "vanity")
+
+
+def test_unknown() -> None:
+    tracker = make_tracker(invite("abc"), invite("def"))
+    tracker.joined(fake_member(10))
+
+    # Say the invite expired and was deleted without an event.
+    (attribution,) = tracker.snapshot(GUILD_ID, [invite("def")], None, resolve=1)
+
+    assert attribution.how == "unknown"
+
+
+def test_joins_after_the_fetch_stay_pending() -> None:
+    tracker = make_tracker(invite("abc"), invite("def"))
+    tracker.joined(fake_member(10))
+    resolve = tracker.pending(GUILD_ID)
+    # Joined while the fetch was in flight, after Discord had counted the uses.
+    tracker.joined(fake_member(11))
+
+    (attribution,) = tracker.snapshot(GUILD_ID, [invite("abc", 1), invite("def")], None, resolve=resolve)
+
+    assert attribution.member_id == 10
+    assert tracker.waiting(GUILD_ID, 11)
+    assert not tracker.waiting(GUILD_ID, 10)
+
+
+def test_surplus_uses_resolve_joins_made_during_the_fetch() -> None:
+    tracker = make_tracker(invite("abc"), invite("def"))
+    tracker.joined(fake_member(10))
+    resolve = tracker.pending(GUILD_ID)
+    tracker.joined(fake_member(11))
+
+    # The fetch already counted both joins.
+    attributions = tracker.snapshot(GUILD_ID, [invite("abc", 2), invite("def")], None, resolve=resolve)
+
+    assert [(a.member_id, a.code) for a in attributions] == [(10, "abc"), (11, "abc")]
+    assert tracker.pending(GUILD_ID) == 0
+
+
+def test_snapshot_without_resolve_keeps_pending() -> None:
+    tracker = make_tracker(invite("abc"), invite("def"))
+    tracker.joined(fake_member(10))
+
+    assert tracker.snapshot(GUILD_ID, [invite("abc", 1), invite("def")], None) == []
+    assert tracker.waiting(GUILD_ID, 10)
+
+
+def test_attributions_are_bounded() -> None:
+    tracker = InviteTracker(max_attributions=2)
+    tracker.snapshot(GUILD_ID, [invite("abc")], None)
+    for member_id in (10, 11, 12):
+        tracker.joined(fake_member(member_id))
+
+    assert tracker.get(GUILD_ID, 10) is None
+    assert tracker.get(GUILD_ID, 12) is not None
+    assert len(tracker.attributions) == 2
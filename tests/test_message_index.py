@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from exts.utils.message_index import MessageIndex
+
+CHANNEL_ID = 1
+
+
+def test_unknown_channels_are_not_indexed() -> None:
+    index = MessageIndex()
+    index.add(CHANNEL_ID, 10)
+
+    ids, checked, _ = index.lookup(CHANNEL_ID, 100)
+
+    assert (ids, checked, len(index)) == ([], 0, 0)
+
+
+def test_lookup_checks_the_newest_messages() -> None:
+    index = MessageIndex()
+    index.add(CHANNEL_ID, 10, trigger=True)
+    index.add(CHANNEL_ID, 11, own=True)
+    index.add(CHANNEL_ID, 12)
+    index.add(CHANNEL_ID, 13, trigger=True)
+    index.add(CHANNEL_ID, 14, own=True)
+
+    assert index.lookup(CHANNEL_ID, 100) == ([14, 13, 11, 10], 5, 10)
+    assert index.lookup(CHANNEL_ID, 3) == ([14, 13], 3, 10)
+    # Without manage messages only the bot's own messages are cleaned up.
+    assert index.lookup(CHANNEL_ID, 100, include_triggers=False) == ([14, 11], 5, 10)
+
+
+def test_floor_follows_evictions() -> None:
+    index = MessageIndex(per_channel=3)
+    index.add(CHANNEL_ID, 10, own=True)
+    for message_id in (11, 12, 13):
+        index.add(CHANNEL_ID, message_id)
+
+    assert index.lookup(CHANNEL_ID, 100) == ([], 3, 11)
+
+
+def test_edited_into_a_command() -> None:
+    index = MessageIndex()
+    index.add(CHANNEL_ID, 10, own=True)
+    index.add(CHANNEL_ID, 11)
+    index.add(CHANNEL_ID, 11, trigger=True)
+
+    assert index.lookup(CHANNEL_ID, 100) == ([11, 10], 2, 10)
+
+
+def test_deleted_messages_are_not_checked() -> None:
+    index = MessageIndex()
+    index.add(CHANNEL_ID, 10, own=True)
+    index.add(CHANNEL_ID, 11)
+    index.add(CHANNEL_ID, 12, own=True)
+
+    index.discard(CHANNEL_ID, [11, 12])
+
+    assert index.lookup(CHANNEL_ID, 2) == ([10], 1, 10)
@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+# The bot reads config.py, which only exists in a configured checkout.
+pytest.importorskip("config")
+
+from benchmarks import smoke
+
+
+def test_smoke_replay_commands_reply() -> None:
+    assert asyncio.run(smoke.check(drain_timeout=10.0)) == []
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import datetime
+
+import discord
+from conftest import EPOCH, fake_guild, fake_member
+
+from exts.utils.stats import GuildStats
+
+DAY = datetime.timedelta(days=1)
+
+
+def test_from_guild_counts_members() -> None:
+    stats = GuildStats.from_guild(
+        fake_guild(
+            fake_member(1),
+            fake_member(2, bot=True, status=discord.Status.offline),
+            fake_member(3, premium_since=EPOCH),
+            chunked=False,
+        )
+    )
+
+    assert stats.members == 3
+    assert stats.bots == 1
+    assert stats.statuses[discord.Status.online] == 2
+    assert stats.statuses[discord.Status.offline] == 1
+    assert stats.booster_count == 1
+    assert stats.latest_booster == (3, EPOCH)
+    assert not stats.built_chunked
+
+
+def test_add_and_remove_match_a_rebuild() -> None:
+    members = [fake_member(1), fake_member(2, bot=True), fake_member(3, premium_since=EPOCH)]
+    stats = GuildStats.from_guild(fake_guild(*members))
+
+    joined = fake_member(4, status=discord.Status.idle, premium_since=EPOCH + DAY)
+    stats.add(joined)
+    stats.remove(members[0])
+
+    assert stats.diff(GuildStats.from_guild(fake_guild(*members[1:], joined))) == []
+
+
+def test_update_status() -> None:
+    stats = GuildStats.from_guild(fake_guild(fake_member(1), fake_member(2)))
+
+    stats.update_status(discord.Status.online, discord.Status.dnd)
+    stats.update_status(discord.Status.dnd, discord.Status.dnd)
+
+    assert stats.statuses[discord.Status.online] == 1
+    assert stats.statuses[discord.Status.dnd] == 1
+
+
+def test_latest_booster_follows_newer_boosts() -> None:
+    stats = GuildStats.from_guild(fake_guild(fake_member(1, premium_since=EPOCH), fake_member(2, premium_since=EPOCH + DAY)))
+    assert stats.latest_booster == (2, EPOCH + DAY)
+
+    stats.update_boost(1, EPOCH + 2 * DAY)
+    assert stats.latest_booster == (1, EPOCH + 2 * DAY)
+
+    stats.update_boost(1, None)
+    assert stats.booster_count == 1
+    assert stats.latest_booster == (2, EPOCH + DAY)
+
+
+def test_latest_booster_boost_date_moving() -> None:
+    stats = GuildStats.from_guild(fake_guild(fake_member(1, premium_since=EPOCH + DAY), fake_member(2, premium_since=EPOCH)))
+    assert stats.latest_booster == (1, EPOCH + DAY)
+
+    # Moving forward keeps them the latest, moving back past someone else doesn't.
+    stats.update_boost(1, EPOCH + 2 * DAY)
+    assert stats.latest_booster == (1, EPOCH + 2 * DAY)
+    stats.update_boost(1, EPOCH - DAY)
+    assert stats.latest_booster == (2, EPOCH)
+
+
+def test_diff_reports_drift() -> None:
+    members = [fake_member(1), fake_member(2)]
+    stats = GuildStats.from_guild(fake_guild(*members))
+    stats.update_status(discord.Status.online, discord.Status.idle)
+
+    assert stats.diff(GuildStats.from_guild(fake_guild(*members))) == ["idle: 1 != 0", "online: 1 != 2"]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from conftest import fake_guild, fake_member
+
+from exts.utils.user_guilds import UserGuildIndex
+
+if TYPE_CHECKING:
+    from types import SimpleNamespace
+
+
+def guild(guild_id: int, *member_ids: int) -> SimpleNamespace:
+    return fake_guild(*map(fake_member, member_ids), guild_id=guild_id)
+
+
+def test_add_and_remove() -> None:
+    index = UserGuildIndex()
+    index.add(1, 100)
+    index.add(1, 200)
+    index.add(1, 100)
+
+    assert sorted(index.guild_ids(1)) == [100, 200]
+    assert index.count(1) == 2
+
+    index.remove(1, 100)
+    index.remove(1, 300)
+    index.remove(2, 100)
+    assert index.guild_ids(1) == [200]
+
+    index.remove(1, 200)
+    assert index.count(1) == 0
+    assert len(index) == 0
+
+
+def test_add_members_in_any_order() -> None:
+    index = UserGuildIndex()
+    index.add(1, 300)
+    for guild_id in (200, 100, 200, 300):
+        index.add_members(guild_id, [1, 2])
+
+    assert sorted(index.guild_ids(1)) == [100, 200, 300]
+    assert sorted(index.guild_ids(2)) == [100, 200, 300]
+    assert index.count(3) == 0
+
+
+def test_remove_guild() -> None:
+    index = UserGuildIndex()
+    index.add_guild(guild(100, 1, 2))
+    index.add_guild(guild(200, 1))
+
+    index.remove_guild(guild(100, 1, 2))
+
+    assert index.guild_ids(1) == [200]
+    assert index.count(2) == 0
+    assert len(index) == 1
+
+
+def test_members_missing_from_the_cache_are_skipped_after_a_remove() -> None:
+    index = UserGuildIndex()
+    index.add_guild(guild(100, 1, 2))
+
+    # The member cache no longer had user 2 when the guild was removed.
+    index.remove_guild(guild(100, 1))
+    assert index.count(2) == 0
+
+    # Rejoining gets a new slot, the stale entry still doesn't count.
+    index.add_guild(guild(100, 1))
+    assert index.guild_ids(1) == [100]
+    assert index.count(2) == 0